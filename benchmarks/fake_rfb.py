@@ -0,0 +1,223 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from types import TracebackType
+
+import numpy as np
+from scenes import Scene
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PixelFormat:
+    """An RFB PIXEL_FORMAT. Only 32-bit true colour is supported, which is what every modern client asks for."""
+
+    bits_per_pixel: int = 32
+    depth: int = 24
+    big_endian: bool = False
+    true_colour: bool = True
+    red_max: int = 255
+    green_max: int = 255
+    blue_max: int = 255
+    red_shift: int = 16
+    green_shift: int = 8
+    blue_shift: int = 0
+
+    _STRUCT = struct.Struct(">BBBBHHHBBBxxx")
+
+    def pack(self) -> bytes:
+        return self._STRUCT.pack(
+            self.bits_per_pixel,
+            self.depth,
+            self.big_endian,
+            self.true_colour,
+            self.red_max,
+            self.green_max,
+            self.blue_max,
+            self.red_shift,
+            self.green_shift,
+            self.blue_shift,
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> PixelFormat:
+        bpp, depth, big_endian, true_colour, *rest = cls._STRUCT.unpack(data)
+        return cls(bpp, depth, bool(big_endian), bool(true_colour), *rest)
+
+    def encode(self, rgba: np.ndarray) -> np.ndarray:
+        """Converts an RGBA array into an array of pixel values in this format, ready to be sent."""
+        if self.bits_per_pixel != 32 or not self.true_colour:
+            raise ValueError("The fake RFB server only speaks 32-bit true colour")
+        value = np.zeros(rgba.shape[:2], dtype=np.uint32)
+        for channel, maximum, shift in (
+            (0, self.red_max, self.red_shift),
+            (1, self.green_max, self.green_shift),
+            (2, self.blue_max, self.blue_shift),
+        ):
+            value |= (rgba[..., channel].astype(np.uint32) * maximum // 255) << shift
+        return value.astype(">u4" if self.big_endian else "<u4")
+
+
+class FakeRFBServer:
+    """
+    A minimal RFB 3.8 server that serves frames of a synthetic scene to any VNC client, without authentication.
+
+    It runs its own event loop in a background thread, so that serving frames doesn't compete with the client being
+    benchmarked for the client's event loop. The scene advances fps times per second.
+
+    Every FramebufferUpdateRequest is answered right away with the whole requested rectangle in raw encoding, as if
+    everything had changed. That is the worst case for the client, and keeps the server's own cost predictable.
+    Input events are counted, but otherwise ignored.
+    """
+
+    def __init__(self, scene: Scene, *, fps: float = 30.0, host: str = "127.0.0.1") -> None:
+        self.scene = scene
+        self.fps = fps
+        self.host = host
+        self.port = 0
+        self.updates_sent = 0
+        self.key_events = 0
+        self.pointer_events = 0
+        self._started_at = time.monotonic()
+        # Converting a frame is the expensive part, so every frame is only converted once per pixel format.
+        self._encoded: tuple[int, PixelFormat, np.ndarray] | None = None
+        self._thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stop: asyncio.Event | None = None
+        self._ready = threading.Event()
+        self._error: BaseException | None = None
+
+    def _encoded_frame(self, pixel_format: PixelFormat) -> np.ndarray:
+        index = int((time.monotonic() - self._started_at) * self.fps)
+        if self._encoded is None or self._encoded[:2] != (index, pixel_format):
+            self._encoded = (index, pixel_format, pixel_format.encode(self.scene.frame(index)))
+        return self._encoded[2]
+
+    async def _send_update(
+        self,
+        writer: asyncio.StreamWriter,
+        pixel_format: PixelFormat,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+    ) -> None:
+        x, y = min(x, self.scene.width), min(y, self.scene.height)
+        width, height = min(width, self.scene.width - x), min(height, self.scene.height - y)
+        frame = await asyncio.to_thread(self._encoded_frame, pixel_format)
+        pixels = frame[y : y + height, x : x + width].tobytes()
+        writer.write(struct.pack(">BxHHHHHi", 0, 1, x, y, width, height, 0) + pixels)
+        await writer.drain()
+        self.updates_sent += 1
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            writer.write(b"RFB 003.008\n")
+            version = await reader.readexactly(12)
+            if version == b"RFB 003.003\n":
+                # 3.3 clients are told which security type to use instead of picking one.
+                writer.write(struct.pack(">I", 1))
+            else:
+                writer.write(bytes([1, 1]))  # one security type: None
+                await reader.readexactly(1)
+                if version != b"RFB 003.007\n":
+                    writer.write(struct.pack(">I", 0))  # SecurityResult: OK
+            await reader.readexactly(1)  # ClientInit's shared flag
+
+            pixel_format = PixelFormat()
+            name = f"vnc-mcp benchmark ({self.scene.name})".encode()
+            writer.write(
+                struct.pack(">HH", self.scene.width, self.scene.height)
+                + pixel_format.pack()
+                + struct.pack(">I", len(name))
+                + name
+            )
+            await writer.drain()
+
+            while True:
+                message_type = (await reader.readexactly(1))[0]
+                if message_type == 0:  # SetPixelFormat
+                    pixel_format = PixelFormat.unpack((await reader.readexactly(19))[3:])
+                elif message_type == 2:  # SetEncodings
+                    (count,) = struct.unpack(">xH", await reader.readexactly(3))
+                    await reader.readexactly(4 * count)
+                elif message_type == 3:  # FramebufferUpdateRequest
+                    _, x, y, width, height = struct.unpack(">BHHHH", await reader.readexactly(9))
+                    await self._send_update(writer, pixel_format, x, y, width, height)
+                elif message_type == 4:  # KeyEvent
+                    await reader.readexactly(7)
+                    self.key_events += 1
+                elif message_type == 5:  # PointerEvent
+                    await reader.readexactly(5)
+                    self.pointer_events += 1
+                elif message_type == 6:  # ClientCutText
+                    (length,) = struct.unpack(">xxxI", await reader.readexactly(7))
+                    await reader.readexactly(length)
+                else:
+                    raise ValueError(f"Unsupported RFB message type {message_type}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception("The fake RFB server dropped a client")
+        finally:
+            writer.close()
+
+    async def _main(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with server:
+            await self._stop.wait()
+
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._main())
+        except BaseException as e:  # pragma: no cover
+            self._error = e
+            self._ready.set()
+
+    def start(self) -> None:
+        """Starts serving in a background thread, and returns once the server is listening on self.port."""
+        self._thread = threading.Thread(target=self._run, name="fake-rfb-server", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def stop(self) -> None:
+        """Stops serving, and waits for the background thread to finish."""
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> FakeRFBServer:
+        self.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.stop()
+
+
+__all__ = ("PixelFormat", "FakeRFBServer")
@@ -0,0 +1,278 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from fake_rfb import FakeRFBServer
+from pyvnc import VNCConfig
+from scenes import SCENES
+
+from vnc_mcp.mcp import create_mcp_server
+from vnc_mcp.metrics import ToolMetrics
+from vnc_mcp.pool import VNCSessionPool
+from vnc_mcp.session import VNCSession
+from vnc_mcp.utils.asyncio import cpu_executors
+
+
+def _cases(width: int, height: int) -> list[tuple[str, dict[str, Any], bool]]:
+    """Every tool call that is benchmarked, and whether it runs OCR (which is run fewer times)."""
+    quarter = {"top_left_x": 0, "top_left_y": 0, "width": width // 2, "height": height // 2}
+    return [
+        ("get_whole_screen_image", {}, False),
+        ("get_whole_screen_image", {"image_format": "jpeg"}, False),
+        ("get_rectangle_of_screen", quarter, False),
+        ("get_text_from_rectangle_of_screen", quarter, True),
+        ("get_text_from_whole_screen_image", {}, True),
+        ("find_text", {"text": "button"}, True),
+        ("move_mouse_to", {"x": width // 2, "y": height // 2}, False),
+        ("strike_keys", {"keys": ["a"]}, False),
+        ("write_string", {"string": "hello world"}, False),
+    ]
+
+
+def _case_name(tool: str, arguments: dict[str, Any]) -> str:
+    # Cases of the same tool are told apart by their (non-positional) options.
+    options = [
+        f"{key}={value}"
+        for key, value in arguments.items()
+        if key not in ("top_left_x", "top_left_y", "width", "height", "x", "y")
+    ]
+    return f"{tool}[{','.join(options)}]" if options else tool
+
+
+async def _benchmark_case(
+    mcp_server: Any, metrics: ToolMetrics, tool: str, arguments: dict[str, Any], iterations: int
+) -> dict[str, Any]:
+    # The first call loads models, warms caches, and spins up the executors, which isn't what is being measured.
+    await mcp_server.call_tool(tool, arguments)
+    metrics.reset()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        await mcp_server.call_tool(tool, arguments)
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    summary = metrics.summary()[tool]
+
+    # tracemalloc slows every allocation down, so memory is measured separately from latency.
+    tracemalloc.start()
+    try:
+        for _ in range(min(iterations, 3)):
+            await mcp_server.call_tool(tool, arguments)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "iterations": iterations,
+        "throughput_per_second": iterations / elapsed,
+        "latency_seconds": {
+            "mean": statistics.fmean(latencies),
+            "min": min(latencies),
+            "p50": quantiles[49],
+            "p99": quantiles[98],
+            "max": max(latencies),
+        },
+        # Histogram estimates, since phases are only recorded by the server's own metrics.
+        "stages": summary["phases"],
+        "mean_response_bytes": summary["response_bytes"]["mean"],
+        "peak_traced_bytes": peak,
+    }
+
+
+async def _benchmark_scene(
+    scene_name: str, width: int, height: int, args: argparse.Namespace
+) -> list[dict[str, Any]]:
+    scene = SCENES[scene_name](width, height)
+    results = []
+    with FakeRFBServer(scene, fps=args.fps) as server:
+        pool = VNCSessionPool(
+            {"default": VNCConfig(host=server.host, port=server.port)},
+            idle_timeout=None,
+            keepalive_interval=None,
+            session_factory=partial(VNCSession, framebuffer_max_age=args.framebuffer_max_age),
+        )
+        async with pool:
+            for tool, arguments, runs_ocr in _cases(width, height):
+                if args.tools and tool not in args.tools:
+                    continue
+                metrics = ToolMetrics()
+                # Repeated screenshots of a static scene would otherwise never be encoded after the first one.
+                mcp_server = create_mcp_server(pool, metrics=metrics, unchanged_threshold=None)
+                iterations = args.ocr_iterations if runs_ocr else args.iterations
+                result: dict[str, Any] = {
+                    "scene": scene_name,
+                    "resolution": f"{width}x{height}",
+                    "case": _case_name(tool, arguments),
+                }
+                try:
+                    result.update(
+                        await _benchmark_case(mcp_server, metrics, tool, arguments, iterations)
+                    )
+                except Exception as e:
+                    # i.e. tesseract isn't installed. The other cases are still worth running.
+                    result["error"] = f"{type(e).__name__}: {e}"
+                print(_describe(result), file=sys.stderr)
+                results.append(result)
+    return results
+
+
+def _describe(result: dict[str, Any]) -> str:
+    name = f"{result['scene']:>14} {result['resolution']:>9} {result['case']:<45}"
+    if "error" in result:
+        return f"{name} failed: {result['error']}"
+    latency = result["latency_seconds"]
+    return (
+        f"{name} p50 {latency['p50'] * 1000:8.2f} ms  p99 {latency['p99'] * 1000:8.2f} ms  "
+        f"{result['throughput_per_second']:7.1f}/s  peak {result['peak_traced_bytes'] / 2**20:7.1f} MiB"
+    )
+
+
+def _regressions(
+    results: list[dict[str, Any]], baseline: list[dict[str, Any]], tolerance: float
+) -> list[str]:
+    """Describes every case whose p50 latency got more than tolerance (i.e. 0.25 for 25%) slower than the baseline."""
+    before = {
+        (result["scene"], result["resolution"], result["case"]): result["latency_seconds"]["p50"]
+        for result in baseline
+        if "error" not in result
+    }
+    regressions = []
+    for result in results:
+        key = (result["scene"], result["resolution"], result["case"])
+        if "error" in result or key not in before:
+            continue
+        now = result["latency_seconds"]["p50"]
+        if now > before[key] * (1 + tolerance):
+            regressions.append(
+                f"{' '.join(key)}: p50 went from {before[key] * 1000:.2f} ms to {now * 1000:.2f} ms"
+            )
+    return regressions
+
+
+def _resolution(value: str) -> tuple[int, int]:
+    width, _, height = value.partition("x")
+    return int(width), int(height)
+
+
+async def main(args: argparse.Namespace) -> int:
+    results = []
+    async with cpu_executors(use_processes=args.cpu_processes):
+        for width, height in args.resolutions:
+            for scene_name in args.scenes:
+                results.extend(await _benchmark_scene(scene_name, width, height, args))
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+        },
+        "config": {
+            "iterations": args.iterations,
+            "ocr_iterations": args.ocr_iterations,
+            "fps": args.fps,
+            "framebuffer_max_age": args.framebuffer_max_age,
+            "cpu_processes": args.cpu_processes,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        args.output.write_text(output)
+
+    if args.baseline is not None:
+        regressions = _regressions(
+            results, json.loads(args.baseline.read_text())["results"], args.tolerance
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks vnc-mcp's tools against an in-process fake RFB server serving synthetic screens."
+    )
+    parser.add_argument(
+        "--resolutions",
+        type=lambda value: [_resolution(item) for item in value.split(",")],
+        default=[(1280, 800), (1920, 1080), (3840, 2160)],
+        help="comma-separated WIDTHxHEIGHT resolutions (default: 1280x800,1920x1080,3840x2160)",
+    )
+    parser.add_argument(
+        "--scenes",
+        type=lambda value: value.split(","),
+        default=list(SCENES),
+        help=f"comma-separated scenes (default: {','.join(SCENES)})",
+    )
+    parser.add_argument(
+        "--tools",
+        type=lambda value: value.split(","),
+        default=None,
+        help="comma-separated tools to benchmark (default: all of them)",
+    )
+    parser.add_argument("--iterations", type=int, default=30, help="calls per case (default: 30)")
+    parser.add_argument(
+        "--ocr-iterations", type=int, default=5, help="calls per OCR case (default: 5)"
+    )
+    parser.add_argument(
+        "--fps", type=float, default=30.0, help="how often moving scenes change (default: 30)"
+    )
+    parser.add_argument(
+        "--framebuffer-max-age",
+        type=float,
+        default=0.0,
+        help="seconds captures may be served from the shadow framebuffer (default: 0, always fetch)",
+    )
+    parser.add_argument(
+        "--cpu-processes", action="store_true", help="encode and OCR in worker processes"
+    )
+    parser.add_argument(
+        "--output", type=Path, default=None, help="write JSON here instead of stdout"
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=None,
+        help="a previous --output to compare p50 latencies to",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="how much slower than the baseline a case may get before it fails (default: 0.25)",
+    )
+    args = parser.parse_args()
+    if min(args.iterations, args.ocr_iterations) < 2:
+        parser.error("at least 2 iterations are needed to compute percentiles")
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(_parse_args())))
@@ -0,0 +1,119 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+from typing import Callable
+
+import numpy as np
+from PIL import Image as PILImage
+from PIL import ImageDraw
+from PIL import ImageFont
+
+
+# Plain English, so that tesseract has something real to read.
+WORDS = (
+    "the quick brown fox jumps over the lazy dog while the server encodes another frame and the agent waits "
+    "patiently for its screenshot to arrive so that it can decide which button to press next"
+).split()
+
+
+class Scene:
+    """
+    A synthetic desktop that the fake RFB server serves frames of.
+
+    frame(index) returns the RGBA array (height x width x 4) shown at a point in time. Scenes that move return a new
+    frame for every index, and static scenes return the same one.
+    """
+
+    def __init__(self, name: str, width: int, height: int) -> None:
+        self.name = name
+        self.width = width
+        self.height = height
+
+    def frame(self, index: int) -> np.ndarray:
+        raise NotImplementedError
+
+
+def _draw_text_block(draw: ImageDraw.ImageDraw, box: tuple[int, int, int, int], seed: int) -> None:
+    left, top, right, bottom = box
+    font = ImageFont.load_default(size=16)
+    rng = np.random.default_rng(seed)
+    y = top
+    while y + 20 <= bottom:
+        line = " ".join(rng.choice(WORDS, size=max((right - left) // 60, 1)))
+        draw.text((left, y), line, fill=(20, 20, 20), font=font)
+        y += 22
+
+
+class StaticUIScene(Scene):
+    """A desktop with a window, a toolbar of buttons, a sidebar, and a page of text that never changes."""
+
+    def __init__(self, width: int, height: int) -> None:
+        super().__init__("static_ui", width, height)
+        image = PILImage.new("RGBA", (width, height), (58, 110, 165, 255))
+        draw = ImageDraw.Draw(image)
+        font = ImageFont.load_default(size=16)
+        margin = width // 20
+        window = (margin, margin, width - margin, height - margin)
+        draw.rectangle(window, fill=(240, 240, 240))
+        # Title bar, toolbar, sidebar, status line.
+        draw.rectangle((window[0], window[1], window[2], window[1] + 32), fill=(45, 45, 48))
+        draw.text((window[0] + 12, window[1] + 8), "Benchmark - Editor", fill="white", font=font)
+        for i, label in enumerate(("File", "Edit", "View", "Save", "Help")):
+            x = window[0] + 12 + i * 90
+            draw.rectangle((x, window[1] + 44, x + 80, window[1] + 72), fill=(0, 120, 215))
+            draw.text((x + 12, window[1] + 50), label, fill="white", font=font)
+        sidebar = window[0] + (window[2] - window[0]) // 5
+        draw.rectangle((window[0], window[1] + 84, sidebar, window[3] - 28), fill=(225, 225, 230))
+        draw.rectangle((window[0], window[3] - 28, window[2], window[3]), fill=(0, 122, 204))
+        draw.text((window[0] + 12, window[3] - 22), "Ready", fill="white", font=font)
+        _draw_text_block(draw, (sidebar + 16, window[1] + 96, window[2] - 16, window[3] - 40), 0)
+        self._frame = np.asarray(image)
+
+    def frame(self, index: int) -> np.ndarray:
+        return self._frame
+
+
+class ScrollingTextScene(Scene):
+    """A page of text that scrolls up by a few rows every frame, like a terminal printing a log."""
+
+    def __init__(self, width: int, height: int, rows_per_frame: int = 6) -> None:
+        super().__init__("scrolling_text", width, height)
+        self.rows_per_frame = rows_per_frame
+        # Twice the screen, so that scrolling can wrap around without a seam showing up all at once.
+        image = PILImage.new("RGBA", (width, height * 2), (255, 255, 255, 255))
+        _draw_text_block(ImageDraw.Draw(image), (8, 0, width - 8, height * 2), 1)
+        self._canvas = np.asarray(image)
+
+    def frame(self, index: int) -> np.ndarray:
+        offset = (index * self.rows_per_frame) % self.height
+        return self._canvas[offset : offset + self.height]
+
+
+class NoiseScene(Scene):
+    """Every pixel changes every frame: the worst case for encoders and change detection alike."""
+
+    def __init__(self, width: int, height: int) -> None:
+        super().__init__("noise", width, height)
+
+    def frame(self, index: int) -> np.ndarray:
+        frame = np.random.default_rng(index).integers(
+            0, 256, size=(self.height, self.width, 4), dtype=np.uint8
+        )
+        frame[..., 3] = 255
+        return frame
+
+
+SCENES: dict[str, Callable[[int, int], Scene]] = {
+    "static_ui": StaticUIScene,
+    "scrolling_text": ScrollingTextScene,
+    "noise": NoiseScene,
+}
+
+
+__all__ = ("Scene", "StaticUIScene", "ScrollingTextScene", "NoiseScene", "SCENES")
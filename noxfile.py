@@ -185,6 +185,21 @@ def tests(session: Session) -> None:
             session.notify("coverage", posargs=[])
 
 
+@session(python=python_versions[0])
+def importtime(session: Session) -> None:
+    """Show how long the CLI takes to import, and which modules it spends that time on."""
+    session.install(".")
+    session.run("python", "-X", "importtime", "-c", "import vnc_mcp.__main__")
+
+
+@session(python=python_versions[0])
+def benchmarks(session: Session) -> None:
+    """Benchmark the tools against a fake VNC server. Pass --baseline=old.json to fail on regressions."""
+    session.install(".")
+    args = session.posargs or ["--output", "benchmark-results.json"]
+    session.run("python", "benchmarks/run.py", *args)
+
+
 @session(python=python_versions[0])
 def coverage(session: Session) -> None:
     """Produce the coverage report."""
@@ -9,24 +9,60 @@ SPDX-License-Identifier: AGPL-3.0-or-later
 # from __future__ import annotations
 
 import json
+from contextlib import AsyncExitStack
+from contextlib import closing
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING
 from typing import Annotated
 from typing import Optional
+from typing import get_args
 
 import typer
 
 # from envwrap import envwrap
-from pyvnc import AsyncVNCClient
-from pyvnc import VNCConfig
 from typer import Argument
 from typer import Option
 
-from .mcp import create_mcp_server
+from .utils.asyncio import CPU_BOUND_WORKERS
+from .utils.asyncio import cpu_executors
 from .utils.asyncio import make_sync
 
 
+if TYPE_CHECKING:
+    from pyvnc import VNCConfig
+
+
 cli = typer.Typer()
 
 
+def _load_targets(path: Path, default_timeout: float) -> "dict[str, VNCConfig]":
+    """Reads a JSON file of VNC servers, keyed by session id."""
+    from pyvnc import VNCConfig
+
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Could not read {path}: {e}") from e
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} must contain a JSON object of session ids to VNC servers")
+
+    targets = {}
+    for name, target in data.items():
+        if not isinstance(target, dict) or "host" not in target:
+            raise ValueError(
+                f'The session {name} in {path} must be an object with at least a "host"'
+            )
+        targets[name] = VNCConfig(
+            host=target["host"],
+            port=target.get("port", 5900),
+            username=target.get("username"),
+            password=target.get("password"),
+            timeout=target.get("timeout", default_timeout),
+        )
+    return targets
+
+
 @cli.command()
 # envwrap was born out of typer's env helpers, we don't need it since typer can take environment variables
 # @envwrap(
@@ -83,25 +119,415 @@ async def main(
             help="Password that will be used to authenticate with the server if an authentication challenge is presented.",
         ),
     ] = None,
+    framebuffer_max_age: Annotated[
+        float,
+        Option(
+            envvar="VNCMCP_FRAMEBUFFER_MAX_AGE",
+            show_envvar=True,
+            help="How many seconds a locally held copy of the framebuffer may be served to tools before it is "
+            "requested from the VNC server again. Sending any input always causes the next capture to be re-requested.",
+        ),
+    ] = 0.5,
+    framebuffer_refresh_interval: Annotated[
+        Optional[float],
+        Option(
+            envvar="VNCMCP_FRAMEBUFFER_REFRESH_INTERVAL",
+            show_envvar=True,
+            help="If set, the local copy of the framebuffer is kept in sync in the background every this many seconds, "
+            "so that captures rarely have to wait on the VNC server.",
+        ),
+    ] = None,
+    history_mb: Annotated[
+        float,
+        Option(
+            envvar="VNCMCP_HISTORY_MB",
+            show_envvar=True,
+            help="Megabytes of (compressed) recent frames kept per session, which the get_past_screen_image tool can "
+            "look back through. Only frames the server captures are kept, so combine this with "
+            "--framebuffer-refresh-interval to catch things that are only on screen briefly. Every captured frame is "
+            "compressed in a background thread, so this is off (0) by default.",
+        ),
+    ] = 0.0,
+    history_spill_dir: Annotated[
+        Optional[Path],
+        Option(
+            envvar="VNCMCP_HISTORY_SPILL_DIR",
+            show_envvar=True,
+            help="If set, the history is kept in memory-mapped temporary files in this directory instead of in memory.",
+        ),
+    ] = None,
+    image_format: Annotated[
+        str,
+        Option(
+            envvar="VNCMCP_IMAGE_FORMAT",
+            show_envvar=True,
+            help="Default format screenshots are encoded in: png, jpeg, or webp. Tools may override this per call.",
+        ),
+    ] = "png",
+    png_compress_level: Annotated[
+        int,
+        Option(
+            envvar="VNCMCP_PNG_COMPRESS_LEVEL",
+            show_envvar=True,
+            help="Default zlib compression level (0-9) of PNG screenshots. "
+            "Higher levels produce smaller images, but take much longer to encode.",
+        ),
+    ] = 1,
+    image_quality: Annotated[
+        int,
+        Option(
+            envvar="VNCMCP_IMAGE_QUALITY",
+            show_envvar=True,
+            help="Default quality (1-100) of JPEG and WebP screenshots.",
+        ),
+    ] = 80,
+    keep_alpha: Annotated[
+        bool,
+        Option(
+            envvar="VNCMCP_KEEP_ALPHA",
+            show_envvar=True,
+            help="Keep the (unused) alpha channel of the framebuffer in PNG and WebP screenshots.",
+        ),
+    ] = False,
+    max_width: Annotated[
+        Optional[int],
+        Option(
+            envvar="VNCMCP_MAX_WIDTH",
+            show_envvar=True,
+            help="Scale screenshots down so that they are at most this many pixels wide. "
+            "Coordinates sent by the client are automatically mapped back onto the full-size workspace.",
+        ),
+    ] = None,
+    max_height: Annotated[
+        Optional[int],
+        Option(
+            envvar="VNCMCP_MAX_HEIGHT",
+            show_envvar=True,
+            help="Scale screenshots down so that they are at most this many pixels tall.",
+        ),
+    ] = None,
+    scale: Annotated[
+        Optional[float],
+        Option(
+            envvar="VNCMCP_SCALE",
+            show_envvar=True,
+            help="Scale screenshots down by this factor (i.e. 0.5 for half size).",
+        ),
+    ] = None,
+    unchanged_threshold: Annotated[
+        int,
+        Option(
+            envvar="VNCMCP_UNCHANGED_THRESHOLD",
+            show_envvar=True,
+            help="Screenshots of a region that looks the same as the last screenshot of it sent to the client are "
+            "replaced with a short note instead of being sent again. 0 only skips screenshots that are identical "
+            "to the pixel; a positive value also skips those whose 64-bit perceptual hashes differ in at most that "
+            "many bits (i.e. a blinking cursor); a negative value always sends them.",
+        ),
+    ] = 0,
+    ocr_cache_mb: Annotated[
+        float,
+        Option(
+            envvar="VNCMCP_OCR_CACHE_MB",
+            show_envvar=True,
+            help="How many megabytes of OCR results are kept, so that unchanged parts of the screen are not OCRed "
+            "again. Set to 0 to disable the cache.",
+        ),
+    ] = 32.0,
+    ocr_backend: Annotated[
+        str,
+        Option(
+            envvar="VNCMCP_OCR_BACKEND",
+            show_envvar=True,
+            help="How OCR is performed. tesserocr keeps tesseract loaded in-process and is much faster, "
+            "but requires the optional tesserocr package. pytesseract starts a new tesseract process for every call. "
+            "auto uses tesserocr if it is installed.",
+        ),
+    ] = "auto",
+    ocr_preload_langs: Annotated[
+        str,
+        Option(
+            envvar="VNCMCP_OCR_PRELOAD_LANGS",
+            show_envvar=True,
+            help="Comma-separated tesseract languages to load at startup when using tesserocr, "
+            "so that the first OCR in them is not slowed down by loading models.",
+        ),
+    ] = "eng",
+    ocr_workers: Annotated[
+        int,
+        Option(
+            envvar="VNCMCP_OCR_WORKERS",
+            show_envvar=True,
+            help="If set, OCR runs in this many worker processes, and large images are split into bands of text that "
+            "are OCRed in parallel. Useful for OCRing high-resolution screens on machines with many cores.",
+        ),
+    ] = 0,
+    cpu_workers: Annotated[
+        int,
+        Option(
+            envvar="VNCMCP_CPU_WORKERS",
+            show_envvar=True,
+            help="How many screenshots may be encoded or OCRed at once. 0 uses one worker per core.",
+        ),
+    ] = 0,
+    cpu_processes: Annotated[
+        bool,
+        Option(
+            envvar="VNCMCP_CPU_PROCESSES",
+            show_envvar=True,
+            help="Encode and OCR screenshots in worker processes instead of threads, so that they aren't held back by "
+            "the GIL. Frames are handed to the workers through shared memory.",
+        ),
+    ] = False,
+    light_threads: Annotated[
+        int,
+        Option(
+            envvar="VNCMCP_LIGHT_THREADS",
+            show_envvar=True,
+            help="How many threads are kept for light work, like comparing frames, so that it never has to wait "
+            "behind encoding or OCR.",
+        ),
+    ] = 4,
+    executor_queue_depth: Annotated[
+        int,
+        Option(
+            envvar="VNCMCP_EXECUTOR_QUEUE_DEPTH",
+            show_envvar=True,
+            help="How many jobs may queue up for the workers before further tool calls wait for room.",
+        ),
+    ] = 8,
+    transport: Annotated[
+        str,
+        Option(
+            envvar="VNCMCP_TRANSPORT",
+            show_envvar=True,
+            help="How MCP clients connect: stdio, sse, or streamable-http. Over HTTP, any number of clients share "
+            "this one VNC connection and its framebuffer cache, and take turns sending input. "
+            "Every client keeps its own scaling and change tracking.",
+        ),
+    ] = "stdio",
+    listen_host: Annotated[
+        str,
+        Option(
+            envvar="VNCMCP_LISTEN_HOST",
+            show_envvar=True,
+            help="Address the HTTP transports listen on. Anyone who can reach it can control the VNC session!",
+        ),
+    ] = "127.0.0.1",
+    listen_port: Annotated[
+        int,
+        Option(
+            envvar="VNCMCP_LISTEN_PORT",
+            show_envvar=True,
+            help="Port the HTTP transports listen on.",
+        ),
+    ] = 8000,
+    targets_file: Annotated[
+        Optional[Path],
+        Option(
+            "--targets",
+            envvar="VNCMCP_TARGETS",
+            show_envvar=True,
+            help="A JSON file of more VNC servers to control, as an object mapping session ids to objects with a "
+            '"host" and optionally a "port", "username", "password", and "timeout". '
+            'The server given on the command line is always available as the session "default". '
+            "Tools pick a session with their session_id argument.",
+        ),
+    ] = None,
+    default_session: Annotated[
+        str,
+        Option(
+            envvar="VNCMCP_DEFAULT_SESSION",
+            show_envvar=True,
+            help="The session tools use when they aren't given a session_id.",
+        ),
+    ] = "default",
+    session_idle_timeout: Annotated[
+        float,
+        Option(
+            envvar="VNCMCP_SESSION_IDLE_TIMEOUT",
+            show_envvar=True,
+            help="Disconnect from VNC servers that no tool has used for this many seconds. "
+            "They are reconnected to when they are used again. Set to 0 to stay connected.",
+        ),
+    ] = 300.0,
+    keepalive_interval: Annotated[
+        float,
+        Option(
+            envvar="VNCMCP_KEEPALIVE_INTERVAL",
+            show_envvar=True,
+            help="Check that every connected VNC server is still responding this often, in seconds, and reconnect to "
+            "the ones that aren't. Set to 0 to only notice dropped connections when a tool runs into them.",
+        ),
+    ] = 30.0,
+    reconnect_wait: Annotated[
+        float,
+        Option(
+            envvar="VNCMCP_RECONNECT_WAIT",
+            show_envvar=True,
+            help="How many seconds tools wait for a dropped connection to be reestablished before they fail. "
+            "Reconnecting continues in the background, with exponential backoff.",
+        ),
+    ] = 15.0,
+    connect_at_startup: Annotated[
+        bool,
+        Option(
+            envvar="VNCMCP_CONNECT_AT_STARTUP",
+            show_envvar=True,
+            help="Start connecting to the default VNC server as soon as the MCP server starts, instead of when a tool "
+            "first uses it. The MCP server never waits for this; tools called before the connection is made wait "
+            "for it instead.",
+        ),
+    ] = True,
+    metrics_port: Annotated[
+        Optional[int],
+        Option(
+            envvar="VNCMCP_METRICS_PORT",
+            show_envvar=True,
+            help="If set, per-tool call counts, error counts, and latency histograms (broken down into capturing, "
+            "encoding, OCR, and input) are served for Prometheus to scrape at /metrics on this port. "
+            "They are always available through the get_diagnostics tool.",
+        ),
+    ] = None,
+    metrics_host: Annotated[
+        str,
+        Option(
+            envvar="VNCMCP_METRICS_HOST",
+            show_envvar=True,
+            help="Address the metrics endpoint listens on.",
+        ),
+    ] = "127.0.0.1",
+    profile_dir: Annotated[
+        Optional[Path],
+        Option(
+            "--profile",
+            envvar="VNCMCP_PROFILE",
+            show_envvar=True,
+            help="If set, tool calls are profiled with cProfile, and every profile is written to this directory as "
+            "<tool>-<timestamp>-<n>.prof (readable with pstats, snakeviz, or flameprof). Only work done on the event "
+            "loop is profiled, not encoding or OCR in the worker threads or processes.",
+        ),
+    ] = None,
+    profile_sample_rate: Annotated[
+        float,
+        Option(
+            envvar="VNCMCP_PROFILE_SAMPLE_RATE",
+            show_envvar=True,
+            help="The share (0-1) of tool calls that are profiled with --profile, so that it can be left on in "
+            "production.",
+        ),
+    ] = 1.0,
 ) -> None:
     """
-    Spawns an MCP server over stdi/o that can be used to interface with the VNC client.
+    Spawns an MCP server over stdi/o (or HTTP) that can be used to interface with the VNC client(s).
 
     Please note that the VNC server the client connects to must support basic VNC authentication. Servers implementing
     ARD (Apple Remote Desktop) are not supported.
     """
-    vnc_config = VNCConfig(
-        host=host,
-        port=port,
-        username=username,
-        password=password,
-        timeout=timeout,
-    )
-    vnc_server = await AsyncVNCClient.connect(vnc_config)
-    async with vnc_server:
-        mcp_server = create_mcp_server(vnc_server)
-        # enter the main loop of the MCP server
-        await mcp_server.run_stdio_async()
+    # Everything that pulls in NumPy, Pillow, pyvnc, or the MCP SDK is imported here instead of at the top of the
+    # module, so that --help (and shell completion) doesn't have to wait for all of them to load.
+    from pyvnc import VNCConfig
+
+    from .encoding import ImageEncoding
+    from .mcp import MCPTransport
+    from .mcp import create_mcp_server
+    from .mcp import run_mcp_server
+    from .metrics import ToolMetrics
+    from .metrics import serve_metrics
+    from .ocr import OCRBackend
+    from .ocr import OCRCache
+    from .ocr import ParallelOCRBackend
+    from .ocr import TesserocrBackend
+    from .ocr import create_ocr_backend
+    from .pool import VNCSessionPool
+    from .profiling import ToolProfiler
+    from .scaling import ScreenScaling
+    from .session import VNCSession
+
+    try:
+        image_encoding = ImageEncoding(
+            format=image_format,  # type: ignore[arg-type]
+            compress_level=png_compress_level,
+            quality=image_quality,
+            keep_alpha=keep_alpha,
+        )
+        scaling = ScreenScaling(max_width=max_width, max_height=max_height, scale=scale)
+        if cpu_workers < 0 or light_threads < 1 or executor_queue_depth < 0:
+            raise ValueError(
+                "cpu-workers and executor-queue-depth must not be negative, and light-threads must be positive"
+            )
+        if transport not in get_args(MCPTransport):
+            raise ValueError(f"Unknown transport {transport}")
+        targets = {
+            "default": VNCConfig(
+                host=host,
+                port=port,
+                username=username,
+                password=password,
+                timeout=timeout,
+            )
+        }
+        if targets_file is not None:
+            targets.update(_load_targets(targets_file, timeout))
+        pool = VNCSessionPool(
+            targets,
+            default=default_session,
+            idle_timeout=session_idle_timeout or None,
+            keepalive_interval=keepalive_interval or None,
+            reconnect_wait=reconnect_wait,
+            session_factory=partial(
+                VNCSession,
+                framebuffer_max_age=framebuffer_max_age,
+                framebuffer_refresh_interval=framebuffer_refresh_interval,
+                scaling=scaling,
+                history_max_bytes=int(history_mb * 1024 * 1024),
+                history_spill_directory=history_spill_dir,
+            ),
+        )
+        profiler = (
+            ToolProfiler(profile_dir, profile_sample_rate) if profile_dir is not None else None
+        )
+        ocr: OCRBackend
+        if ocr_workers > 0:
+            ocr = ParallelOCRBackend(ocr_backend, workers=ocr_workers)  # type: ignore[arg-type]
+        else:
+            ocr = create_ocr_backend(ocr_backend)  # type: ignore[arg-type]
+    except (ValueError, RuntimeError, OSError) as e:
+        raise typer.BadParameter(str(e)) from e
+
+    if isinstance(ocr, TesserocrBackend):
+        ocr.preload(*(lang.strip() for lang in ocr_preload_langs.split(",") if lang.strip()))
+
+    with closing(ocr):
+        async with cpu_executors(
+            light_threads=light_threads,
+            cpu_bound_workers=cpu_workers or CPU_BOUND_WORKERS,
+            use_processes=cpu_processes,
+            queue_depth=executor_queue_depth,
+        ):
+            async with pool, AsyncExitStack() as stack:
+                metrics = ToolMetrics()
+                if metrics_port is not None:
+                    await stack.enter_async_context(
+                        serve_metrics(metrics, metrics_host, metrics_port)
+                    )
+                if connect_at_startup:
+                    pool.connect_in_background()
+                mcp_server = create_mcp_server(
+                    pool,
+                    image_encoding=image_encoding,
+                    ocr_backend=ocr,
+                    ocr_cache=(
+                        OCRCache(int(ocr_cache_mb * 1024 * 1024)) if ocr_cache_mb > 0 else None
+                    ),
+                    metrics=metrics,
+                    profiler=profiler,
+                    unchanged_threshold=unchanged_threshold if unchanged_threshold >= 0 else None,
+                    host=listen_host,
+                    port=listen_port,
+                )
+                # enter the main loop of the MCP server
+                await run_mcp_server(mcp_server, transport)  # type: ignore[arg-type]
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -0,0 +1,171 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import AbstractAsyncContextManager
+from contextlib import AsyncExitStack
+from typing import Annotated
+from typing import Literal
+from typing import Union
+
+from pydantic import BaseModel
+from pydantic import Field
+from pyvnc import AsyncVNCClient
+
+from .scaling import CoordinateMapper
+
+
+class KeyAction(BaseModel):
+    """Strikes keys, the same way as the strike_keys tool."""
+
+    type: Literal["key"] = "key"
+    keys: list[str]
+
+
+class TypeAction(BaseModel):
+    """Writes a string, the same way as the write_string tool."""
+
+    type: Literal["type"] = "type"
+    text: str
+
+
+class MoveAction(BaseModel):
+    """Moves the mouse to a point, the same way as the move_mouse_to tool."""
+
+    type: Literal["move"] = "move"
+    x: int
+    y: int
+
+
+class ClickAction(BaseModel):
+    """Clicks a mouse button n times at the current position."""
+
+    type: Literal["click"] = "click"
+    mouse_button: int = 0
+    n: int = 1
+
+
+class HoldAction(BaseModel):
+    """Presses keys and/or a mouse button down until they are released (or the batch ends)."""
+
+    type: Literal["hold"] = "hold"
+    keys: list[str] = Field(default_factory=list)
+    mouse_button: int | None = None
+
+
+class ReleaseAction(BaseModel):
+    """Releases held keys and/or a held mouse button."""
+
+    type: Literal["release"] = "release"
+    keys: list[str] = Field(default_factory=list)
+    mouse_button: int | None = None
+
+
+class SleepAction(BaseModel):
+    """Waits for some milliseconds, i.e. for a menu to open."""
+
+    type: Literal["sleep"] = "sleep"
+    ms: int = Field(ge=0, le=60_000)
+
+
+InputAction = Annotated[
+    Union[KeyAction, TypeAction, MoveAction, ClickAction, HoldAction, ReleaseAction, SleepAction],
+    Field(discriminator="type"),
+]
+
+
+def _describe_held(action: HoldAction | ReleaseAction) -> list[str]:
+    """Describes the keys and mouse button of a hold or release action."""
+    names = [f"key {key}" for key in action.keys]
+    if action.mouse_button is not None:
+        names.append(f"mouse button {action.mouse_button}")
+    return names
+
+
+async def run_actions(
+    vnc_client: AsyncVNCClient,
+    actions: list[InputAction],
+    coordinates: CoordinateMapper,
+    *,
+    relative: bool = False,
+) -> list[str]:
+    """
+    Runs a batch of input actions in order and returns a description of every action that was run.
+
+    Mouse moves are sent with relative, the same way as the move_mouse_to tool sends them.
+
+    Anything still held when the batch ends (or fails) is released, in the reverse order it was pressed.
+    """
+    done = []
+    # Every held key or button gets its own stack, so they can be released in any order.
+    held: dict[str, AsyncExitStack] = {}
+
+    async def hold(name: str, context: AbstractAsyncContextManager[object]) -> None:
+        if name in held:
+            raise ValueError(f"{name} is already being held")
+        stack = held[name] = AsyncExitStack()
+        await stack.enter_async_context(context)
+
+    async def release(name: str) -> None:
+        stack = held.pop(name, None)
+        if stack is None:
+            raise ValueError(f"{name} is not being held")
+        await stack.aclose()
+
+    try:
+        for action in actions:
+            if isinstance(action, KeyAction):
+                await vnc_client.press(*action.keys)
+                done.append(f"struck {', '.join(action.keys)}")
+            elif isinstance(action, TypeAction):
+                await vnc_client.write(action.text)
+                done.append(f"typed {action.text}")
+            elif isinstance(action, MoveAction):
+                await vnc_client.move(coordinates.point(action.x, action.y), relative=relative)
+                done.append(f"moved mouse to ({action.x}, {action.y})")
+            elif isinstance(action, ClickAction):
+                for _ in range(action.n):
+                    await vnc_client.click(action.mouse_button)
+                done.append(f"clicked mouse button {action.mouse_button} {action.n} times")
+            elif isinstance(action, HoldAction):
+                for key in action.keys:
+                    await hold(f"key {key}", vnc_client.hold_key(key))
+                if action.mouse_button is not None:
+                    await hold(
+                        f"mouse button {action.mouse_button}",
+                        vnc_client.hold_mouse(action.mouse_button),
+                    )
+                done.append(f"held {', '.join(_describe_held(action))}")
+            elif isinstance(action, ReleaseAction):
+                for key in action.keys:
+                    await release(f"key {key}")
+                if action.mouse_button is not None:
+                    await release(f"mouse button {action.mouse_button}")
+                done.append(f"released {', '.join(_describe_held(action))}")
+            elif isinstance(action, SleepAction):
+                await asyncio.sleep(action.ms / 1000)
+                done.append(f"slept {action.ms} ms")
+    finally:
+        for name in reversed(list(held)):
+            await release(name)
+
+    return done
+
+
+__all__ = (
+    "KeyAction",
+    "TypeAction",
+    "MoveAction",
+    "ClickAction",
+    "HoldAction",
+    "ReleaseAction",
+    "SleepAction",
+    "InputAction",
+    "run_actions",
+)
@@ -0,0 +1,61 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import math
+
+import numpy as np
+from pydantic import BaseModel
+from pydantic import Field
+
+
+class CaptureRect(BaseModel):
+    """A rectangle of the workspace to capture."""
+
+    x: int
+    y: int
+    width: int = Field(gt=0)
+    height: int = Field(gt=0)
+
+
+def pack_atlas(
+    arrays: list[np.ndarray], *, gap: int = 4
+) -> tuple[np.ndarray, list[tuple[int, int]]]:
+    """
+    Packs RGBA arrays into a single RGBA array (an atlas), with gap empty pixels between them.
+
+    Returns the atlas and the (x, y) offset of every array in it, in the order they were given.
+
+    Arrays are laid out tallest first on shelves about as wide as the atlas is tall, which keeps the atlas roughly
+    square: a toolbar, a sidebar, and a status line end up in one image that isn't much larger than the three of them.
+    """
+    if not arrays:
+        return np.zeros((0, 0, 4), dtype=np.uint8), []
+
+    area = sum((array.shape[0] + gap) * (array.shape[1] + gap) for array in arrays)
+    shelf_width = max(max(array.shape[1] for array in arrays), math.isqrt(area))
+
+    offsets: list[tuple[int, int]] = [(0, 0)] * len(arrays)
+    x = y = shelf_height = width = 0
+    for index in sorted(range(len(arrays)), key=lambda index: -arrays[index].shape[0]):
+        height_of, width_of = arrays[index].shape[:2]
+        if x > 0 and x + width_of > shelf_width:
+            # This one doesn't fit on the shelf anymore, so it starts a new one below.
+            x, y, shelf_height = 0, y + shelf_height + gap, 0
+        offsets[index] = (x, y)
+        width = max(width, x + width_of)
+        x += width_of + gap
+        shelf_height = max(shelf_height, height_of)
+
+    atlas = np.zeros((y + shelf_height, width, arrays[0].shape[2]), dtype=np.uint8)
+    for array, (left, top) in zip(arrays, offsets):
+        atlas[top : top + array.shape[0], left : left + array.shape[1]] = array
+    return atlas, offsets
+
+
+__all__ = ("CaptureRect", "pack_atlas")
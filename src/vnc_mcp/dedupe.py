@@ -0,0 +1,116 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable
+
+import numpy as np
+
+from .utils.hashing import hash_rgba_array
+
+
+def _block_means(values: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """Shrinks a 2D array to rows x cols by averaging (roughly) equal blocks of it."""
+    # Images smaller than the grid are blown up first, so that every block has at least one value in it.
+    if values.shape[0] < rows:
+        values = np.repeat(values, -(-rows // values.shape[0]), axis=0)
+    if values.shape[1] < cols:
+        values = np.repeat(values, -(-cols // values.shape[1]), axis=1)
+    height, width = values.shape
+    row_starts = np.arange(rows) * height // rows
+    col_starts = np.arange(cols) * width // cols
+    sums = np.add.reduceat(np.add.reduceat(values, row_starts, axis=0), col_starts, axis=1)
+    counts = np.outer(np.diff(row_starts, append=height), np.diff(col_starts, append=width))
+    return sums / counts
+
+
+def perceptual_hash(array: np.ndarray) -> int:
+    """
+    Computes a 64-bit difference hash (dHash) of an RGBA array.
+
+    The image is shrunk to 9x8 blocks of brightness, and every bit says whether a block is brighter than its left
+    neighbor. Images that look the same have hashes that differ in few bits, even if some of their pixels differ.
+    """
+    height, width = array.shape[:2]
+    if height == 0 or width == 0:
+        return 0
+    # 72 blocks don't need every pixel, and skipping most of them makes this far cheaper than hashing the bytes.
+    step = max(min(height, width) // 64, 1)
+    sample = array[::step, ::step, :3].astype(np.float32) @ np.array(
+        [0.299, 0.587, 0.114], dtype=np.float32
+    )
+    means = _block_means(sample, 8, 9)
+    bits = means[:, 1:] > means[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+@dataclass(frozen=True)
+class ImageFingerprint:
+    """An exact digest of an image, and a perceptual hash of what it looks like."""
+
+    digest: bytes
+    perceptual: int
+
+    @classmethod
+    def of(cls, array: np.ndarray, *, perceptual: bool = True) -> ImageFingerprint:
+        """Fingerprints an RGBA array. The perceptual hash is left at 0 unless perceptual is true."""
+        return cls(hash_rgba_array(array), perceptual_hash(array) if perceptual else 0)
+
+    def matches(self, other: ImageFingerprint, threshold: int) -> bool:
+        """
+        Whether two images are the same, or (if threshold is positive) look the same: their perceptual hashes differ in
+        at most threshold bits.
+        """
+        if self.digest == other.digest:
+            return True
+        return threshold > 0 and (self.perceptual ^ other.perceptual).bit_count() <= threshold
+
+
+class SentImages:
+    """
+    Remembers the fingerprint of the last image sent for every region (and encoding) of a session, so that an image
+    that would be the same as the last one sent doesn't have to be encoded and sent again.
+
+    Only the max_entries most recently used regions are remembered.
+    """
+
+    def __init__(self, max_entries: int = 64) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[ImageFingerprint, float]] = OrderedDict()
+
+    def unchanged_for(
+        self, key: Hashable, fingerprint: ImageFingerprint, threshold: int
+    ) -> float | None:
+        """
+        Returns how many seconds ago an image matching fingerprint was last sent for key, or None if it wasn't (in
+        which case the new image is remembered as sent).
+        """
+        previous = self._entries.get(key)
+        if previous is not None and previous[0].matches(fingerprint, threshold):
+            self._entries.move_to_end(key)
+            return time.monotonic() - previous[1]
+
+        self.remember(key, fingerprint)
+        return None
+
+    def remember(self, key: Hashable, fingerprint: ImageFingerprint) -> None:
+        """Remembers an image matching fingerprint as just sent for key, whether or not it was new."""
+        self._entries[key] = (fingerprint, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def forget(self, key: Hashable) -> None:
+        """Forgets what was sent for key, i.e. because sending it failed."""
+        self._entries.pop(key, None)
+
+
+__all__ = ("perceptual_hash", "ImageFingerprint", "SentImages")
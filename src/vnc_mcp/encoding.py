@@ -0,0 +1,102 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from dataclasses import replace
+from io import BytesIO
+from typing import Literal
+from typing import get_args
+
+import numpy as np
+
+
+ImageFormat = Literal["png", "jpeg", "webp"]
+
+
+@dataclass(frozen=True)
+class ImageEncoding:
+    """
+    Describes how screenshots are encoded before they are sent to the client.
+
+    compress_level only applies to PNG (0-9, higher is smaller and slower), and quality only applies to JPEG and WebP
+    (1-100). VNC framebuffers are always opaque, so the alpha channel is dropped unless keep_alpha is set. JPEG can't
+    carry alpha at all.
+    """
+
+    format: ImageFormat = "png"
+    compress_level: int = 1
+    quality: int = 80
+    keep_alpha: bool = False
+
+    def __post_init__(self) -> None:
+        if self.format not in get_args(ImageFormat):
+            raise ValueError(
+                f"Image format must be one of {', '.join(get_args(ImageFormat))}, not {self.format}"
+            )
+        if not 0 <= self.compress_level <= 9:
+            raise ValueError(
+                f"PNG compress level must be between 0 and 9, not {self.compress_level}"
+            )
+        if not 1 <= self.quality <= 100:
+            raise ValueError(f"Image quality must be between 1 and 100, not {self.quality}")
+
+    def override(
+        self,
+        *,
+        format: ImageFormat | None = None,
+        compress_level: int | None = None,
+        quality: int | None = None,
+        keep_alpha: bool | None = None,
+    ) -> ImageEncoding:
+        """Returns a copy of this encoding with every argument that isn't None replaced."""
+        changes = {
+            "format": format,
+            "compress_level": compress_level,
+            "quality": quality,
+            "keep_alpha": keep_alpha,
+        }
+        return replace(self, **{key: value for key, value in changes.items() if value is not None})
+
+
+def encode_rgba_array(array: np.ndarray, encoding: ImageEncoding) -> bytes:
+    """Encodes an RGBA array of the framebuffer into an image file with the given encoding."""
+    from PIL import Image as PILImage
+
+    if encoding.keep_alpha and encoding.format != "jpeg":
+        pilimage = PILImage.fromarray(array, "RGBA")
+    else:
+        # Slicing off the alpha channel leaves a non-contiguous view, which Pillow would copy anyway.
+        pilimage = PILImage.fromarray(np.ascontiguousarray(array[..., :3]), "RGB")
+
+    with BytesIO() as bio:
+        if encoding.format == "png":
+            pilimage.save(bio, "png", compress_level=encoding.compress_level)
+        elif encoding.format == "jpeg":
+            pilimage.save(bio, "jpeg", quality=encoding.quality)
+        else:
+            # method 0 is the fastest WebP encoder setting; the default (4) is several times slower for little gain.
+            pilimage.save(bio, "webp", quality=encoding.quality, method=0)
+        return bio.getvalue()
+
+
+def decode_rgba_array(data: bytes) -> np.ndarray:
+    """Decodes an image file in any format Pillow can read into an RGBA array, the same shape as the framebuffer."""
+    from PIL import Image as PILImage
+    from PIL import UnidentifiedImageError
+
+    try:
+        with PILImage.open(BytesIO(data)) as pilimage:
+            return np.asarray(pilimage.convert("RGBA"))
+    except UnidentifiedImageError as e:
+        raise ValueError(
+            "The image could not be decoded. It must be a PNG, JPEG, or WebP file"
+        ) from e
+
+
+__all__ = ("ImageFormat", "ImageEncoding", "encode_rgba_array", "decode_rgba_array")
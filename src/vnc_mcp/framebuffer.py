@@ -0,0 +1,312 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from types import TracebackType
+from typing import Awaitable
+from typing import Callable
+
+import numpy as np
+from pyvnc import AsyncVNCClient
+from pyvnc import Rect
+
+from .metrics import phase
+
+
+logger = logging.getLogger(__name__)
+
+# What a dropped connection looks like: resets, timeouts, and streams that end halfway through a message.
+CONNECTION_ERRORS = (OSError, EOFError)
+
+
+def _clamp_rect(rect: Rect, width: int, height: int) -> Rect:
+    left = min(max(rect.x, 0), width)
+    top = min(max(rect.y, 0), height)
+    right = min(max(rect.x + rect.width, left), width)
+    bottom = min(max(rect.y + rect.height, top), height)
+    return Rect(left, top, right - left, bottom - top)
+
+
+def crop_rgba_array(array: np.ndarray, rect: Rect) -> np.ndarray:
+    """Returns a view of the part of an RGBA array inside rect, which is clamped to the bounds of the array."""
+    height, width = array.shape[:2]
+    rect = _clamp_rect(rect, width, height)
+    return array[rect.y : rect.y + rect.height, rect.x : rect.x + rect.width]
+
+
+class ShadowFramebuffer:
+    """
+    A long-lived local copy of the VNC session's framebuffer.
+
+    Captures are served out of local memory for as long as the copy is considered fresh. The copy is refreshed when it
+    is older than max_age, when it has been invalidated (i.e. because input was sent to the session), or periodically
+    in the background if a refresh_interval is given.
+
+    Every refresh replaces the shadow with a brand new array instead of writing into the old one, so the (read-only)
+    views handed out by capture stay valid even while an encoder in another thread is still working on them.
+
+    Concurrent refreshes are coalesced into a single request to the server: there is only ever one in flight, and
+    every caller that would be satisfied by it shares its result instead of sending a request of its own. Callers that
+    asked for a subrectangle are cropped out of that one frame, and max_age is the window in which any later callers
+    are served from it, too.
+    """
+
+    def __init__(
+        self,
+        vnc_client: AsyncVNCClient,
+        *,
+        max_age: float = 0.5,
+        refresh_interval: float | None = None,
+        poll_interval: float = 0.1,
+    ) -> None:
+        self._vnc_client = vnc_client
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.poll_interval = poll_interval
+
+        self._frame: np.ndarray | None = None
+        self._captured_at = float("-inf")
+        # Bumped by every invalidation. A frame (or a request in flight) is only clean if it's from the current epoch.
+        self._epoch = 0
+        self._frame_epoch = -1
+        # Counts every sync with the server, so that waiters can tell new frames apart from ones they've already seen.
+        self._generation = 0
+        # RFB is one stream, so only one update request may be in flight at a time. Everyone else joins it.
+        self._inflight: asyncio.Task[np.ndarray] | None = None
+        self._inflight_epoch = -1
+        # Set while the request in flight is only for a subrectangle, which doesn't sync the shadow.
+        self._inflight_rect: Rect | None = None
+        self.fetches = 0
+        self.coalesced = 0
+        self._updated = asyncio.Condition()
+        self._refresher: asyncio.Task[None] | None = None
+        # Set by whoever can reconnect the client. Capturing is idempotent, so a fetch is retried once it returns.
+        self.on_connection_lost: Callable[[], Awaitable[None]] | None = None
+        # Called with every new frame synced from the server, i.e. to keep a history of them.
+        self.on_frame: Callable[[np.ndarray], None] | None = None
+
+    @property
+    def age(self) -> float:
+        """Seconds since the shadow was last synchronized with the server."""
+        return time.monotonic() - self._captured_at
+
+    @property
+    def generation(self) -> int:
+        """How many times the shadow has been synchronized with the server."""
+        return self._generation
+
+    @property
+    def is_fresh(self) -> bool:
+        """Whether a capture can currently be served without talking to the server."""
+        return (
+            self._frame is not None
+            and self._frame_epoch == self._epoch
+            and self.age <= self.max_age
+        )
+
+    def invalidate(self) -> None:
+        """Marks the shadow as stale so that the next capture goes to the server."""
+        self._epoch += 1
+
+    def replace_client(self, vnc_client: AsyncVNCClient) -> None:
+        """Switches over to a new connection to the same server, which the next capture is synced from."""
+        self._vnc_client = vnc_client
+        self.invalidate()
+
+    async def refresh(self, *, force: bool = False) -> np.ndarray:
+        """
+        Synchronizes the shadow with the server and returns the new full frame.
+
+        Unless force is set, this returns right away if the shadow is fresh, and otherwise joins a request in flight if
+        it went out after the last invalidation. A forced refresh only needs a frame newer than the current one, so it
+        joins whatever request is in flight.
+        """
+        while True:
+            if not force and self.is_fresh:
+                assert self._frame is not None
+                return self._frame
+
+            inflight = self._inflight
+            if inflight is None:
+                self.fetches += 1
+                inflight = self._inflight = asyncio.create_task(self._fetch(self._epoch))
+                self._inflight_epoch = self._epoch
+                inflight.add_done_callback(self._fetched)
+            elif self._inflight_rect is not None:
+                # Only a subrectangle is on its way, which is no use for a full frame.
+                await asyncio.wait([inflight])
+                continue
+            elif force or self._inflight_epoch == self._epoch:
+                self.coalesced += 1
+            else:
+                # That request went out before the last input, so it can't show its effects. Wait for it to land, and
+                # then send a new one (unless someone else beats us to it).
+                await asyncio.wait([inflight])
+                continue
+
+            # Callers are often cancelled by a timeout. That must not cut off a request that others are waiting on.
+            return await asyncio.shield(inflight)
+
+    async def _request(self, rect: Rect | None) -> tuple[np.ndarray, bool]:
+        # Returns what the server sent, and whether it came over a new connection because the old one had dropped.
+        try:
+            return await self._capture_from_server(rect), False
+        except CONNECTION_ERRORS:
+            if self.on_connection_lost is None:
+                raise
+            await self.on_connection_lost()
+            return await self._capture_from_server(rect), True
+
+    async def _capture_from_server(self, rect: Rect | None) -> np.ndarray:
+        if rect is None:
+            return await self._vnc_client.capture()
+        return await self._vnc_client.capture(rect, relative=False)
+
+    async def _fetch(self, epoch: int) -> np.ndarray:
+        frame, reconnected = await self._request(None)
+        if reconnected:
+            # The new connection may have been made after further input, so the frame it sends is current.
+            epoch = self._epoch
+        frame = frame.view()
+        frame.flags.writeable = False
+        self._frame = frame
+        self._frame_epoch = epoch
+        self._captured_at = time.monotonic()
+        self._generation += 1
+        if self.on_frame is not None:
+            self.on_frame(frame)
+
+        async with self._updated:
+            self._updated.notify_all()
+        return frame
+
+    async def _fetch_rect(self, rect: Rect) -> np.ndarray:
+        frame, _ = await self._request(rect)
+        frame = frame.view()
+        frame.flags.writeable = False
+        return frame
+
+    def _fetched(self, task: asyncio.Task[np.ndarray]) -> None:
+        self._inflight = None
+        self._inflight_rect = None
+        if not task.cancelled():
+            # Retrieve the exception, so it isn't reported as unhandled when every caller had already given up on it.
+            task.exception()
+
+    async def capture(self, rect: Rect | None = None) -> np.ndarray:
+        """
+        Returns an RGBA array of the framebuffer (or a subrectangle of it) in absolute framebuffer pixels.
+
+        The returned array is read-only and must not be modified.
+
+        If the shadow is stale and only a small subrectangle is needed, just that subrectangle is requested from the
+        server, which is much cheaper than the whole framebuffer (i.e. for a small screenshot right after a click). That
+        leaves the shadow stale, so the next capture of the whole framebuffer still goes to the server.
+        """
+        frame = self._frame if self.is_fresh else None
+        if frame is None:
+            with phase("capture"):
+                if rect is not None and self._frame is not None:
+                    height, width = self._frame.shape[:2]
+                    rect = _clamp_rect(rect, width, height)
+                    if 0 < rect.width * rect.height * 2 < width * height:
+                        return await self._capture_rect(rect)
+                # Most of the framebuffer costs about as much as all of it, which resyncs the shadow, too.
+                frame = await self.refresh()
+
+        if rect is None:
+            return frame
+        return crop_rgba_array(frame, rect)
+
+    async def _capture_rect(self, rect: Rect) -> np.ndarray:
+        while True:
+            if self.is_fresh:
+                assert self._frame is not None
+                return crop_rgba_array(self._frame, rect)
+
+            inflight = self._inflight
+            if inflight is None:
+                return await asyncio.shield(self._start_rect_fetch(rect))
+            if self._inflight_rect is None and self._inflight_epoch == self._epoch:
+                # A whole frame that is already on its way is just as current, and costs nothing extra.
+                self.coalesced += 1
+                return crop_rgba_array(await asyncio.shield(inflight), rect)
+            # RFB is one stream, so this has to wait its turn behind the request in flight.
+            await asyncio.wait([inflight])
+
+    def _start_rect_fetch(self, rect: Rect) -> asyncio.Task[np.ndarray]:
+        self.fetches += 1
+        inflight = self._inflight = asyncio.create_task(self._fetch_rect(rect))
+        self._inflight_epoch = self._epoch
+        self._inflight_rect = rect
+        inflight.add_done_callback(self._fetched)
+        return inflight
+
+    async def probe(self) -> None:
+        """
+        Checks that the server still answers by requesting a single pixel from it, which costs next to nothing compared
+        to a refresh. If a request is already in flight, its answer is waited for instead.
+        """
+        inflight = self._inflight
+        if inflight is None:
+            inflight = self._start_rect_fetch(Rect(0, 0, 1, 1))
+        await asyncio.shield(inflight)
+
+    async def wait_for_frame(self, newer_than: int) -> tuple[int, np.ndarray]:
+        """
+        Waits for a frame that was synchronized after the given generation and returns it along with its generation.
+
+        If the shadow is being refreshed in the background, this simply waits for the next refresh. Otherwise, a
+        refresh is requested once at least poll_interval seconds have passed since the last one.
+        """
+        while True:
+            if self._generation > newer_than and self._frame is not None:
+                return self._generation, self._frame
+
+            if self._refresher is not None:
+                async with self._updated:
+                    await self._updated.wait_for(lambda: self._generation > newer_than)
+            else:
+                await asyncio.sleep(max(self.poll_interval - self.age, 0))
+                if self._generation <= newer_than:
+                    await self.refresh(force=True)
+
+    async def _refresh_forever(self, interval: float) -> None:
+        while True:
+            try:
+                await self.refresh(force=True)
+            except Exception:
+                logger.exception("Background framebuffer refresh failed.")
+            await asyncio.sleep(interval)
+
+    async def __aenter__(self) -> ShadowFramebuffer:
+        if self.refresh_interval:
+            self._refresher = asyncio.create_task(self._refresh_forever(self.refresh_interval))
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+        if self._inflight is not None:
+            self._inflight.cancel()
+
+
+__all__ = ("CONNECTION_ERRORS", "crop_rgba_array", "ShadowFramebuffer")
@@ -0,0 +1,308 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import mmap
+import tempfile
+import threading
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .utils.tiles import changed_tile_mask
+
+
+# Roughly what an entry costs in Python objects on top of its blob, so that a long run of tiny deltas is bounded too.
+_ENTRY_OVERHEAD = 256
+
+
+@dataclass(frozen=True)
+class PastFrame:
+    """A frame out of the history, when it was captured (in time.monotonic() seconds), and how many actions preceded it."""
+
+    array: np.ndarray
+    captured_at: float
+    actions: int
+
+
+@dataclass
+class _Entry:
+    captured_at: float
+    actions: int
+    shape: tuple[int, ...]
+    # Keyframes are a whole frame. Everything else is the (y, x, height, width) tiles that changed since the entry before.
+    keyframe: bool
+    tiles: list[tuple[int, int, int, int]] = field(default_factory=list)
+    handle: Any = None
+    size: int = 0
+
+
+class _MemoryBlobs:
+    """Keeps blobs in memory."""
+
+    def fits(self, length: int) -> bool:
+        return True
+
+    def put(self, data: bytes) -> Any:
+        return data
+
+    def get(self, handle: Any) -> bytes:
+        return handle
+
+    def free_oldest(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class _MappedBlobs:
+    """
+    Keeps blobs in a ring buffer inside a memory-mapped temporary file, so that the history mostly lives in the page
+    cache instead of the heap. Blobs must be freed in the order they were put.
+    """
+
+    def __init__(self, directory: Path, capacity: int) -> None:
+        self._capacity = capacity
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self._file.truncate(capacity)
+        self._map = mmap.mmap(self._file.fileno(), capacity)
+        self._live: deque[tuple[int, int]] = deque()
+
+    def _offset_for(self, length: int) -> int | None:
+        if not self._live:
+            return 0 if length <= self._capacity else None
+        head = self._live[0][0]
+        tail = self._live[-1][0] + self._live[-1][1]
+        if tail > head:
+            # Not wrapped yet: there is room after the tail, and before the head once the end is reached.
+            if tail + length <= self._capacity:
+                return tail
+            return 0 if length <= head else None
+        return tail if tail + length <= head else None
+
+    def fits(self, length: int) -> bool:
+        return self._offset_for(length) is not None
+
+    def put(self, data: bytes) -> Any:
+        offset = self._offset_for(len(data))
+        assert offset is not None
+        self._map[offset : offset + len(data)] = data
+        self._live.append((offset, len(data)))
+        return offset, len(data)
+
+    def get(self, handle: Any) -> bytes:
+        offset, length = handle
+        return self._map[offset : offset + length]
+
+    def free_oldest(self) -> None:
+        self._live.popleft()
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+class FrameHistory:
+    """
+    A rolling history of the frames of a session, bounded to max_bytes.
+
+    Frames are stored as zlib-compressed keyframes, each followed by deltas of only the tiles that changed since the
+    frame before. A frame identical to the one before isn't stored at all. A new keyframe starts every
+    keyframe_interval frames, or when most of the screen changed, and the oldest keyframe (along with its deltas) is
+    dropped whenever there isn't enough room.
+
+    If spill_directory is given, the compressed frames are kept in a memory-mapped temporary file there instead of in
+    memory, which the OS can page out.
+
+    Every method is thread-safe, since recording and reconstructing frames is done in executor threads.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        *,
+        keyframe_interval: int = 30,
+        tile_size: int = 64,
+        spill_directory: Path | None = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.keyframe_interval = keyframe_interval
+        self.tile_size = tile_size
+        # Bumped by every action (input) sent to the session.
+        self.actions = 0
+        self._blobs: _MemoryBlobs | _MappedBlobs = (
+            _MappedBlobs(spill_directory, max_bytes)
+            if spill_directory is not None
+            else _MemoryBlobs()
+        )
+        self._entries: list[_Entry] = []
+        self._bytes = 0
+        # The newest frame, which the next delta is taken against. It's a read-only view from the shadow framebuffer,
+        # so keeping it around doesn't cost a copy.
+        self._previous: np.ndarray | None = None
+        self._since_keyframe = 0
+        self._lock = threading.Lock()
+
+    @property
+    def frames(self) -> int:
+        """How many (distinct) frames are in the history."""
+        return len(self._entries)
+
+    @property
+    def stored_bytes(self) -> int:
+        """How many bytes the history takes up, give or take."""
+        return self._bytes
+
+    def note_action(self) -> None:
+        """Counts an action sent to the session, which frames captured from now on come after."""
+        self.actions += 1
+
+    def record(self, frame: np.ndarray, captured_at: float, actions: int) -> None:
+        """Adds a frame (an RGBA array) captured at captured_at, after the given number of actions."""
+        with self._lock:
+            previous = self._previous
+            if previous is frame:
+                return
+            if self._entries and captured_at < self._entries[-1].captured_at:
+                # Frames are recorded in executor threads, which may finish out of order. A stale frame is just dropped.
+                return
+
+            entry: _Entry | None = None
+            if previous is not None and previous.shape == frame.shape:
+                mask = changed_tile_mask(previous, frame, self.tile_size)
+                if not mask.any():
+                    return
+                # A delta of most of the screen is barely smaller than a keyframe, and makes every later frame slower.
+                if self._since_keyframe < self.keyframe_interval and mask.mean() <= 0.5:
+                    entry = self._delta(frame, mask, captured_at, actions)
+                    if not self._make_room(entry.size, keep_newest=True):
+                        # The keyframe this would build on is about to be dropped, so start over with a new one.
+                        entry = None
+
+            if entry is None:
+                entry = self._keyframe(frame, captured_at, actions)
+                if not self._make_room(entry.size, keep_newest=False):
+                    # A single frame doesn't even fit in the history.
+                    self._previous = None
+                    return
+                self._since_keyframe = 0
+            else:
+                self._since_keyframe += 1
+
+            entry.handle = self._blobs.put(entry.handle)
+            self._entries.append(entry)
+            self._bytes += entry.size + _ENTRY_OVERHEAD
+            self._previous = frame
+
+    def _keyframe(self, frame: np.ndarray, captured_at: float, actions: int) -> _Entry:
+        data = zlib.compress(np.ascontiguousarray(frame).tobytes(), 1)
+        return _Entry(captured_at, actions, frame.shape, True, handle=data, size=len(data))
+
+    def _delta(
+        self, frame: np.ndarray, mask: np.ndarray, captured_at: float, actions: int
+    ) -> _Entry:
+        height, width = frame.shape[:2]
+        tiles = []
+        for row, col in np.argwhere(mask).tolist():
+            y, x = row * self.tile_size, col * self.tile_size
+            tiles.append((y, x, min(self.tile_size, height - y), min(self.tile_size, width - x)))
+        data = zlib.compress(
+            b"".join(frame[y : y + h, x : x + w].tobytes() for y, x, h, w in tiles), 1
+        )
+        return _Entry(captured_at, actions, frame.shape, False, tiles, handle=data, size=len(data))
+
+    def _make_room(self, size: int, *, keep_newest: bool) -> bool:
+        # Drops the oldest keyframes (and their deltas) until size more bytes fit. A delta needs the newest keyframe.
+        while self._bytes + size + _ENTRY_OVERHEAD > self.max_bytes or not self._blobs.fits(size):
+            if not self._entries or (keep_newest and self._keyframes() <= 1):
+                return False
+            self._evict_oldest_keyframe()
+        return True
+
+    def _keyframes(self) -> int:
+        return sum(1 for entry in self._entries if entry.keyframe)
+
+    def _evict_oldest_keyframe(self) -> None:
+        count = 1
+        while count < len(self._entries) and not self._entries[count].keyframe:
+            count += 1
+        for entry in self._entries[:count]:
+            self._blobs.free_oldest()
+            self._bytes -= entry.size + _ENTRY_OVERHEAD
+        del self._entries[:count]
+        if not self._entries:
+            self._previous = None
+
+    def _reconstruct(self, index: int) -> np.ndarray:
+        if index == len(self._entries) - 1 and self._previous is not None:
+            return self._previous
+        start = index
+        while not self._entries[start].keyframe:
+            start -= 1
+        keyframe = self._entries[start]
+        frame = (
+            np.frombuffer(zlib.decompress(self._blobs.get(keyframe.handle)), dtype=np.uint8)
+            .reshape(keyframe.shape)
+            .copy()
+        )
+        channels = keyframe.shape[2]
+        for entry in self._entries[start + 1 : index + 1]:
+            data = zlib.decompress(self._blobs.get(entry.handle))
+            offset = 0
+            for y, x, h, w in entry.tiles:
+                count = h * w * channels
+                frame[y : y + h, x : x + w] = np.frombuffer(
+                    data, dtype=np.uint8, count=count, offset=offset
+                ).reshape(h, w, channels)
+                offset += count
+        frame.flags.writeable = False
+        return frame
+
+    def _find(self, matches: Any) -> PastFrame | None:
+        with self._lock:
+            for index in range(len(self._entries) - 1, -1, -1):
+                entry = self._entries[index]
+                if matches(entry):
+                    return PastFrame(self._reconstruct(index), entry.captured_at, entry.actions)
+            return None
+
+    def frame_at(self, when: float) -> PastFrame | None:
+        """The frame that was on screen at when (a time.monotonic() timestamp), or None if that's before the history."""
+        return self._find(lambda entry: entry.captured_at <= when)
+
+    def frame_before_actions(self, actions_ago: int) -> PastFrame | None:
+        """
+        The last frame captured before the actions_ago-th most recent action was sent (so 0 is the newest frame), or
+        None if that's before the history.
+        """
+        return self._find(lambda entry: entry.actions <= self.actions - actions_ago)
+
+    def oldest(self) -> tuple[float, int] | None:
+        """When the oldest frame in the history was captured, and after how many actions."""
+        with self._lock:
+            if not self._entries:
+                return None
+            return self._entries[0].captured_at, self._entries[0].actions
+
+    def close(self) -> None:
+        """Frees the history (and its file, if it was spilled to one)."""
+        with self._lock:
+            self._entries.clear()
+            self._previous = None
+            self._bytes = 0
+            self._blobs.close()
+            self._blobs = _MemoryBlobs()
+
+
+__all__ = ("PastFrame", "FrameHistory")
@@ -0,0 +1,130 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class TemplateMatch:
+    """Where a template was found in an image (the top-left corner of the match), and how well it matched (0-1)."""
+
+    x: int
+    y: int
+    width: int
+    height: int
+    score: float
+
+
+def _luma(array: np.ndarray) -> np.ndarray:
+    # Matching on brightness alone is a third of the work of matching every channel, and icons rarely differ only by hue.
+    rgb = array[..., :3].astype(np.float64)
+    return rgb @ np.array([0.299, 0.587, 0.114])
+
+
+def _window_sums(values: np.ndarray, height: int, width: int) -> np.ndarray:
+    """Sums every height x width window of values with a summed-area table."""
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1))
+    np.cumsum(np.cumsum(values, axis=0), axis=1, out=table[1:, 1:])
+    return (
+        table[height:, width:]
+        - table[:-height, width:]
+        - table[height:, :-width]
+        + table[:-height, :-width]
+    )
+
+
+def match_template(image: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """
+    Computes the normalized cross-correlation of a template with every position in an image (both RGBA arrays).
+
+    Returns an array with a score for every position the template fits at (the top-left corner of the template), from
+    -1 to 1, where 1 is a perfect match. Scores don't depend on brightness or contrast, so a button still matches
+    while it is highlighted. Flat areas of the image, which nothing but a flat template could match, score 0.
+
+    The correlation itself is done with FFTs, so it costs about the same for any template size.
+    """
+    template_height, template_width = template.shape[:2]
+    image_height, image_width = image.shape[:2]
+    if template_height > image_height or template_width > image_width:
+        return np.zeros((0, 0))
+
+    patch = _luma(template)
+    patch -= patch.mean()
+    patch_energy = float((patch * patch).sum())
+    if patch_energy < 1e-6:
+        raise ValueError(
+            "The reference image is a single flat color, so it can't be told apart from anything"
+        )
+
+    values = _luma(image)
+    # Scores don't change with the overall brightness, so centering it only keeps rounding errors small.
+    values -= values.mean()
+    # Correlating with the zero-mean template means the window's own mean cancels out of the numerator.
+    shape = (image_height + template_height - 1, image_width + template_width - 1)
+    correlation = np.fft.irfft2(
+        np.fft.rfft2(values, shape) * np.fft.rfft2(patch[::-1, ::-1], shape), shape
+    )[template_height - 1 : image_height, template_width - 1 : image_width]
+
+    count = template_height * template_width
+    window_sums = _window_sums(values, template_height, template_width)
+    window_energy = _window_sums(values * values, template_height, template_width)
+    variance = np.maximum(window_energy - window_sums * window_sums / count, 0)
+    denominator = np.sqrt(variance * patch_energy)
+
+    scores = np.zeros_like(correlation)
+    # Windows that vary by less than a tenth of a brightness level are flat, and their variance is mostly rounding error.
+    np.divide(correlation, denominator, out=scores, where=variance > 0.01 * count)
+    return np.clip(scores, -1.0, 1.0)
+
+
+def find_template_matches(
+    scores: np.ndarray,
+    template_width: int,
+    template_height: int,
+    *,
+    threshold: float = 0.9,
+    max_matches: int = 10,
+) -> list[TemplateMatch]:
+    """
+    Picks the best matches out of the scores of match_template, best first.
+
+    A match only counts if it doesn't overlap a better one, so that a template isn't found again a pixel away from
+    itself.
+    """
+    candidates = np.flatnonzero(scores >= threshold)
+    if len(candidates) == 0 or max_matches <= 0:
+        return []
+    # Every pick rules out at most this many candidates around it, so no candidate past the limit can ever be picked.
+    limit = max_matches * (2 * template_width - 1) * (2 * template_height - 1)
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-scores.flat[candidates], limit)[:limit]]
+    candidates = candidates[np.argsort(-scores.flat[candidates], kind="stable")]
+
+    ys, xs = np.unravel_index(candidates, scores.shape)
+    matches: list[TemplateMatch] = []
+    taken = np.zeros(scores.shape, dtype=bool)
+    for x, y, index in zip(xs.tolist(), ys.tolist(), candidates.tolist()):
+        if taken[y, x]:
+            continue
+        matches.append(
+            TemplateMatch(x, y, template_width, template_height, float(scores.flat[index]))
+        )
+        if len(matches) == max_matches:
+            break
+        # Every position whose window would overlap this match's is out.
+        taken[
+            max(y - template_height + 1, 0) : y + template_height,
+            max(x - template_width + 1, 0) : x + template_width,
+        ] = True
+    return matches
+
+
+__all__ = ("TemplateMatch", "match_template", "find_template_matches")
@@ -7,115 +7,511 @@ SPDX-License-Identifier: AGPL-3.0-or-later
 
 from __future__ import annotations
 
-from io import BytesIO
+import asyncio
+import base64
+import binascii
+import functools
+import inspect
+import json
+import time
+from typing import Any
+from typing import Callable
+from typing import Literal
 
 import numpy as np
-import pytesseract
 from mcp.server import FastMCP
 from mcp.server.fastmcp import Image as MCPImage
-from PIL import Image as PILImage
-from pyvnc import AsyncVNCClient
-from pyvnc import Point
 from pyvnc import Rect
 
+from .actions import InputAction
+from .actions import run_actions
+from .atlas import CaptureRect
+from .atlas import pack_atlas
+from .dedupe import ImageFingerprint
+from .encoding import ImageEncoding
+from .encoding import ImageFormat
+from .encoding import decode_rgba_array
+from .encoding import encode_rgba_array
+from .framebuffer import crop_rgba_array
+from .history import FrameHistory
+from .matching import TemplateMatch
+from .matching import find_template_matches
+from .matching import match_template
+from .metrics import ToolMetrics
+from .metrics import phase
+from .ocr import OCRBackend
+from .ocr import OCRCache
+from .ocr import OCRLine
+from .ocr import OCRWord
+from .ocr import ParallelOCRBackend
+from .ocr import PytesseractBackend
+from .ocr import find_phrase
+from .ocr import group_words_into_lines
+from .pool import VNCSessionPool
+from .profiling import ToolProfiler
+from .sampling import SamplePoint
+from .sampling import SampleRect
+from .sampling import describe_color
+from .sampling import mean_rect_colors
+from .sampling import sample_point_colors
+from .scaling import CoordinateMapper
+from .scaling import ScreenScaling
+from .scaling import downscale_rgba_array
+from .session import VNCSession
+from .session import serving_client
+from .utils.asyncio import executor_stats
 from .utils.asyncio import make_async
+from .utils.asyncio import run_cpu_bound
+from .utils.tiles import changed_tile_mask
+from .utils.tiles import tile_mask_to_rects
 
 
+MCPTransport = Literal["stdio", "sse", "streamable-http"]
+
 # In testing, I tried to use relative coordinates, but the model I tested with (Claude 4 Opus) did not work well with them. It automatically tried to use absolute coordinates.
+# Captures are served from the shadow framebuffer, which only speaks absolute coordinates, so this only affects input.
 RELATIVE_COORDINATE_MODE = False
 
 
+def _downscale_and_encode_rgba_np_ndarray(
+    array: np.ndarray, encoding: ImageEncoding, scale_factor: float
+) -> bytes:
+    return encode_rgba_array(downscale_rgba_array(array, scale_factor), encoding)
+
+
+async def _convert_rgba_np_ndarray_to_mcpimage(
+    array: np.ndarray, encoding: ImageEncoding, *, scale_factor: float = 1.0
+) -> MCPImage:
+    with phase("encode"):
+        data = await run_cpu_bound(
+            _downscale_and_encode_rgba_np_ndarray, array, encoding, scale_factor
+        )
+    return MCPImage(data=data, format=encoding.format)
+
+
+def _downscale_and_encode_atlas(
+    array: np.ndarray,
+    rects: list[tuple[int, int, int, int]],
+    encoding: ImageEncoding,
+    scale_factor: float,
+) -> tuple[bytes, list[tuple[int, int, int, int]]]:
+    # Rects are plain tuples, since they may have to be pickled over to a worker process.
+    crops = [
+        downscale_rgba_array(crop_rgba_array(array, Rect(*rect)), scale_factor) for rect in rects
+    ]
+    atlas, offsets = pack_atlas(crops)
+    return encode_rgba_array(atlas, encoding), [
+        (x, y, crop.shape[1], crop.shape[0]) for (x, y), crop in zip(offsets, crops)
+    ]
+
+
+def _find_image(
+    array: np.ndarray, template: np.ndarray, scale_factor: float, threshold: float, max_matches: int
+) -> list[TemplateMatch]:
+    # The reference image was cut out of a (possibly scaled) screenshot, so it is matched against the screen at the
+    # same scale. That also makes matching on a scaled-down screen cheaper.
+    scores = match_template(downscale_rgba_array(array, scale_factor), template)
+    height, width = template.shape[:2]
+    return find_template_matches(
+        scores, width, height, threshold=threshold, max_matches=max_matches
+    )
+
+
+_decode_rgba_array = make_async(decode_rgba_array)
+_fingerprint_rgba_array = make_async(ImageFingerprint.of)
+_frame_at = make_async(FrameHistory.frame_at)
+_frame_before_actions = make_async(FrameHistory.frame_before_actions)
+
+
+@make_async
+def _find_changed_rects(
+    previous: np.ndarray | None, current: np.ndarray, tile_size: int
+) -> list[Rect]:
+    height, width = current.shape[:2]
+    if previous is None or previous.shape != current.shape:
+        # Nothing to compare to, so everything is new.
+        return [Rect(0, 0, width, height)]
+    mask = changed_tile_mask(previous, current, tile_size)
+    return tile_mask_to_rects(mask, tile_size, width, height)
+
+
 @make_async
-def _convert_rgba_np_ndarray_to_mcpimage(array: np.ndarray) -> MCPImage:
-    pilimage = PILImage.fromarray(array, "RGBA")
-    with BytesIO() as bio:
-        pilimage.save(bio, "png")
-        bio.seek(0)
-        image_png_bytes = bio.read()
-        return MCPImage(data=image_png_bytes, format="png")
+def _sample_colors(
+    array: np.ndarray, points: np.ndarray, rects: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    return sample_point_colors(array, points), mean_rect_colors(array, rects)
 
 
 @make_async
-def _convert_rgba_np_ndarray_to_string(array: np.ndarray, *, lang: str = "eng") -> str:
-    pilimage = PILImage.fromarray(array, "RGBA")
-    return pytesseract.image_to_string(pilimage, lang=lang)
+def _rgba_arrays_differ(previous: np.ndarray, current: np.ndarray) -> bool:
+    return not np.array_equal(previous, current)
+
+
+def _ocr_rgba_np_ndarray(
+    array: np.ndarray, backend: OCRBackend, lang: str, kind: str
+) -> str | list[OCRWord]:
+    if kind == "words":
+        return backend.image_to_words(array, lang)
+    return backend.image_to_string(array, lang)
+
+
+_submit_parallel_ocr = make_async(ParallelOCRBackend.submit)
+_ocr_cache_key = make_async(OCRCache.key)
+
+
+async def _cached_ocr(
+    array: np.ndarray, backend: OCRBackend, *, lang: str, cache: OCRCache | None, kind: str
+) -> str | list[OCRWord]:
+    key = None
+    with phase("ocr"):
+        if cache is not None:
+            key = await _ocr_cache_key(array, lang, kind=kind)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        if isinstance(backend, ParallelOCRBackend):
+            # It already spreads the work over its own processes. Only handing the bands out takes a (light) thread;
+            # the bands are waited on right here, so that a few slow OCRs can't tie up every light thread.
+            bands, futures = await _submit_parallel_ocr(backend, array, lang, kind=kind)
+            results = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+            value = backend.combine(bands, results, kind=kind, height=array.shape[0])
+        else:
+            value = await run_cpu_bound(_ocr_rgba_np_ndarray, array, backend, lang, kind)
+
+    if cache is not None and key is not None:
+        cache.put(key, value)
+    return value
+
+
+async def _convert_rgba_np_ndarray_to_words(
+    array: np.ndarray, backend: OCRBackend, *, lang: str = "eng", cache: OCRCache | None = None
+) -> list[OCRWord]:
+    return await _cached_ocr(array, backend, lang=lang, cache=cache, kind="words")  # type: ignore[return-value]
+
+
+def _box_to_client_rect(
+    box: OCRWord | OCRLine, coordinates: CoordinateMapper, origin: tuple[int, int]
+) -> Rect:
+    return coordinates.rect_to_client(
+        Rect(box.left + origin[0], box.top + origin[1], box.width, box.height)
+    )
 
 
-def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
+def _box_to_dict(
+    box: OCRWord | OCRLine, coordinates: CoordinateMapper, origin: tuple[int, int]
+) -> dict[str, object]:
+    rect = _box_to_client_rect(box, coordinates, origin)
+    return {"text": box.text, "x": rect.x, "y": rect.y, "width": rect.width, "height": rect.height}
+
+
+def _content_bytes(content: Any) -> int:
+    # Roughly what a tool's result costs to send: the raw image bytes, or the text.
+    if isinstance(content, MCPImage):
+        return len(content.data or b"")
+    if isinstance(content, str):
+        return len(content.encode())
+    if isinstance(content, (list, tuple)):
+        return sum(_content_bytes(item) for item in content)
+    return 0
+
+
+def _rects_to_json(rects: list[Rect]) -> str:
+    return json.dumps(
+        [{"x": rect.x, "y": rect.y, "width": rect.width, "height": rect.height} for rect in rects]
+    )
+
+
+async def _convert_rgba_np_ndarray_to_string(
+    array: np.ndarray, backend: OCRBackend, *, lang: str = "eng", cache: OCRCache | None = None
+) -> str:
+    return await _cached_ocr(array, backend, lang=lang, cache=cache, kind="text")  # type: ignore[return-value]
+
+
+def create_mcp_server(
+    sessions: VNCSessionPool,
+    *,
+    image_encoding: ImageEncoding | None = None,
+    ocr_backend: OCRBackend | None = None,
+    ocr_cache: OCRCache | None = None,
+    metrics: ToolMetrics | None = None,
+    profiler: ToolProfiler | None = None,
+    unchanged_threshold: int | None = 0,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+) -> FastMCP:
     """
-    Creates a final FastMCP server initialized with the created AsyncVNCClient.
+    Creates a final FastMCP server that drives the sessions in the given pool.
+
+    Every tool takes an optional session_id naming the pooled session it acts on, and uses the pool's default session
+    if none is given.
+
+    host and port are only used when the server is run over HTTP (SSE or streamable HTTP), in which case every client
+    shares the pool.
+
+    image_encoding is the server-wide default for how screenshots are encoded. Tools may override it per call.
+
+    ocr_backend does the OCR for the OCR tools, and defaults to running tesseract through pytesseract. If an ocr_cache
+    is given, OCR results are cached in it so that unchanged pixels are never OCRed twice.
+
+    Every tool call is recorded in metrics (or in a new ToolMetrics, if none is given), which the get_diagnostics tool
+    reports. If a profiler is given, a sample of tool calls is profiled with it, too.
+
+    Screenshots that would be identical to the last one sent for the same region are replaced with a short note, unless
+    unchanged_threshold is None. If it is positive, screenshots whose perceptual hashes differ in at most that many
+    bits (out of 64) count as identical, too.
     """
 
+    default_image_encoding = image_encoding or ImageEncoding()
+    ocr_backend = ocr_backend or PytesseractBackend()
+    tool_metrics = metrics or ToolMetrics()
+    if ocr_cache is not None:
+        tool_metrics.add_gauge(
+            "vnc_mcp_ocr_cache_hits", "OCR results served from the cache.", lambda: ocr_cache.hits
+        )
+        tool_metrics.add_gauge(
+            "vnc_mcp_ocr_cache_misses",
+            "OCR results not found in the cache.",
+            lambda: ocr_cache.misses,
+        )
+        tool_metrics.add_gauge(
+            "vnc_mcp_ocr_cache_bytes", "Estimated size of the OCR cache.", lambda: ocr_cache.size
+        )
+
+    def rescale(
+        session: VNCSession, max_width: int | None, max_height: int | None, scale: float | None
+    ) -> None:
+        # Any scaling option given to a tool replaces the client's scaling for this and every later call.
+        if max_width is not None or max_height is not None or scale is not None:
+            session.view.scaling = ScreenScaling(
+                max_width=max_width, max_height=max_height, scale=scale
+            )
+
     mcp_server = FastMCP(
         "VNC Client",
         instructions="This VNC client can be used to view the contents of and control the user's computer. "
-        "Please, use it responsibly.",
+        "Please, use it responsibly. "
+        "If it is connected to more than one computer, every tool takes a session_id that selects which one to use; "
+        "list_sessions lists them.",
+        host=host,
+        port=port,
     )
 
+    async def send_image_if_changed(
+        session: VNCSession,
+        key: tuple[object, ...],
+        array: np.ndarray,
+        encoding: ImageEncoding,
+        scale_factor: float,
+        skip_if_unchanged: bool,
+    ) -> MCPImage | str:
+        # Different encodings or scales of the same pixels are different images to the client.
+        key = (*key, encoding, scale_factor)
+        sent_images = session.view.sent_images
+        if unchanged_threshold is None:
+            return await _convert_rgba_np_ndarray_to_mcpimage(
+                array, encoding, scale_factor=scale_factor
+            )
+
+        fingerprint = await _fingerprint_rgba_array(array, perceptual=unchanged_threshold > 0)
+        if skip_if_unchanged:
+            unchanged_for = sent_images.unchanged_for(key, fingerprint, unchanged_threshold)
+            if unchanged_for is not None:
+                return (
+                    f"Unchanged since the previous capture of this region {unchanged_for:.1f} s ago, so the image "
+                    "was not sent again. Pass skip_if_unchanged=false to get it anyway."
+                )
+        else:
+            # The client still gets this image, so a later capture that matches it doesn't have to be sent again.
+            sent_images.remember(key, fingerprint)
+        try:
+            return await _convert_rgba_np_ndarray_to_mcpimage(
+                array, encoding, scale_factor=scale_factor
+            )
+        except BaseException:
+            # The client never got it, so the next capture must not be skipped.
+            sent_images.forget(key)
+            raise
+
+    def per_client(func: Callable[..., Any]) -> Callable[..., Any]:
+        # Wraps an (async) tool so that sessions show every MCP client session its own view of them while it runs.
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                client: object | None = mcp_server.get_context().session
+            except ValueError:
+                # Not called through a request (i.e. directly, in a test).
+                client = None
+            with serving_client(client):
+                return await func(*args, **kwargs)
+
+        wrapper.__signature__ = inspect.signature(func, eval_str=True)  # type: ignore[attr-defined]
+        return wrapper
+
+    def tool() -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        # Registers a tool like mcp_server.tool() does, but records every call to it in the metrics (and profiles it),
+        # and keeps the scaling and change tracking of every MCP client apart.
+        def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+            name = func.__name__
+            if profiler is not None:
+                func = profiler.instrument(name, func)
+            instrumented = tool_metrics.instrument(name, func, measure=_content_bytes)
+            return mcp_server.tool()(per_client(instrumented))
+
+        return decorator
+
     # When declaring a tool, the description will default to the docstring of the function.
 
     # Tools/resources to provide:
     # According to Claude (funny, I know), only tools should be used for this application.
     # I doubt anybody will be using this tool with anything besides claude. mcphost might support resources, but I doubt it.
 
+    #     List sessions
+    @tool()
+    def list_sessions() -> str:
+        """
+        Lists every computer (VNC session) this server can control, as a JSON list.
+
+        Every entry has the "session_id" to pass to other tools, the "host" and "port" of its VNC server, whether it is
+        the "default" session (used when no session_id is given), and whether it is currently "connected".
+        Sessions are connected to automatically when a tool first uses them.
+        """
+
+        return json.dumps(sessions.describe())
+
+    #     Diagnostics
+    @tool()
+    def get_diagnostics() -> str:
+        """
+        Reports how this server has been performing, as JSON. This is meant for debugging slow or failing tools, and
+        is not needed to control the computer.
+
+        "tools" has every tool's call count, error rate, and latency (mean, p50, p99 in seconds), broken down into the
+        time spent capturing the screen, encoding images, running OCR, and sending input, along with how many bytes
+        it returned. "ocr_cache", "executors", and "sessions" report the OCR cache, the worker pools, and how often
+        each session's framebuffer was fetched from its VNC server.
+        """
+
+        return json.dumps(
+            {
+                "tools": tool_metrics.summary(),
+                "ocr_cache": (
+                    {
+                        "hits": ocr_cache.hits,
+                        "misses": ocr_cache.misses,
+                        "entries": len(ocr_cache),
+                        "bytes": ocr_cache.size,
+                        "max_bytes": ocr_cache.max_bytes,
+                    }
+                    if ocr_cache is not None
+                    else None
+                ),
+                "executors": executor_stats(),
+                "sessions": sessions.stats(),
+            }
+        )
+
     #     Get screen resolution
-    @mcp_server.tool()
-    def get_screen_resolution() -> str:
+    @tool()
+    async def get_screen_resolution(session_id: str | None = None) -> str:
         """
         Returns a string containing the width times height of the VNC session's workspace.
 
         Please note that this may not actually be the real resolution of the user's computer monitor.
 
         This resolution should be used for all calls to tools that take a resolution or position.
+        If screenshots are being scaled down, this is the resolution of the scaled screenshots.
         """
 
-        if RELATIVE_COORDINATE_MODE:
-            relative_resolution = vnc_client.get_relative_resolution()
-        else:
-            relative_resolution = Point(vnc_client.rect.width, vnc_client.rect.height)
+        async with sessions.use(session_id) as session:
+            if RELATIVE_COORDINATE_MODE:
+                relative_resolution = session.client.get_relative_resolution()
+            else:
+                relative_resolution = session.coordinates.scaled_resolution
 
-        return f"{relative_resolution[0]}x{relative_resolution[1]}"
+            return f"{relative_resolution[0]}x{relative_resolution[1]}"
 
     #     Whole screen image
-    @mcp_server.tool()
-    async def get_whole_screen_image() -> MCPImage:
+    @tool()
+    async def get_whole_screen_image(
+        image_format: ImageFormat | None = None,
+        image_quality: int | None = None,
+        png_compress_level: int | None = None,
+        max_width: int | None = None,
+        max_height: int | None = None,
+        scale: float | None = None,
+        skip_if_unchanged: bool = True,
+        session_id: str | None = None,
+    ) -> MCPImage | str:
         """
         Gets an image of the entire VNC session's workspace.
 
         If you are only interested in a certain subrectangle of the workspace,
         consider using the get_rectangle_of_screen method.
 
-        Please note that the resolution of the image does not match the resolution that is used to select points
-        on the workspace.
+        The image uses the same coordinate system as every other tool.
 
-        Please use get_screen_resolution to get the actual "relative" workspace resolution.
-        """
+        The image is encoded using the server's default settings unless they are overridden:
+        image_format may be "png", "jpeg", or "webp". image_quality (1-100) applies to jpeg and webp, and
+        png_compress_level (0-9) applies to png. Lossy formats are much smaller and faster, but may blur small text.
+
+        Screenshots may be scaled down with max_width and max_height (in pixels of the full workspace) or a scale
+        factor (i.e. 0.5). Scaling applies to the whole session: once set, every tool (mouse movements, rectangles,
+        get_screen_resolution) uses the scaled coordinate system, so coordinates read off a scaled screenshot can be
+        used as they are. The server's default scaling is used until one of these options is passed.
 
-        raw_rgba_array = await vnc_client.capture()
-        return await _convert_rgba_np_ndarray_to_mcpimage(raw_rgba_array)
+        If skip_if_unchanged is true (the default) and the workspace looks the same as in the last image of it that was
+        returned, a short note saying so is returned instead of the same image again.
+        """
 
-    @mcp_server.tool()
-    async def get_text_from_whole_screen_image(lang: str = "eng") -> str:
+        async with sessions.use(session_id) as session:
+            encoding = default_image_encoding.override(
+                format=image_format, quality=image_quality, compress_level=png_compress_level
+            )
+            rescale(session, max_width, max_height, scale)
+            scale_factor = session.coordinates.factor
+            raw_rgba_array = await session.framebuffer.capture()
+            session.view.last_seen_frame = raw_rgba_array
+            return await send_image_if_changed(
+                session, ("screen",), raw_rgba_array, encoding, scale_factor, skip_if_unchanged
+            )
+
+    @tool()
+    async def get_text_from_whole_screen_image(
+        lang: str = "eng",
+        session_id: str | None = None,
+    ) -> str:
         """
         Gets the text from the entire VNC session's workspace image using OCR.
 
         If you are only interested in a certain subrectangle of the workspace,
         consider using the get_text_from_rectangle_of_screen method.
 
-        Please note that the resolution of the image does not match the resolution that is used to select points
-        on the workspace.
-
-        Please use get_screen_resolution to get the actual "relative" workspace resolution.
+        OCR always runs on the full-resolution workspace, regardless of how screenshots are scaled.
         """
 
-        raw_rgba_array = await vnc_client.capture()
-        return await _convert_rgba_np_ndarray_to_string(raw_rgba_array, lang=lang)
+        async with sessions.use(session_id) as session:
+            raw_rgba_array = await session.framebuffer.capture()
+            return await _convert_rgba_np_ndarray_to_string(
+                raw_rgba_array, ocr_backend, lang=lang, cache=ocr_cache
+            )
 
     #     Relative rectangle image
-    @mcp_server.tool()
+    @tool()
     async def get_rectangle_of_screen(
-        top_left_x: int, top_left_y: int, width: int, height: int
-    ) -> MCPImage:
+        top_left_x: int,
+        top_left_y: int,
+        width: int,
+        height: int,
+        image_format: ImageFormat | None = None,
+        image_quality: int | None = None,
+        png_compress_level: int | None = None,
+        max_width: int | None = None,
+        max_height: int | None = None,
+        scale: float | None = None,
+        skip_if_unchanged: bool = True,
+        session_id: str | None = None,
+    ) -> MCPImage | str:
         """
         Captures a subrectangle of the VNC workspace and returns it as an image.
 
@@ -126,15 +522,105 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         To get the actual "relative" workspace resolution, use get_screen_resolution.
 
         Getting a screenshot of a suberectangle is more performant than getting a screenshot of the entire workspace, and should be preferred where possible.
+
+        The encoding and scaling options behave the same as in get_whole_screen_image. If a scaling option is passed,
+        the rectangle is interpreted in the newly scaled coordinate system. So is skip_if_unchanged, which compares
+        against the last image returned of the same rectangle.
+        """
+
+        async with sessions.use(session_id) as session:
+            encoding = default_image_encoding.override(
+                format=image_format, quality=image_quality, compress_level=png_compress_level
+            )
+            rescale(session, max_width, max_height, scale)
+            coordinates = session.coordinates
+            rect = coordinates.rect(top_left_x, top_left_y, width, height)
+            raw_rgba_array = await session.framebuffer.capture(rect)
+            return await send_image_if_changed(
+                session,
+                ("rect", rect.x, rect.y, rect.width, rect.height),
+                raw_rgba_array,
+                encoding,
+                coordinates.factor,
+                skip_if_unchanged,
+            )
+
+    @tool()
+    async def get_rectangles_of_screen(
+        rects: list[CaptureRect],
+        atlas: bool = False,
+        image_format: ImageFormat | None = None,
+        image_quality: int | None = None,
+        png_compress_level: int | None = None,
+        session_id: str | None = None,
+    ) -> list[str | MCPImage]:
         """
+        Captures several subrectangles of the VNC workspace at once, i.e. a toolbar, a sidebar, and a status line.
+
+        rects are objects with an "x", "y", "width", and "height", in the same coordinate system as other calls. All of
+        them are cut out of the same capture of the workspace, so they show the same moment, and this takes a single
+        call instead of one get_rectangle_of_screen per rectangle.
 
-        rect = Rect(top_left_x, top_left_y, width, height)
-        raw_rgba_array = await vnc_client.capture(rect, relative=RELATIVE_COORDINATE_MODE)
-        return await _convert_rgba_np_ndarray_to_mcpimage(raw_rgba_array)
+        Returns a JSON list repeating every rectangle, followed by an image of every rectangle in the same order. If
+        atlas is true, a single image with all of them packed into it follows instead, and every entry of the list also
+        has the "atlas_x", "atlas_y", "atlas_width", and "atlas_height" of where its rectangle is in that image.
+
+        The encoding options behave the same as in get_whole_screen_image.
+        """
 
-    @mcp_server.tool()
+        if not rects:
+            raise ValueError("At least one rectangle must be given")
+        async with sessions.use(session_id) as session:
+            encoding = default_image_encoding.override(
+                format=image_format, quality=image_quality, compress_level=png_compress_level
+            )
+            coordinates = session.coordinates
+            framebuffer_rects = [
+                coordinates.rect(rect.x, rect.y, rect.width, rect.height) for rect in rects
+            ]
+            raw_rgba_array = await session.framebuffer.capture()
+            crops = [crop_rgba_array(raw_rgba_array, rect) for rect in framebuffer_rects]
+            for rect, crop in zip(rects, crops):
+                if crop.size == 0:
+                    raise ValueError(
+                        f"The rectangle at ({rect.x}, {rect.y}) lies entirely outside the workspace"
+                    )
+
+            entries: list[dict[str, int]] = [
+                {"x": rect.x, "y": rect.y, "width": rect.width, "height": rect.height}
+                for rect in rects
+            ]
+            if not atlas:
+                images = await asyncio.gather(
+                    *(
+                        _convert_rgba_np_ndarray_to_mcpimage(
+                            crop, encoding, scale_factor=coordinates.factor
+                        )
+                        for crop in crops
+                    )
+                )
+                return [json.dumps(entries), *images]
+
+            with phase("encode"):
+                data, placements = await run_cpu_bound(
+                    _downscale_and_encode_atlas,
+                    raw_rgba_array,
+                    [(rect.x, rect.y, rect.width, rect.height) for rect in framebuffer_rects],
+                    encoding,
+                    coordinates.factor,
+                )
+            for entry, (x, y, width, height) in zip(entries, placements):
+                entry.update(atlas_x=x, atlas_y=y, atlas_width=width, atlas_height=height)
+            return [json.dumps(entries), MCPImage(data=data, format=encoding.format)]
+
+    @tool()
     async def get_text_from_rectangle_of_screen(
-        top_left_x: int, top_left_y: int, width: int, height: int, lang: str = "eng"
+        top_left_x: int,
+        top_left_y: int,
+        width: int,
+        height: int,
+        lang: str = "eng",
+        session_id: str | None = None,
     ) -> str:
         """
         Gets the text from a subrectangle of the VNC workspace image using OCR.
@@ -148,13 +634,455 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         Getting a screenshot of a suberectangle is more performant than getting a screenshot of the entire workspace, and should be preferred where possible.
         """
 
-        rect = Rect(top_left_x, top_left_y, width, height)
-        raw_rgba_array = await vnc_client.capture(rect, relative=RELATIVE_COORDINATE_MODE)
-        return await _convert_rgba_np_ndarray_to_string(raw_rgba_array, lang=lang)
+        async with sessions.use(session_id) as session:
+            rect = session.coordinates.rect(top_left_x, top_left_y, width, height)
+            raw_rgba_array = await session.framebuffer.capture(rect)
+            return await _convert_rgba_np_ndarray_to_string(
+                raw_rgba_array, ocr_backend, lang=lang, cache=ocr_cache
+            )
+
+    #     Changed regions since the last screenshot
+    @tool()
+    async def get_changed_regions(
+        include_images: bool = False, tile_size: int = 32, session_id: str | None = None
+    ) -> list[str | MCPImage]:
+        """
+        Finds the regions of the workspace that changed since it was last seen through get_whole_screen_image or this
+        tool. If the workspace hasn't been seen yet, all of it is reported as changed.
+
+        Returns a JSON list of the bounding boxes ({"x", "y", "width", "height"}) of every changed region, in the same
+        coordinate system as every other tool. An empty list means nothing changed.
+
+        If include_images is true, an image of every region follows the list, in the same order.
+
+        tile_size is how coarsely (in pixels of the full workspace) the screen is compared. Larger tiles produce fewer,
+        larger regions.
+
+        After performing an action, calling this tool is a much cheaper way to find out what happened than taking a new
+        screenshot of the whole workspace.
+        """
+
+        async with sessions.use(session_id) as session:
+            if tile_size < 1:
+                raise ValueError("tile_size must be positive")
+
+            raw_rgba_array = await session.framebuffer.capture()
+            view = session.view
+            previous, view.last_seen_frame = view.last_seen_frame, raw_rgba_array
+            rects = await _find_changed_rects(previous, raw_rgba_array, tile_size)
+
+            coordinates = session.coordinates
+            content: list[str | MCPImage] = [
+                _rects_to_json([coordinates.rect_to_client(rect) for rect in rects])
+            ]
+            if include_images:
+                content.extend(
+                    await asyncio.gather(
+                        *(
+                            _convert_rgba_np_ndarray_to_mcpimage(
+                                crop_rgba_array(raw_rgba_array, rect),
+                                default_image_encoding,
+                                scale_factor=coordinates.factor,
+                            )
+                            for rect in rects
+                        )
+                    )
+                )
+            return content
+
+    #     Screen history
+    @tool()
+    async def get_past_screen_image(
+        seconds_ago: float | None = None,
+        actions_ago: int | None = None,
+        image_format: ImageFormat | None = None,
+        image_quality: int | None = None,
+        png_compress_level: int | None = None,
+        session_id: str | None = None,
+    ) -> list[str | MCPImage]:
+        """
+        Gets an image of the VNC workspace as it was in the past, out of the server's recent history of the screen.
+
+        Pass either seconds_ago, to get the screen as it was that many seconds ago, or actions_ago, to get it as it was
+        right before the actions_ago-th most recent action (click, keystroke, etc.) was sent. actions_ago=1 shows the
+        screen right before the last action.
+
+        Returns a note of how long ago the image was captured and how many actions have been sent since, followed by
+        the image. The encoding options behave the same as in get_whole_screen_image.
+
+        Use this to look at something that was only on the screen briefly, like a toast or an error dialog that has
+        already disappeared, instead of performing the action again. The history only holds frames the server actually
+        captured, and only reaches back as far as its memory allows.
+        """
+
+        if (seconds_ago is None) == (actions_ago is None):
+            raise ValueError("Exactly one of seconds_ago and actions_ago must be given")
+        async with sessions.use(session_id) as session:
+            history = session.history
+            if history is None:
+                raise ValueError("The server isn't keeping a history of the screen")
+            encoding = default_image_encoding.override(
+                format=image_format, quality=image_quality, compress_level=png_compress_level
+            )
+            if seconds_ago is not None:
+                past = await _frame_at(history, time.monotonic() - seconds_ago)
+            else:
+                past = await _frame_before_actions(history, actions_ago)  # type: ignore[arg-type]
+            if past is None:
+                oldest = history.oldest()
+                if oldest is None:
+                    return ["Nothing has been captured yet"]
+                captured_at, actions = oldest
+                return [
+                    f"The history only reaches back {time.monotonic() - captured_at:.1f} s and "
+                    f"{history.actions - actions} actions"
+                ]
+            image = await _convert_rgba_np_ndarray_to_mcpimage(
+                past.array, encoding, scale_factor=session.coordinates.factor
+            )
+            return [
+                f"Captured {time.monotonic() - past.captured_at:.1f} s ago, "
+                f"{history.actions - past.actions} actions ago",
+                image,
+            ]
+
+    def optional_rect(
+        session: VNCSession,
+        top_left_x: int | None,
+        top_left_y: int | None,
+        width: int | None,
+        height: int | None,
+    ) -> Rect | None:
+        given = [value is not None for value in (top_left_x, top_left_y, width, height)]
+        if not any(given):
+            return None
+        if not all(given):
+            raise ValueError(
+                "Either all or none of top_left_x, top_left_y, width and height must be given"
+            )
+        return session.coordinates.rect(top_left_x, top_left_y, width, height)  # type: ignore[arg-type]
+
+    #     Wait for the screen to change
+    @tool()
+    async def wait_for_screen_change(
+        timeout_ms: int = 10000,
+        top_left_x: int | None = None,
+        top_left_y: int | None = None,
+        width: int | None = None,
+        height: int | None = None,
+        session_id: str | None = None,
+    ) -> str:
+        """
+        Waits until anything in a subrectangle of the workspace (or the whole workspace, if no rectangle is given)
+        changes, or until timeout_ms milliseconds have passed.
+
+        The coordinates use the same coordinate system as other calls.
+
+        This should be used instead of repeatedly taking screenshots while waiting for something to happen, like a
+        window opening or a page loading.
+        """
+
+        async with sessions.use(session_id) as session:
+            rect = optional_rect(session, top_left_x, top_left_y, width, height)
+            started_at = time.monotonic()
+            deadline = started_at + timeout_ms / 1000
+
+            baseline = await session.framebuffer.capture(rect)
+            generation = session.framebuffer.generation
+            try:
+                while True:
+                    generation, frame = await asyncio.wait_for(
+                        session.framebuffer.wait_for_frame(generation),
+                        timeout=max(deadline - time.monotonic(), 0),
+                    )
+                    current = frame if rect is None else crop_rgba_array(frame, rect)
+                    if await _rgba_arrays_differ(baseline, current):
+                        return f"Screen changed after {round((time.monotonic() - started_at) * 1000)} ms"
+            except asyncio.TimeoutError:
+                return f"Screen did not change within {timeout_ms} ms"
+
+    #     Wait for the screen to stop changing
+    @tool()
+    async def wait_for_screen_stable(
+        stable_ms: int = 500,
+        timeout_ms: int = 10000,
+        top_left_x: int | None = None,
+        top_left_y: int | None = None,
+        width: int | None = None,
+        height: int | None = None,
+        session_id: str | None = None,
+    ) -> str:
+        """
+        Waits until a subrectangle of the workspace (or the whole workspace, if no rectangle is given) has not changed
+        for stable_ms milliseconds, or until timeout_ms milliseconds have passed.
+
+        The coordinates use the same coordinate system as other calls.
+
+        This should be used to wait for an application to finish loading or an animation to finish before taking a
+        screenshot, instead of repeatedly taking screenshots.
+        """
+
+        async with sessions.use(session_id) as session:
+            rect = optional_rect(session, top_left_x, top_left_y, width, height)
+            started_at = time.monotonic()
+            deadline = started_at + timeout_ms / 1000
+
+            previous = await session.framebuffer.capture(rect)
+            generation = session.framebuffer.generation
+            stable_since = time.monotonic()
+            try:
+                while time.monotonic() - stable_since < stable_ms / 1000:
+                    generation, frame = await asyncio.wait_for(
+                        session.framebuffer.wait_for_frame(generation),
+                        timeout=max(deadline - time.monotonic(), 0),
+                    )
+                    current = frame if rect is None else crop_rgba_array(frame, rect)
+                    if await _rgba_arrays_differ(previous, current):
+                        stable_since = time.monotonic()
+                    previous = current
+            except asyncio.TimeoutError:
+                return f"Screen did not stay stable for {stable_ms} ms within {timeout_ms} ms"
+
+            return f"Screen was stable for {stable_ms} ms after {round((time.monotonic() - started_at) * 1000)} ms"
+
+    async def ocr_words(
+        session: VNCSession, rect: Rect | None, lang: str
+    ) -> tuple[list[OCRWord], CoordinateMapper, tuple[int, int]]:
+        # Words are found in full-resolution framebuffer pixels relative to the rectangle, so callers also need to know
+        # where the rectangle starts and how to map it into the client's coordinates.
+        coordinates = session.coordinates
+        origin = (0, 0) if rect is None else (max(rect.x, 0), max(rect.y, 0))
+        raw_rgba_array = await session.framebuffer.capture(rect)
+        words = await _convert_rgba_np_ndarray_to_words(
+            raw_rgba_array, ocr_backend, lang=lang, cache=ocr_cache
+        )
+        return words, coordinates, origin
+
+    #     Text with positions
+    @tool()
+    async def get_text_with_positions(
+        lang: str = "eng",
+        min_confidence: float = 0.0,
+        top_left_x: int | None = None,
+        top_left_y: int | None = None,
+        width: int | None = None,
+        height: int | None = None,
+        session_id: str | None = None,
+    ) -> str:
+        """
+        Gets the text from a subrectangle of the workspace (or the whole workspace, if no rectangle is given) using OCR,
+        along with where every line and word of it is.
+
+        Returns a JSON list of lines in reading order. Every line has its "text", the bounding box of the line
+        ("x", "y", "width", "height"), and a list of its "words", each with its own "text", bounding box and
+        "confidence" (0-100). Words below min_confidence are left out.
+
+        All positions use the same coordinate system as other calls, so they can be passed straight to the mouse tools.
+        To click on some text, consider using the find_text tool instead.
+        """
+
+        async with sessions.use(session_id) as session:
+            rect = optional_rect(session, top_left_x, top_left_y, width, height)
+            words, coordinates, origin = await ocr_words(session, rect, lang)
+            lines = group_words_into_lines(
+                [word for word in words if word.confidence >= min_confidence]
+            )
+            return json.dumps(
+                [
+                    {
+                        **_box_to_dict(line, coordinates, origin),
+                        "words": [
+                            {
+                                **_box_to_dict(word, coordinates, origin),
+                                "confidence": word.confidence,
+                            }
+                            for word in line.words
+                        ],
+                    }
+                    for line in lines
+                ]
+            )
+
+    #     Find text
+    @tool()
+    async def find_text(
+        text: str,
+        lang: str = "eng",
+        case_sensitive: bool = False,
+        top_left_x: int | None = None,
+        top_left_y: int | None = None,
+        width: int | None = None,
+        height: int | None = None,
+        session_id: str | None = None,
+    ) -> str:
+        """
+        Finds every occurrence of some text (a word or a phrase) in a subrectangle of the workspace (or the whole
+        workspace, if no rectangle is given) using OCR.
+
+        Returns a JSON list of matches in reading order. Every match has the "text" that matched, its bounding box
+        ("x", "y", "width", "height"), and the point at its center ("click_x", "click_y"), which can be passed straight
+        to move_mouse_to in order to click on it. An empty list means the text wasn't found.
+
+        Punctuation around words is ignored. A single word also matches longer words that contain it.
+
+        This is much faster than taking a screenshot to find a button or a label.
+        """
+
+        async with sessions.use(session_id) as session:
+            rect = optional_rect(session, top_left_x, top_left_y, width, height)
+            words, coordinates, origin = await ocr_words(session, rect, lang)
+            matches = []
+            for match in find_phrase(
+                group_words_into_lines(words), text, case_sensitive=case_sensitive
+            ):
+                box = _box_to_client_rect(match, coordinates, origin)
+                matches.append(
+                    {
+                        **_box_to_dict(match, coordinates, origin),
+                        "click_x": box.x + box.width // 2,
+                        "click_y": box.y + box.height // 2,
+                    }
+                )
+            return json.dumps(matches)
+
+    #     Find image
+    @tool()
+    async def find_image_on_screen(
+        image_base64: str,
+        threshold: float = 0.9,
+        max_matches: int = 10,
+        top_left_x: int | None = None,
+        top_left_y: int | None = None,
+        width: int | None = None,
+        height: int | None = None,
+        session_id: str | None = None,
+    ) -> str:
+        """
+        Finds every place a small reference image (like an icon or a button) appears in a subrectangle of the
+        workspace (or the whole workspace, if no rectangle is given).
+
+        image_base64 is a PNG, JPEG, or WebP file encoded as base64 (a data URL works, too). It must be at the same
+        scale as the screenshots, i.e. cut out of an earlier screenshot. Matching ignores color and overall brightness,
+        so a button is still found while it is highlighted.
+
+        Returns a JSON list of matches, best first. Every match has its bounding box ("x", "y", "width", "height"), the
+        point at its center ("click_x", "click_y"), which can be passed straight to move_mouse_to, and a "score" from 0
+        to 1, where 1 is a perfect match. Only matches scoring at least threshold are returned, and matches never
+        overlap. An empty list means the image wasn't found.
+
+        Finding a known icon this way is much faster than taking a screenshot and looking for it.
+        """
+
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be between 0 and 1")
+        if image_base64.startswith("data:"):
+            image_base64 = image_base64.partition(",")[2]
+        try:
+            data = base64.b64decode(image_base64, validate=True)
+        except binascii.Error as e:
+            raise ValueError("image_base64 is not valid base64") from e
+        template = await _decode_rgba_array(data)
+
+        async with sessions.use(session_id) as session:
+            rect = optional_rect(session, top_left_x, top_left_y, width, height)
+            coordinates = session.coordinates
+            origin = (0, 0) if rect is None else (max(rect.x, 0), max(rect.y, 0))
+            raw_rgba_array = await session.framebuffer.capture(rect)
+            with phase("match"):
+                found = await run_cpu_bound(
+                    _find_image,
+                    raw_rgba_array,
+                    template,
+                    coordinates.factor,
+                    threshold,
+                    max_matches,
+                )
+
+            # Matches are in the client's coordinates already, just relative to the rectangle.
+            left, top = coordinates.to_client(origin[0]), coordinates.to_client(origin[1])
+            return json.dumps(
+                [
+                    {
+                        "x": left + match.x,
+                        "y": top + match.y,
+                        "width": match.width,
+                        "height": match.height,
+                        "click_x": left + match.x + match.width // 2,
+                        "click_y": top + match.y + match.height // 2,
+                        "score": round(match.score, 3),
+                    }
+                    for match in found
+                ]
+            )
+
+    #     Sample pixel colors
+    @tool()
+    async def sample_pixels(
+        points: list[SamplePoint] | None = None,
+        rects: list[SampleRect] | None = None,
+        session_id: str | None = None,
+    ) -> str:
+        """
+        Reads the colors of a list of points and/or the mean colors of a list of small rectangles, all from the same
+        moment, in one call.
+
+        points are objects with an "x" and a "y", and rects are objects with an "x", "y", "width", and "height", in the
+        same coordinate system as other calls.
+
+        Returns JSON with a "points" list and a "rects" list, in the order they were given. Every entry repeats its
+        position and has its "color" as a hex string (i.e. "#00ff00") and as a list of "rgb" channels (0-255). Rectangles
+        are averaged over the full-resolution workspace, and have a null color if they lie entirely off screen.
+
+        This is a far cheaper way than a screenshot to check things like whether a checkbox turned green or a progress
+        bar reached its end.
+        """
+
+        points = points or []
+        rects = rects or []
+        async with sessions.use(session_id) as session:
+            coordinates = session.coordinates
+            framebuffer_points = [coordinates.point(point.x, point.y) for point in points]
+            framebuffer_rects = [
+                coordinates.rect(rect.x, rect.y, rect.width, rect.height) for rect in rects
+            ]
+            mapped_points = np.array(
+                [(point.x, point.y) for point in framebuffer_points], dtype=np.intp
+            ).reshape(-1, 2)
+            mapped_rects = np.array(
+                [(rect.x, rect.y, rect.width, rect.height) for rect in framebuffer_rects],
+                dtype=np.intp,
+            ).reshape(-1, 4)
+            raw_rgba_array = await session.framebuffer.capture()
+            point_colors, rect_colors = await _sample_colors(
+                raw_rgba_array, mapped_points, mapped_rects
+            )
+
+        return json.dumps(
+            {
+                "points": [
+                    {"x": point.x, "y": point.y, **describe_color(color)}
+                    for point, color in zip(points, point_colors)
+                ],
+                "rects": [
+                    {
+                        "x": rect.x,
+                        "y": rect.y,
+                        "width": rect.width,
+                        "height": rect.height,
+                        **(
+                            describe_color(color)
+                            if not np.isnan(color).any()
+                            else {"color": None, "rgb": None}
+                        ),
+                    }
+                    for rect, color in zip(rects, rect_colors)
+                ],
+            }
+        )
 
     #     Strike key(s)
-    @mcp_server.tool()
-    async def strike_keys(keys: list[str]) -> str:
+    @tool()
+    async def strike_keys(keys: list[str], session_id: str | None = None) -> str:
         """
         Strikes the keys inputted without any delay between strikes nor any modifier keys held.
 
@@ -178,13 +1106,16 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         Keys are released in the reverse order they are input. The final key in the array will always be typed with all
         other keys pressed.
         """
-        await vnc_client.press(*keys)
-        return "Successfully struck " + ", ".join(keys)
+        async with sessions.use(session_id) as session:
+            async with session.acting() as vnc_client:
+                await vnc_client.press(*keys)
+            return "Successfully struck " + ", ".join(keys)
 
     #     Write string
-    @mcp_server.tool()
+    @tool()
     async def write_string(
         string: str,
+        session_id: str | None = None,
     ) -> str:
         """
         Directly writes a string into the VNC session. A textbox or similar text-accepting appliance must first
@@ -197,14 +1128,17 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         keys and waiting. You may always try it first and then evaluate alternatives.
         """
 
-        await vnc_client.write(string)
-        return "Successfully typed " + string
+        async with sessions.use(session_id) as session:
+            async with session.acting() as vnc_client:
+                await vnc_client.write(string)
+            return "Successfully typed " + string
 
     #     Strike key(s) with key(s) held
-    @mcp_server.tool()
+    @tool()
     async def strike_keys_with_keys_held(
         keys_to_strike: list[str],
         keys_to_hold: list[str],
+        session_id: str | None = None,
     ) -> str:
         """
         Strikes the provided keys while holding the provided keys. Useful for entering keyboard shortcuts.
@@ -231,16 +1165,19 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         other keys pressed.
         """
 
-        async with vnc_client.hold_key(*keys_to_hold):
-            await vnc_client.press(*keys_to_strike)
+        async with sessions.use(session_id) as session:
+            async with session.acting() as vnc_client:
+                async with vnc_client.hold_key(*keys_to_hold):
+                    await vnc_client.press(*keys_to_strike)
 
-        return f"Successfully struck {', '.join(keys_to_strike)} while holding {', '.join(keys_to_hold)}"
+            return f"Successfully struck {', '.join(keys_to_strike)} while holding {', '.join(keys_to_hold)}"
 
     #     Write string with key(s) held
-    @mcp_server.tool()
+    @tool()
     async def write_string_with_keys_held(
         string_to_write: str,
         keys_to_hold: list[str],
+        session_id: str | None = None,
     ) -> str:
         """
         Directly writes a string into the VNC session. A textbox or similar text-accepting appliance must first
@@ -273,15 +1210,17 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         other keys pressed.
         """
 
-        async with vnc_client.hold_key(*keys_to_hold):
-            await vnc_client.write(string_to_write)
+        async with sessions.use(session_id) as session:
+            async with session.acting() as vnc_client:
+                async with vnc_client.hold_key(*keys_to_hold):
+                    await vnc_client.write(string_to_write)
 
-        return f"Successfully wrote {string_to_write} while holding {', '.join(keys_to_hold)}"
+            return f"Successfully wrote {string_to_write} while holding {', '.join(keys_to_hold)}"
 
     #     Strike key(s) with mouse button held
-    @mcp_server.tool()
+    @tool()
     async def strike_keys_with_mouse_button_held(
-        keys_to_strike: list[str], mouse_button_to_hold: int
+        keys_to_strike: list[str], mouse_button_to_hold: int, session_id: str | None = None
     ) -> str:
         """
         Strikes a number of keys while holding a certain mouse button.
@@ -297,15 +1236,17 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         MOUSE_BUTTON_SCROLL_DOWN = 4
         """
 
-        async with vnc_client.hold_mouse(mouse_button_to_hold):
-            await vnc_client.press(*keys_to_strike)
+        async with sessions.use(session_id) as session:
+            async with session.acting() as vnc_client:
+                async with vnc_client.hold_mouse(mouse_button_to_hold):
+                    await vnc_client.press(*keys_to_strike)
 
-        return f"Successfully struck {', '.join(keys_to_strike)} while holding mouse button {mouse_button_to_hold}"
+            return f"Successfully struck {', '.join(keys_to_strike)} while holding mouse button {mouse_button_to_hold}"
 
     #     Write string with mouse button held
-    @mcp_server.tool()
+    @tool()
     async def write_string_with_mouse_button_held(
-        string_to_write: str, mouse_button_to_hold: int
+        string_to_write: str, mouse_button_to_hold: int, session_id: str | None = None
     ) -> str:
         """
         Writes a string while holding a certain mouse button.
@@ -320,17 +1261,20 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         MOUSE_BUTTON_SCROLL_DOWN = 4
         """
 
-        async with vnc_client.hold_mouse(mouse_button_to_hold):
-            await vnc_client.write(string_to_write)
+        async with sessions.use(session_id) as session:
+            async with session.acting() as vnc_client:
+                async with vnc_client.hold_mouse(mouse_button_to_hold):
+                    await vnc_client.write(string_to_write)
 
-        return f"Successfully wrote {string_to_write} while holding mouse button {mouse_button_to_hold}"
+            return f"Successfully wrote {string_to_write} while holding mouse button {mouse_button_to_hold}"
 
     #     Strike key(s) with mouse button held and key(s) held
-    @mcp_server.tool()
+    @tool()
     async def strike_keys_with_mouse_button_and_keys_held(
         keys_to_strike: list[str],
         mouse_button_to_hold: int,
         keys_to_hold: list[str],
+        session_id: str | None = None,
     ) -> str:
         """
         Strikes a number of keys while holding a certain mouse button and a number of other keys.
@@ -348,18 +1292,21 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         MOUSE_BUTTON_SCROLL_DOWN = 4
         """
 
-        async with vnc_client.hold_mouse(mouse_button_to_hold):
-            async with vnc_client.hold_key(*keys_to_hold):
-                await vnc_client.press(*keys_to_strike)
+        async with sessions.use(session_id) as session:
+            async with session.acting() as vnc_client:
+                async with vnc_client.hold_mouse(mouse_button_to_hold):
+                    async with vnc_client.hold_key(*keys_to_hold):
+                        await vnc_client.press(*keys_to_strike)
 
-        return f"Successfully struck {', '.join(keys_to_strike)} while holding mouse button {mouse_button_to_hold} and keys {', '.join(keys_to_hold)}"
+            return f"Successfully struck {', '.join(keys_to_strike)} while holding mouse button {mouse_button_to_hold} and keys {', '.join(keys_to_hold)}"
 
     #     Write string with mouse button held and key(s) held
-    @mcp_server.tool()
+    @tool()
     async def write_string_with_mouse_button_and_keys_held(
         string_to_write: str,
         mouse_button_to_hold: int,
         keys_to_hold: list[str],
+        session_id: str | None = None,
     ) -> str:
         """
         Writes a string while holding a certain mouse button and a number of other keys.
@@ -374,16 +1321,23 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         MOUSE_BUTTON_SCROLL_DOWN = 4
         """
 
-        async with vnc_client.hold_mouse(mouse_button_to_hold):
-            async with vnc_client.hold_key(*keys_to_hold):
-                await vnc_client.write(string_to_write)
+        async with sessions.use(session_id) as session:
+            async with session.acting() as vnc_client:
+                async with vnc_client.hold_mouse(mouse_button_to_hold):
+                    async with vnc_client.hold_key(*keys_to_hold):
+                        await vnc_client.write(string_to_write)
 
-        return f"Successfully wrote {string_to_write} while holding mouse button {mouse_button_to_hold} and keys {', '.join(keys_to_hold)}"
+            return f"Successfully wrote {string_to_write} while holding mouse button {mouse_button_to_hold} and keys {', '.join(keys_to_hold)}"
 
     #     Move mouse from (x,y) to (w,z) with mouse button held
-    @mcp_server.tool()
+    @tool()
     async def move_mouse_with_mouse_button_held(
-        start_x: int, start_y: int, end_x: int, end_y: int, mouse_button_to_hold: int
+        start_x: int,
+        start_y: int,
+        end_x: int,
+        end_y: int,
+        mouse_button_to_hold: int,
+        session_id: str | None = None,
     ) -> str:
         """
         Moves the mouse from (start_x, start_y) to (end_x, end_y) while holding a certain mouse button.
@@ -400,16 +1354,28 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         MOUSE_BUTTON_SCROLL_DOWN = 4
         """
 
-        async with vnc_client.hold_mouse(mouse_button_to_hold):
-            await vnc_client.move(Point(start_x, start_y), relative=RELATIVE_COORDINATE_MODE)
-            await vnc_client.move(Point(end_x, end_y), relative=RELATIVE_COORDINATE_MODE)
+        async with sessions.use(session_id) as session:
+            coordinates = session.coordinates
+            async with session.acting() as vnc_client:
+                async with vnc_client.hold_mouse(mouse_button_to_hold):
+                    await vnc_client.move(
+                        coordinates.point(start_x, start_y), relative=RELATIVE_COORDINATE_MODE
+                    )
+                    await vnc_client.move(
+                        coordinates.point(end_x, end_y), relative=RELATIVE_COORDINATE_MODE
+                    )
 
-        return f"Successfully moved mouse from ({start_x}, {start_y}) to ({end_x}, {end_y}) while holding mouse button {mouse_button_to_hold}"
+            return f"Successfully moved mouse from ({start_x}, {start_y}) to ({end_x}, {end_y}) while holding mouse button {mouse_button_to_hold}"
 
     #     Move mouse from (x,y) to (w,z) with key(s) held
-    @mcp_server.tool()
+    @tool()
     async def move_mouse_with_keys_held(
-        start_x: int, start_y: int, end_x: int, end_y: int, keys_to_hold: list[str]
+        start_x: int,
+        start_y: int,
+        end_x: int,
+        end_y: int,
+        keys_to_hold: list[str],
+        session_id: str | None = None,
     ) -> str:
         """
         Moves the mouse from (start_x, start_y) to (end_x, end_y) while holding a number of keys.
@@ -421,14 +1387,21 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         Same rules apply to the modifier keys as the strike_keys_with_keys_held tool.
         """
 
-        async with vnc_client.hold_key(*keys_to_hold):
-            await vnc_client.move(Point(start_x, start_y), relative=RELATIVE_COORDINATE_MODE)
-            await vnc_client.move(Point(end_x, end_y), relative=RELATIVE_COORDINATE_MODE)
+        async with sessions.use(session_id) as session:
+            coordinates = session.coordinates
+            async with session.acting() as vnc_client:
+                async with vnc_client.hold_key(*keys_to_hold):
+                    await vnc_client.move(
+                        coordinates.point(start_x, start_y), relative=RELATIVE_COORDINATE_MODE
+                    )
+                    await vnc_client.move(
+                        coordinates.point(end_x, end_y), relative=RELATIVE_COORDINATE_MODE
+                    )
 
-        return f"Successfully moved mouse from ({start_x}, {start_y}) to ({end_x}, {end_y}) while holding keys {', '.join(keys_to_hold)}"
+            return f"Successfully moved mouse from ({start_x}, {start_y}) to ({end_x}, {end_y}) while holding keys {', '.join(keys_to_hold)}"
 
     #     Move mouse from (x,y) to (w,z) with key(s) and mouse button held
-    @mcp_server.tool()
+    @tool()
     async def move_mouse_with_keys_and_mouse_button_held(
         start_x: int,
         start_y: int,
@@ -436,6 +1409,7 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         end_y: int,
         keys_to_hold: list[str],
         mouse_button_to_hold: int,
+        session_id: str | None = None,
     ) -> str:
         """
         Moves the mouse from (start_x, start_y) to (end_x, end_y) while holding a number of keys and a certain mouse button.
@@ -454,16 +1428,23 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         MOUSE_BUTTON_SCROLL_DOWN = 4
         """
 
-        async with vnc_client.hold_mouse(mouse_button_to_hold):
-            async with vnc_client.hold_key(*keys_to_hold):
-                await vnc_client.move(Point(start_x, start_y), relative=RELATIVE_COORDINATE_MODE)
-                await vnc_client.move(Point(end_x, end_y), relative=RELATIVE_COORDINATE_MODE)
+        async with sessions.use(session_id) as session:
+            coordinates = session.coordinates
+            async with session.acting() as vnc_client:
+                async with vnc_client.hold_mouse(mouse_button_to_hold):
+                    async with vnc_client.hold_key(*keys_to_hold):
+                        await vnc_client.move(
+                            coordinates.point(start_x, start_y), relative=RELATIVE_COORDINATE_MODE
+                        )
+                        await vnc_client.move(
+                            coordinates.point(end_x, end_y), relative=RELATIVE_COORDINATE_MODE
+                        )
 
-        return f"Successfully moved mouse from ({start_x}, {start_y}) to ({end_x}, {end_y}) while holding keys {', '.join(keys_to_hold)} and mouse button {mouse_button_to_hold}"
+            return f"Successfully moved mouse from ({start_x}, {start_y}) to ({end_x}, {end_y}) while holding keys {', '.join(keys_to_hold)} and mouse button {mouse_button_to_hold}"
 
     #     Move mouse to (x,y)
-    @mcp_server.tool()
-    async def move_mouse_to(x: int, y: int) -> str:
+    @tool()
+    async def move_mouse_to(x: int, y: int, session_id: str | None = None) -> str:
         """
         Moves the mouse to the coordinates (x, y) in the VNC session's workspace.
 
@@ -474,12 +1455,19 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         In order to click on a specific point on the screen, you should use this tool to move the mouse to the desired position and then use the click_at_current_position tool.
         """
 
-        await vnc_client.move(Point(x, y), relative=RELATIVE_COORDINATE_MODE)
-        return f"Successfully moved mouse to ({x}, {y})"
+        async with sessions.use(session_id) as session:
+            coordinates = session.coordinates
+            async with session.acting() as vnc_client:
+                await vnc_client.move(coordinates.point(x, y), relative=RELATIVE_COORDINATE_MODE)
+            return f"Successfully moved mouse to ({x}, {y})"
 
     #     Click (n) times at current position
-    @mcp_server.tool()
-    async def click_at_current_position(mouse_button: int, n: int) -> str:
+    @tool()
+    async def click_at_current_position(
+        mouse_button: int,
+        n: int,
+        session_id: str | None = None,
+    ) -> str:
         """
         Clicks the mouse at the current position n times.
 
@@ -498,14 +1486,16 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         The current position is the position of the mouse in the VNC session's workspace.
         """
 
-        for _ in range(n):
-            await vnc_client.click(mouse_button)
-        return f"Successfully clicked {n} times at current position"
+        async with sessions.use(session_id) as session:
+            async with session.acting() as vnc_client:
+                for _ in range(n):
+                    await vnc_client.click(mouse_button)
+            return f"Successfully clicked {n} times at current position"
 
     #     Click (n) times at current position with key(s) held
-    @mcp_server.tool()
+    @tool()
     async def click_at_current_position_with_keys_held(
-        mouse_button: int, n: int, keys_to_hold: list[str]
+        mouse_button: int, n: int, keys_to_hold: list[str], session_id: str | None = None
     ) -> str:
         """
         Clicks the mouse at the current position n times while holding a number of keys.
@@ -529,13 +1519,86 @@ def create_mcp_server(vnc_client: AsyncVNCClient) -> FastMCP:
         The current position is the position of the mouse in the VNC session's workspace.
         """
 
-        async with vnc_client.hold_key(*keys_to_hold):
-            for _ in range(n):
-                await vnc_client.click(mouse_button)
+        async with sessions.use(session_id) as session:
+            async with session.acting() as vnc_client:
+                async with vnc_client.hold_key(*keys_to_hold):
+                    for _ in range(n):
+                        await vnc_client.click(mouse_button)
+
+            return f"Successfully clicked {n} times at current position while holding keys {', '.join(keys_to_hold)}"
+
+    #     Batch of actions
+    @tool()
+    async def perform_actions(
+        actions: list[InputAction],
+        screenshot: bool = False,
+        screenshot_top_left_x: int | None = None,
+        screenshot_top_left_y: int | None = None,
+        screenshot_width: int | None = None,
+        screenshot_height: int | None = None,
+        session_id: str | None = None,
+    ) -> list[str | MCPImage]:
+        """
+        Performs a list of input actions in order, all in one call. Whenever you already know the next few steps
+        (i.e. click a text field, type into it, press Return), this is much faster than calling a tool for each.
+
+        Every action is an object with a "type":
+            {"type": "key", "keys": ["Control_L", "a"]} strikes keys, like strike_keys.
+            {"type": "type", "text": "hello"} writes a string, like write_string.
+            {"type": "move", "x": 100, "y": 200} moves the mouse, like move_mouse_to.
+            {"type": "click", "mouse_button": 0, "n": 1} clicks at the current position, like click_at_current_position.
+            {"type": "hold", "keys": ["Shift_L"], "mouse_button": 0} presses keys and/or a mouse button down.
+            {"type": "release", "keys": ["Shift_L"], "mouse_button": 0} releases held keys and/or a mouse button.
+            {"type": "sleep", "ms": 250} waits, i.e. for a menu to open.
+
+        Anything still held at the end is released. Key names, mouse buttons and coordinates follow the same rules as
+        the individual tools.
+
+        If screenshot is true, an image of the workspace (or of the given subrectangle of it) is taken after the last
+        action and returned along with the summary. Add a short sleep at the end if the screen needs time to update.
+        """
 
-        return f"Successfully clicked {n} times at current position while holding keys {', '.join(keys_to_hold)}"
+        async with sessions.use(session_id) as session:
+            screenshot_rect = optional_rect(
+                session,
+                screenshot_top_left_x,
+                screenshot_top_left_y,
+                screenshot_width,
+                screenshot_height,
+            )
+            async with session.acting() as vnc_client:
+                done = await run_actions(
+                    vnc_client, actions, session.coordinates, relative=RELATIVE_COORDINATE_MODE
+                )
+
+            content: list[str | MCPImage] = [
+                "Successfully " + "; ".join(done) if done else "No actions given"
+            ]
+            if screenshot:
+                coordinates = session.coordinates
+                raw_rgba_array = await session.framebuffer.capture(screenshot_rect)
+                if screenshot_rect is None:
+                    session.view.last_seen_frame = raw_rgba_array
+                content.append(
+                    await _convert_rgba_np_ndarray_to_mcpimage(
+                        raw_rgba_array, default_image_encoding, scale_factor=coordinates.factor
+                    )
+                )
+            return content
 
     return mcp_server
 
 
-__all__ = ("create_mcp_server",)
+async def run_mcp_server(mcp_server: FastMCP, transport: MCPTransport = "stdio") -> None:
+    """Serves the MCP server over the given transport until it is shut down."""
+    if transport == "stdio":
+        await mcp_server.run_stdio_async()
+    elif transport == "sse":
+        await mcp_server.run_sse_async()
+    elif transport == "streamable-http":
+        await mcp_server.run_streamable_http_async()
+    else:
+        raise ValueError(f"Unknown transport {transport}")
+
+
+__all__ = ("MCPTransport", "create_mcp_server", "run_mcp_server")
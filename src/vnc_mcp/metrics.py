@@ -0,0 +1,314 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import functools
+import inspect
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+from typing import AsyncGenerator
+from typing import Callable
+from typing import Generator
+
+
+logger = logging.getLogger(__name__)
+
+# Prometheus' default buckets, stretched out to cover OCRing a large screen.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+# From a short text reply up to an uncompressed 4K screenshot.
+SIZE_BUCKETS = tuple(float(256 * 4**power) for power in range(9))
+
+
+class Histogram:
+    """A Prometheus-style histogram: counts of observations at or below each bucket's upper bound."""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        # The last count is for everything above the largest bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Counts a single observation (i.e. a latency in seconds) into its bucket."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        """Every bucket's upper bound (ending with infinity) and how many observations were at or below it."""
+        total = 0
+        cumulative = []
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Estimates a quantile (i.e. 0.99) the same way Prometheus' histogram_quantile does, by interpolating linearly
+        within the bucket it falls into. Returns None if nothing has been observed.
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        lower, below = 0.0, 0
+        for bound, total in self.cumulative():
+            if total >= rank:
+                if bound == float("inf"):
+                    # There is no upper bound to interpolate towards.
+                    return lower
+                return lower + (bound - lower) * (rank - below) / max(total - below, 1)
+            lower, below = bound, total
+        return lower  # pragma: no cover
+
+    def summary(self) -> dict[str, float | int | None]:
+        """The number of observations, their mean, and the estimated median and 99th percentile."""
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class _Call:
+    """How long one tool call has spent in each phase so far."""
+
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = defaultdict(float)
+
+
+_current_call: ContextVar[_Call | None] = ContextVar("_current_call", default=None)
+
+
+@contextmanager
+def phase(name: str) -> Generator[None, None, None]:
+    """
+    Attributes the time spent in the block to a phase (like "capture" or "encode") of the tool call being run.
+
+    Tasks started during a call inherit it, so phases that run concurrently (i.e. encoding several images at once) all
+    count in full. Outside of a tool call, this does nothing.
+    """
+    call = _current_call.get()
+    if call is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        call.phases[name] += time.perf_counter() - started
+
+
+class _ToolStats:
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+        self.phases: dict[str, Histogram] = {}
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+
+
+class ToolMetrics:
+    """
+    Call counts, error counts, and latency histograms for every instrumented tool.
+
+    Latency is broken down into the phases tools mark with phase(): time spent capturing the framebuffer (including
+    waiting on the VNC server), encoding images, running OCR, and sending input. How many bytes every call returned is
+    recorded as well, so that a slow step can be pinned on the network, the encoder, or tesseract.
+    """
+
+    def __init__(self) -> None:
+        self._tools: dict[str, _ToolStats] = defaultdict(_ToolStats)
+        self._gauges: dict[str, tuple[str, Callable[[], float]]] = {}
+
+    def reset(self) -> None:
+        """Forgets every call recorded so far, i.e. after warming up."""
+        for stats in self._tools.values():
+            stats.clear()
+
+    def add_gauge(self, name: str, help: str, value: Callable[[], float]) -> None:
+        """Exports a value that is read whenever the metrics are, like the size of a cache."""
+        self._gauges[name] = (help, value)
+
+    def instrument(
+        self, name: str, func: Callable[..., Any], *, measure: Callable[[Any], int] | None = None
+    ) -> Callable[..., Any]:
+        """
+        Wraps a (sync or async) tool function so that every call to it is recorded under name.
+
+        measure returns how many bytes a result is. The wrapper is always async, and keeps the signature of func with
+        its annotations resolved, so that FastMCP derives the same schema from it as from func itself.
+        """
+        signature = inspect.signature(func, eval_str=True)
+        is_coroutine_function = inspect.iscoroutinefunction(func)
+        stats = self._tools[name]
+
+        @functools.wraps(func)
+        async def instrumented(*args: Any, **kwargs: Any) -> Any:
+            call = _Call()
+            token = _current_call.set(call)
+            started = time.perf_counter()
+            stats.calls += 1
+            try:
+                result = func(*args, **kwargs)
+                if is_coroutine_function:
+                    result = await result
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                _current_call.reset(token)
+                stats.latency.observe(time.perf_counter() - started)
+                for phase_name, seconds in call.phases.items():
+                    stats.phases.setdefault(phase_name, Histogram()).observe(seconds)
+            if measure is not None:
+                stats.response_bytes.observe(measure(result))
+            return result
+
+        instrumented.__signature__ = signature  # type: ignore[attr-defined]
+        return instrumented
+
+    def summary(self) -> dict[str, dict[str, object]]:
+        """Summarizes every tool that has been called, with estimated p50 and p99 latencies in seconds."""
+        return {
+            name: {
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "error_rate": stats.errors / stats.calls,
+                "latency": stats.latency.summary(),
+                "phases": {
+                    phase_name: histogram.summary()
+                    for phase_name, histogram in sorted(stats.phases.items())
+                },
+                "response_bytes": stats.response_bytes.summary(),
+            }
+            for name, stats in sorted(self._tools.items())
+            if stats.calls
+        }
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        lines: list[str] = []
+
+        def header(metric: str, kind: str, help: str) -> None:
+            lines.append(f"# HELP {metric} {help}")
+            lines.append(f"# TYPE {metric} {kind}")
+
+        def histogram(metric: str, labels: str, values: Histogram) -> None:
+            for bound, total in values.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {total}')
+            lines.append(f"{metric}_sum{{{labels}}} {values.sum!r}")
+            lines.append(f"{metric}_count{{{labels}}} {values.count}")
+
+        tools = sorted(self._tools.items())
+        header("vnc_mcp_tool_calls_total", "counter", "Tool calls.")
+        for name, stats in tools:
+            lines.append(f'vnc_mcp_tool_calls_total{{tool="{name}"}} {stats.calls}')
+        header("vnc_mcp_tool_errors_total", "counter", "Tool calls that raised an error.")
+        for name, stats in tools:
+            lines.append(f'vnc_mcp_tool_errors_total{{tool="{name}"}} {stats.errors}')
+        header("vnc_mcp_tool_duration_seconds", "histogram", "How long tool calls took.")
+        for name, stats in tools:
+            histogram("vnc_mcp_tool_duration_seconds", f'tool="{name}"', stats.latency)
+        header(
+            "vnc_mcp_tool_phase_duration_seconds",
+            "histogram",
+            "How long tool calls spent capturing, encoding, running OCR, and sending input.",
+        )
+        for name, stats in tools:
+            for phase_name, values in sorted(stats.phases.items()):
+                histogram(
+                    "vnc_mcp_tool_phase_duration_seconds",
+                    f'tool="{name}",phase="{phase_name}"',
+                    values,
+                )
+        header("vnc_mcp_tool_response_bytes", "histogram", "How many bytes tool calls returned.")
+        for name, stats in tools:
+            histogram("vnc_mcp_tool_response_bytes", f'tool="{name}"', stats.response_bytes)
+        for metric, (help, value) in sorted(self._gauges.items()):
+            header(metric, "gauge", help)
+            lines.append(f"{metric} {float(value())!r}")
+
+        return "\n".join(lines) + "\n"
+
+
+async def _handle_metrics_request(
+    metrics: ToolMetrics, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    try:
+        request_line = await reader.readline()
+        # Nothing in the headers matters, but they have to be read before answering.
+        while (await reader.readline()).strip():
+            pass
+        method, path, *_ = request_line.decode("latin-1").split() or ("", "")
+        if method == "GET" and path.split("?")[0] == "/metrics":
+            status, body = "200 OK", metrics.render().encode()
+        else:
+            status, body = "404 Not Found", b"Not found. Metrics are served at /metrics.\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+@asynccontextmanager
+async def serve_metrics(
+    metrics: ToolMetrics, host: str = "127.0.0.1", port: int = 9464
+) -> AsyncGenerator[asyncio.Server, None]:
+    """
+    Serves the metrics for Prometheus to scrape at http://host:port/metrics for as long as the context is active.
+
+    This is a bare-bones HTTP server, so that metrics are available even when MCP itself is served over stdio.
+    """
+    server = await asyncio.start_server(
+        functools.partial(_handle_metrics_request, metrics), host, port
+    )
+    logger.info("Serving metrics at http://%s:%d/metrics", host, port)
+    try:
+        yield server
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+__all__ = ("Histogram", "ToolMetrics", "phase", "serve_metrics")
@@ -0,0 +1,652 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import importlib.util
+import logging
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from dataclasses import replace
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Callable
+from typing import Literal
+from typing import Protocol
+
+import numpy as np
+
+from .utils.hashing import hash_rgba_array
+from .utils.shared_array import SharedArray
+from .utils.shared_array import SharedArrayHandle
+from .utils.shared_array import call_with_shared_array
+from .utils.tiles import pixels_as_words
+
+
+if TYPE_CHECKING:
+    import tesserocr
+
+# Importing tesserocr loads all of libtesseract, so it is only looked for here and imported once it is really used.
+TESSEROCR_INSTALLED = importlib.util.find_spec("tesserocr") is not None
+
+logger = logging.getLogger(__name__)
+
+OCRBackendName = Literal["auto", "tesserocr", "pytesseract"]
+
+# Rough bookkeeping cost of an entry besides its text (key, OrderedDict node, str header).
+_ENTRY_OVERHEAD = 200
+# Rough cost of an OCRWord besides its text.
+_WORD_OVERHEAD = 150
+
+
+@dataclass(frozen=True)
+class OCRWord:
+    """
+    A single word found by OCR and its bounding box in pixels.
+
+    block, paragraph and line number the structure tesseract found the word in, so words on the same line share all
+    three. confidence ranges from 0 to 100.
+    """
+
+    text: str
+    left: int
+    top: int
+    width: int
+    height: int
+    confidence: float
+    block: int
+    paragraph: int
+    line: int
+
+    def moved(self, x: int, y: int) -> OCRWord:
+        """Returns a copy of this word with its bounding box moved by the given offset."""
+        return replace(self, left=self.left + x, top=self.top + y)
+
+
+@dataclass(frozen=True)
+class OCRLine:
+    """A line of words found by OCR and the bounding box of all of them."""
+
+    words: tuple[OCRWord, ...]
+
+    @property
+    def text(self) -> str:
+        """The words of the line, separated by spaces."""
+        return " ".join(word.text for word in self.words)
+
+    @property
+    def left(self) -> int:
+        """The left edge of the line's bounding box."""
+        return min(word.left for word in self.words)
+
+    @property
+    def top(self) -> int:
+        """The top edge of the line's bounding box."""
+        return min(word.top for word in self.words)
+
+    @property
+    def width(self) -> int:
+        """The width of the line's bounding box."""
+        return max(word.left + word.width for word in self.words) - self.left
+
+    @property
+    def height(self) -> int:
+        """The height of the line's bounding box."""
+        return max(word.top + word.height for word in self.words) - self.top
+
+
+def group_words_into_lines(words: list[OCRWord]) -> list[OCRLine]:
+    """Groups words into the lines tesseract found them on, keeping tesseract's reading order."""
+    lines: dict[tuple[int, int, int], list[OCRWord]] = {}
+    for word in words:
+        lines.setdefault((word.block, word.paragraph, word.line), []).append(word)
+    return [OCRLine(tuple(line)) for line in lines.values()]
+
+
+def _normalize_word(word: str, case_sensitive: bool) -> str:
+    word = word.strip(".,:;!?\"'()[]{}<>")
+    return word if case_sensitive else word.casefold()
+
+
+def find_phrase(
+    lines: list[OCRLine], phrase: str, *, case_sensitive: bool = False
+) -> list[OCRLine]:
+    """
+    Finds every occurrence of a phrase in OCRed lines, returning the words that make up each occurrence.
+
+    Words are compared without surrounding punctuation. A phrase of a single word also matches words that contain it,
+    so "save" finds "Save..." and "Autosave".
+    """
+    wanted = [_normalize_word(word, case_sensitive) for word in phrase.split()]
+    wanted = [word for word in wanted if word]
+    if not wanted:
+        return []
+
+    matches = []
+    for line in lines:
+        words = [_normalize_word(word.text, case_sensitive) for word in line.words]
+        for start in range(len(words) - len(wanted) + 1):
+            candidate = words[start : start + len(wanted)]
+            if candidate == wanted or (len(wanted) == 1 and wanted[0] in candidate[0]):
+                matches.append(OCRLine(line.words[start : start + len(wanted)]))
+    return matches
+
+
+class OCRBackend(Protocol):
+    """Something that can turn an RGBA array into text. Implementations must be safe to call from multiple threads."""
+
+    def image_to_string(self, array: np.ndarray, lang: str) -> str:
+        """OCRs an RGBA array in the given tesseract language(s), i.e. "eng" or "eng+deu"."""
+        ...
+
+    def image_to_words(self, array: np.ndarray, lang: str) -> list[OCRWord]:
+        """OCRs an RGBA array, returning every word found and where it was found in reading order."""
+        ...
+
+    def close(self) -> None:
+        """Releases everything the backend holds on to."""
+        ...
+
+
+class PytesseractBackend:
+    """
+    OCRs by running the tesseract CLI through pytesseract.
+
+    Every call writes a temporary image and spawns a new tesseract process, which has to load its language models from
+    scratch. It's slow, but it only needs the tesseract binary, so it is always available as a fallback.
+    """
+
+    def image_to_string(self, array: np.ndarray, lang: str) -> str:
+        """OCRs an RGBA array in the given tesseract language(s)."""
+        import pytesseract
+        from PIL import Image as PILImage
+
+        pilimage = PILImage.fromarray(array, "RGBA")
+        return pytesseract.image_to_string(pilimage, lang=lang)
+
+    def image_to_words(self, array: np.ndarray, lang: str) -> list[OCRWord]:
+        """OCRs an RGBA array, returning every word found and where it was found."""
+        import pytesseract
+        from PIL import Image as PILImage
+
+        pilimage = PILImage.fromarray(array, "RGBA")
+        data = pytesseract.image_to_data(pilimage, lang=lang, output_type=pytesseract.Output.DICT)
+        return [
+            OCRWord(
+                text=data["text"][index].strip(),
+                left=data["left"][index],
+                top=data["top"][index],
+                width=data["width"][index],
+                height=data["height"][index],
+                confidence=float(data["conf"][index]),
+                block=data["block_num"][index],
+                paragraph=data["par_num"][index],
+                line=data["line_num"][index],
+            )
+            # Level 5 rows are words; the rest describe pages, blocks, paragraphs and lines.
+            for index in range(len(data["level"]))
+            if data["level"][index] == 5 and data["text"][index].strip()
+        ]
+
+    def close(self) -> None:
+        """There is nothing to release."""
+
+
+class TesserocrBackend:
+    """
+    OCRs in-process through tesserocr's bindings to the tesseract C++ API.
+
+    Engines are created once per language and then kept warm, so the language models are only loaded once. An engine
+    can only be used by one thread at a time, so up to max_engines_per_lang engines are kept for every language.
+    """
+
+    def __init__(self, *, max_engines_per_lang: int = 2) -> None:
+        if not TESSEROCR_INSTALLED:
+            raise RuntimeError("tesserocr is not installed")
+        self.max_engines_per_lang = max_engines_per_lang
+        self._idle: dict[str, queue.LifoQueue[tesserocr.PyTessBaseAPI]] = {}
+        self._created: dict[str, int] = {}
+        self._engines: list[tesserocr.PyTessBaseAPI] = []
+        self._lock = threading.Lock()
+
+    def preload(self, *langs: str) -> None:
+        """Creates an engine for every language ahead of time, so the first OCR in it doesn't have to."""
+        for lang in langs:
+            self._release(lang, self._acquire(lang))
+
+    def _acquire(self, lang: str) -> tesserocr.PyTessBaseAPI:
+        with self._lock:
+            idle = self._idle.setdefault(lang, queue.LifoQueue())
+            try:
+                return idle.get_nowait()
+            except queue.Empty:
+                pass
+            create = self._created.get(lang, 0) < self.max_engines_per_lang
+            if create:
+                self._created[lang] = self._created.get(lang, 0) + 1
+
+        if not create:
+            # Every engine for this language is busy, so wait for one instead of loading the models yet again.
+            return idle.get()
+
+        logger.debug("Loading a tesseract engine for %s", lang)
+        try:
+            import tesserocr
+
+            engine = tesserocr.PyTessBaseAPI(lang=lang)
+        except BaseException:
+            with self._lock:
+                self._created[lang] -= 1
+            raise
+        with self._lock:
+            self._engines.append(engine)
+        return engine
+
+    def _release(self, lang: str, engine: tesserocr.PyTessBaseAPI) -> None:
+        self._idle[lang].put(engine)
+
+    def __reduce__(self) -> tuple[Callable[[OCRBackendName], OCRBackend], tuple[OCRBackendName]]:
+        # Engines can't be pickled, and a worker process that receives this backend should use its own warm engines
+        # instead of loading new ones for every job.
+        return _process_local_ocr_backend, ("tesserocr",)
+
+    def image_to_string(self, array: np.ndarray, lang: str) -> str:
+        """OCRs an RGBA array in the given tesseract language(s)."""
+        from PIL import Image as PILImage
+
+        # The alpha channel of a framebuffer carries no information, and tesseract would only have to drop it again.
+        pilimage = PILImage.fromarray(np.ascontiguousarray(array[..., :3]), "RGB")
+        engine = self._acquire(lang)
+        try:
+            engine.SetImage(pilimage)
+            return engine.GetUTF8Text()
+        finally:
+            engine.Clear()
+            self._release(lang, engine)
+
+    def image_to_words(self, array: np.ndarray, lang: str) -> list[OCRWord]:
+        """OCRs an RGBA array, returning every word found and where it was found."""
+        import tesserocr
+        from PIL import Image as PILImage
+
+        pilimage = PILImage.fromarray(np.ascontiguousarray(array[..., :3]), "RGB")
+        engine = self._acquire(lang)
+        try:
+            engine.SetImage(pilimage)
+            engine.Recognize()
+            words = []
+            block = paragraph = line = 0
+            for result in tesserocr.iterate_level(engine.GetIterator(), tesserocr.RIL.WORD):
+                # Number the structure the same way tesseract's TSV output (and therefore pytesseract) does.
+                if result.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                    block, paragraph, line = block + 1, 0, 0
+                if result.IsAtBeginningOf(tesserocr.RIL.PARA):
+                    paragraph, line = paragraph + 1, 0
+                if result.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    line += 1
+                text = (result.GetUTF8Text(tesserocr.RIL.WORD) or "").strip()
+                box = result.BoundingBox(tesserocr.RIL.WORD)
+                if not text or box is None:
+                    continue
+                left, top, right, bottom = box
+                words.append(
+                    OCRWord(
+                        text=text,
+                        left=left,
+                        top=top,
+                        width=right - left,
+                        height=bottom - top,
+                        confidence=result.Confidence(tesserocr.RIL.WORD),
+                        block=block,
+                        paragraph=paragraph,
+                        line=line,
+                    )
+                )
+            return words
+        finally:
+            engine.Clear()
+            self._release(lang, engine)
+
+    def close(self) -> None:
+        """Ends every engine."""
+        with self._lock:
+            for engine in self._engines:
+                engine.End()
+            self._engines.clear()
+            self._idle.clear()
+            self._created.clear()
+
+
+def create_ocr_backend(name: OCRBackendName = "auto") -> OCRBackend:
+    """
+    Creates the OCR backend with the given name.
+
+    "auto" uses the warm, in-process tesserocr backend if tesserocr is installed, and falls back to pytesseract.
+    """
+    if name == "tesserocr" or (name == "auto" and TESSEROCR_INSTALLED):
+        return TesserocrBackend()
+    if name in ("auto", "pytesseract"):
+        return PytesseractBackend()
+    raise ValueError(f"Unknown OCR backend {name}")
+
+
+_process_local_backends: dict[str, OCRBackend] = {}
+
+
+def _process_local_ocr_backend(name: OCRBackendName) -> OCRBackend:
+    """Returns this process's own backend with the given name, creating it the first time it's asked for."""
+    try:
+        return _process_local_backends[name]
+    except KeyError:
+        return _process_local_backends.setdefault(name, create_ocr_backend(name))
+
+
+def split_into_text_bands(
+    array: np.ndarray, *, band_height: int = 512, overlap: int = 48
+) -> list[tuple[int, int]]:
+    """
+    Splits an RGBA array into horizontal bands of at most band_height rows, returned as (top, bottom) row ranges.
+
+    Bands are cut on rows of a single color wherever possible, so that no line of text is cut in half. If the second
+    half of a band has no such row, the band is cut at band_height and the next band overlaps it by overlap rows.
+    """
+    height = array.shape[0]
+    words = pixels_as_words(array)
+    blank = np.all(words == words[:, :1], axis=1)
+
+    bands = []
+    top = 0
+    while height - top > band_height:
+        search_from = top + band_height // 2
+        blank_rows = np.flatnonzero(blank[search_from : top + band_height])
+        if blank_rows.size:
+            cut = search_from + int(blank_rows[-1])
+            bands.append((top, cut))
+            top = cut
+        else:
+            bands.append((top, top + band_height))
+            top = top + band_height - overlap
+    bands.append((top, height))
+    return bands
+
+
+def stitch_text_bands(texts: list[str], bands: list[tuple[int, int]]) -> str:
+    """
+    Joins the text OCRed from each band back together in reading order.
+
+    Where two bands overlap, lines at the end of one band that are repeated at the start of the next are only kept once.
+    """
+    lines: list[str] = []
+    for index, text in enumerate(texts):
+        # pytesseract ends every page with a form feed.
+        text = text.strip("\n\f")
+        if not text.strip():
+            continue
+        band_lines = text.split("\n")
+        if index > 0 and bands[index][0] < bands[index - 1][1]:
+            previous = [line for line in lines if line.strip()]
+            current = [line for line in band_lines if line.strip()]
+            for repeated in range(min(len(previous), len(current), 3), 0, -1):
+                if previous[-repeated:] == current[:repeated]:
+                    # Drop the repeated lines (and any blank lines between them) from the new band.
+                    while repeated:
+                        if band_lines.pop(0).strip():
+                            repeated -= 1
+                    break
+        if lines and band_lines:
+            lines.append("")
+        lines.extend(band_lines)
+    return "\n".join(lines).strip("\n") + "\n"
+
+
+_worker_backend: OCRBackend | None = None
+
+
+def _initialize_ocr_worker(backend_name: OCRBackendName) -> None:
+    global _worker_backend
+    # Tesseract spreads each job over every core with OpenMP, which only gets in the way of running one job per core.
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    _worker_backend = create_ocr_backend(backend_name)
+
+
+def _ocr_in_worker(array: np.ndarray, lang: str) -> str:
+    assert _worker_backend is not None
+    return _worker_backend.image_to_string(array, lang)
+
+
+def _ocr_words_in_worker(array: np.ndarray, lang: str) -> list[OCRWord]:
+    assert _worker_backend is not None
+    return _worker_backend.image_to_words(array, lang)
+
+
+def _ocr_band_in_worker(handle: SharedArrayHandle, top: int, bottom: int, lang: str) -> str:
+    return call_with_shared_array(_ocr_in_worker, handle, lang, rows=slice(top, bottom))
+
+
+def _ocr_band_words_in_worker(
+    handle: SharedArrayHandle, top: int, bottom: int, lang: str
+) -> list[OCRWord]:
+    return call_with_shared_array(_ocr_words_in_worker, handle, lang, rows=slice(top, bottom))
+
+
+class ParallelOCRBackend:
+    """
+    OCRs large images by splitting them into bands of text and OCRing the bands in parallel across a process pool.
+
+    Every worker process keeps its own backend (and therefore its own warm tesseract engines) for its whole lifetime.
+    The image is copied into shared memory once, and every band is read straight out of it by its worker.
+    """
+
+    def __init__(
+        self,
+        backend_name: OCRBackendName = "auto",
+        *,
+        workers: int | None = None,
+        band_height: int = 512,
+        overlap: int = 48,
+    ) -> None:
+        # Fail here instead of in every worker process.
+        if backend_name not in ("auto", "tesserocr", "pytesseract"):
+            raise ValueError(f"Unknown OCR backend {backend_name}")
+        if backend_name == "tesserocr" and not TESSEROCR_INSTALLED:
+            raise RuntimeError("tesserocr is not installed")
+        self.band_height = band_height
+        self.overlap = overlap
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_initialize_ocr_worker,
+            initargs=(backend_name,),
+        )
+
+    def submit(
+        self, array: np.ndarray, lang: str, *, kind: str = "text"
+    ) -> tuple[list[tuple[int, int]], list[Future[Any]]]:
+        """
+        Starts OCRing an RGBA array one band per worker without waiting for it.
+
+        Returns the bands and a future for each of them, whose results (in the same order) combine puts together. This
+        lets callers wait on the futures however suits them, i.e. with asyncio.wrap_future instead of a blocked thread.
+        kind is "text" or "words", like in OCRCache.
+        """
+        bands = split_into_text_bands(array, band_height=self.band_height, overlap=self.overlap)
+        func = _ocr_band_words_in_worker if kind == "words" else _ocr_band_in_worker
+        shared = SharedArray(array)
+        try:
+            futures = [
+                self._executor.submit(func, shared.handle, top, bottom, lang)
+                for top, bottom in bands
+            ]
+        except BaseException:
+            shared.close()
+            raise
+
+        # The shared copy must outlive every band, even if whoever waits on them gives up early, so the last band to
+        # finish releases it.
+        remaining = len(futures)
+        lock = threading.Lock()
+
+        def release(_: Future[Any]) -> None:
+            nonlocal remaining
+            with lock:
+                remaining -= 1
+                if remaining:
+                    return
+            shared.close()
+
+        for future in futures:
+            future.add_done_callback(release)
+        return bands, futures
+
+    def combine(
+        self,
+        bands: list[tuple[int, int]],
+        results: list[Any],
+        *,
+        kind: str = "text",
+        height: int,
+    ) -> str | list[OCRWord]:
+        """Puts the results of the bands from submit back together for an image height rows tall."""
+        if kind == "words":
+            return self._combine_words(bands, results, height)
+        return stitch_text_bands(results, bands)
+
+    def image_to_string(self, array: np.ndarray, lang: str) -> str:
+        """OCRs an RGBA array in the given tesseract language(s), one band per worker."""
+        bands, futures = self.submit(array, lang)
+        return stitch_text_bands([future.result() for future in futures], bands)
+
+    def image_to_words(self, array: np.ndarray, lang: str) -> list[OCRWord]:
+        """OCRs an RGBA array one band per worker, returning every word found and where it was found."""
+        bands, futures = self.submit(array, lang, kind="words")
+        return self._combine_words(bands, [future.result() for future in futures], array.shape[0])
+
+    @staticmethod
+    def _combine_words(
+        bands: list[tuple[int, int]], results: list[list[OCRWord]], height: int
+    ) -> list[OCRWord]:
+        # Where bands overlap, each band only keeps the words centered on its side of the middle of the overlap.
+        boundaries = [0]
+        for (_, previous_bottom), (top, _) in zip(bands, bands[1:]):
+            boundaries.append((top + previous_bottom) // 2)
+        boundaries.append(height)
+
+        words = []
+        for index, ((top, _), band_words) in enumerate(zip(bands, results)):
+            # Number blocks uniquely across bands, so lines from different bands are never merged.
+            block_offset = index * 10_000
+            for word in band_words:
+                center = top + word.top + word.height // 2
+                if boundaries[index] <= center < boundaries[index + 1]:
+                    words.append(replace(word.moved(0, top), block=word.block + block_offset))
+        return words
+
+    def close(self) -> None:
+        """Shuts the worker processes down."""
+        self._executor.shutdown(cancel_futures=True)
+
+
+class OCRCache:
+    """
+    A content-addressed LRU cache of OCR results, bounded by the (approximate) memory its entries take up.
+
+    Entries are keyed by a hash of the pixels and the OCR language, so identical pixels are only ever OCRed once no
+    matter which tool or region they came from. The cache is safe to use from multiple threads.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        # Every entry keeps its cost, so that it doesn't have to be estimated again when it is evicted.
+        self._entries: OrderedDict[
+            tuple[bytes, str, str], tuple[str | list[OCRWord], int]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """The approximate number of bytes the cached results take up."""
+        return self._size
+
+    @staticmethod
+    def _cost(value: str | list[OCRWord]) -> int:
+        if isinstance(value, str):
+            return len(value.encode()) + _ENTRY_OVERHEAD
+        return sum(len(word.text.encode()) + _WORD_OVERHEAD for word in value) + _ENTRY_OVERHEAD
+
+    @staticmethod
+    def key(array: np.ndarray, lang: str, *, kind: str = "text") -> tuple[bytes, str, str]:
+        """
+        Returns the key the result for the array and language is cached under.
+
+        kind tells apart different kinds of results (i.e. "text" and "words") for the same pixels. Hashing a whole
+        screen takes a moment, so this is split from get and put for callers that want to do it elsewhere (i.e. off
+        the event loop).
+        """
+        return hash_rgba_array(array), lang, kind
+
+    def get(self, key: tuple[bytes, str, str]) -> str | list[OCRWord] | None:
+        """Returns the result cached under key, or None (counting a miss) if there is none."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple[bytes, str, str], value: str | list[OCRWord]) -> None:
+        """Caches a result under key, evicting the least recently used results if it doesn't fit."""
+        self._put(key, value)
+        logger.debug("OCR cache: %d hits, %d misses, %d bytes", self.hits, self.misses, self._size)
+
+    def _put(self, key: tuple[bytes, str, str], value: str | list[OCRWord]) -> None:
+        cost = self._cost(value)
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = (value, cost)
+            self._size += cost
+            while self._size > self.max_bytes:
+                _, (_, evicted_cost) = self._entries.popitem(last=False)
+                self._size -= evicted_cost
+
+    def clear(self) -> None:
+        """Drops every cached result (but keeps the counters)."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+__all__ = (
+    "OCRWord",
+    "OCRLine",
+    "group_words_into_lines",
+    "find_phrase",
+    "OCRBackendName",
+    "OCRBackend",
+    "PytesseractBackend",
+    "TesserocrBackend",
+    "create_ocr_backend",
+    "split_into_text_bands",
+    "stitch_text_bands",
+    "ParallelOCRBackend",
+    "OCRCache",
+)
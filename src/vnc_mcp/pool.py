@@ -0,0 +1,370 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from contextlib import AsyncExitStack
+from contextlib import asynccontextmanager
+from functools import partial
+from types import TracebackType
+from typing import AsyncGenerator
+from typing import Awaitable
+from typing import Callable
+
+from pyvnc import AsyncVNCClient
+from pyvnc import VNCConfig
+
+from .framebuffer import CONNECTION_ERRORS
+from .session import VNCSession
+
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledSession:
+    """The pool's bookkeeping for one named target."""
+
+    def __init__(self, config: VNCConfig) -> None:
+        self.config = config
+        # The session outlives any one connection, so its state (like its shadow framebuffer) survives reconnects.
+        self.session: VNCSession | None = None
+        self.session_stack = AsyncExitStack()
+        self.client_stack = AsyncExitStack()
+        self.healthy = False
+        self.connector: asyncio.Task[None] | None = None
+        self.reconnector: asyncio.Task[None] | None = None
+        # Held while connecting or disconnecting, so that concurrent callers never open two connections.
+        self.lock = asyncio.Lock()
+        self.users = 0
+        self.last_used = time.monotonic()
+        self.reconnects = 0
+
+    @property
+    def address(self) -> str:
+        return f"{self.config.host}:{self.config.port}"
+
+
+class VNCSessionPool:
+    """
+    A pool of named VNC targets that one MCP server can drive.
+
+    Targets are only connected to once a tool first uses them, and are then kept connected (along with their shadow
+    framebuffer and other state) until they have gone unused for idle_timeout seconds. A target is never disconnected
+    while a tool is still using it.
+
+    Connections are checked every keepalive_interval seconds. A connection that is found dead (by the keepalive or by
+    a tool) is reconnected in the background, backing off exponentially up to max_reconnect_delay seconds between
+    attempts. Tools wait up to reconnect_wait seconds for it to come back. Captures are retried once it does, but input
+    never is, since it may already have been (partially) delivered.
+
+    session_factory wraps the first connection to every target in a VNCSession, so that every target gets the same
+    settings.
+    """
+
+    def __init__(
+        self,
+        targets: dict[str, VNCConfig],
+        *,
+        default: str = "default",
+        idle_timeout: float | None = 300.0,
+        keepalive_interval: float | None = 30.0,
+        reconnect_wait: float = 15.0,
+        max_reconnect_delay: float = 30.0,
+        session_factory: Callable[[AsyncVNCClient], VNCSession] = VNCSession,
+    ) -> None:
+        if default not in targets:
+            raise ValueError(f"The default session {default} is not one of the targets")
+        for name, value in (
+            ("idle_timeout", idle_timeout),
+            ("keepalive_interval", keepalive_interval),
+            ("max_reconnect_delay", max_reconnect_delay),
+        ):
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be positive, not {value}")
+        if reconnect_wait < 0:
+            raise ValueError(f"reconnect_wait must not be negative, not {reconnect_wait}")
+        self.default = default
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.reconnect_wait = reconnect_wait
+        self.max_reconnect_delay = max_reconnect_delay
+        self._session_factory = session_factory
+        self._entries = {name: _PooledSession(config) for name, config in targets.items()}
+        self._tasks: list[asyncio.Task[None]] = []
+
+    @property
+    def names(self) -> list[str]:
+        """The names of every target in the pool."""
+        return list(self._entries)
+
+    def _entry(self, session_id: str | None) -> _PooledSession:
+        name = self.default if session_id is None else session_id
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise ValueError(
+                f"Unknown session {name}. Known sessions are: {', '.join(self._entries)}"
+            ) from None
+
+    async def _connect(self, entry: _PooledSession) -> None:
+        # The entry's lock must be held.
+        logger.info("Connecting to %s", entry.address)
+        await entry.client_stack.aclose()
+        stack = AsyncExitStack()
+        try:
+            vnc_client = await AsyncVNCClient.connect(entry.config)
+            await stack.enter_async_context(vnc_client)
+            if entry.session is None:
+                session = self._session_factory(vnc_client)
+                session.framebuffer.on_connection_lost = partial(self._recover, entry)
+                entry.session = await entry.session_stack.enter_async_context(session)
+            else:
+                entry.session.replace_client(vnc_client)
+        except BaseException:
+            await stack.aclose()
+            raise
+        entry.client_stack = stack
+        entry.healthy = True
+
+    def _start_connecting(self, entry: _PooledSession) -> asyncio.Task[None]:
+        """Connects to the target in the background (once), and returns the task doing it."""
+        if entry.connector is None:
+            entry.connector = asyncio.create_task(self._connect_once(entry))
+            entry.connector.add_done_callback(partial(self._connector_done, entry))
+        return entry.connector
+
+    async def _connect_once(self, entry: _PooledSession) -> None:
+        async with entry.lock:
+            if entry.healthy:
+                return
+            try:
+                await self._connect(entry)
+            except Exception as e:
+                raise ConnectionError(
+                    f"Could not connect to the VNC server at {entry.address}: {e or type(e).__name__}. "
+                    "Check that it is running and reachable, and that the credentials are right. "
+                    "Connecting will be tried again on the next call."
+                ) from e
+
+    @staticmethod
+    def _connector_done(entry: _PooledSession, task: asyncio.Task[None]) -> None:
+        entry.connector = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("%s", task.exception())
+
+    def connect_in_background(self, session_id: str | None = None) -> None:
+        """
+        Starts connecting to a target (or the default target) without waiting for it.
+
+        Tools that use the target in the meantime wait for the connection to be made, and fail with a clear error if
+        it can't be.
+        """
+        self._start_connecting(self._entry(session_id))
+
+    def _cancel_connecting(self, entry: _PooledSession) -> None:
+        for task in (entry.connector, entry.reconnector):
+            if task is not None:
+                task.cancel()
+
+    async def _disconnect(self, entry: _PooledSession) -> None:
+        # The entry's lock must be held.
+        self._cancel_connecting(entry)
+        if entry.session is not None:
+            logger.info("Disconnecting from %s", entry.address)
+        entry.session = None
+        entry.healthy = False
+        await entry.session_stack.aclose()
+        await entry.client_stack.aclose()
+
+    def _connection_lost(self, entry: _PooledSession) -> None:
+        """Starts reconnecting to the target in the background, unless that is already happening."""
+        entry.healthy = False
+        if entry.session is not None and entry.reconnector is None:
+            logger.warning("Lost the connection to %s, reconnecting", entry.address)
+            entry.reconnector = asyncio.create_task(self._reconnect(entry))
+
+    async def _reconnect(self, entry: _PooledSession) -> None:
+        delay = 0.5
+        try:
+            while True:
+                try:
+                    async with entry.lock:
+                        if not entry.healthy:
+                            await self._connect(entry)
+                            entry.reconnects += 1
+                    return
+                except Exception as e:
+                    # Jitter keeps a fleet of servers that lost their VMs at once from hammering them in lockstep.
+                    wait = delay * random.uniform(0.5, 1.0)
+                    logger.warning(
+                        "Reconnecting to %s failed (%s), retrying in %.1f s", entry.address, e, wait
+                    )
+                    await asyncio.sleep(wait)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+        finally:
+            entry.reconnector = None
+
+    async def _recover(self, entry: _PooledSession) -> None:
+        """Reconnects to the target after a connection error, waiting up to reconnect_wait seconds for it to succeed."""
+        self._connection_lost(entry)
+        await self._wait_for_reconnect(entry)
+
+    async def _wait_for_reconnect(self, entry: _PooledSession) -> None:
+        reconnector = entry.reconnector
+        if reconnector is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(reconnector), self.reconnect_wait)
+        except asyncio.TimeoutError:
+            raise ConnectionError(
+                f"The connection to {entry.address} was lost, and it could not be reestablished within "
+                f"{self.reconnect_wait} seconds. Still trying in the background."
+            ) from None
+
+    @asynccontextmanager
+    async def use(self, session_id: str | None = None) -> AsyncGenerator[VNCSession, None]:
+        """
+        Yields the session with the given name (or the default session), connecting to it first if need be.
+
+        The session is kept connected for as long as the context is active. If the connection turns out to be dead
+        (the context exits with a connection error), it is reconnected in the background.
+        """
+        entry = self._entry(session_id)
+        entry.users += 1
+        try:
+            await self._wait_for_reconnect(entry)
+            if not entry.healthy:
+                # Shielded, since the connection outlives this call (and others may be waiting for it, too).
+                await asyncio.shield(self._start_connecting(entry))
+            session = entry.session
+            assert session is not None
+            try:
+                yield session
+            except CONNECTION_ERRORS:
+                self._connection_lost(entry)
+                raise
+        finally:
+            entry.users -= 1
+            entry.last_used = time.monotonic()
+
+    def describe(self) -> list[dict[str, object]]:
+        """Describes every target in the pool, and whether it is connected."""
+        now = time.monotonic()
+        return [
+            {
+                "session_id": name,
+                "host": entry.config.host,
+                "port": entry.config.port,
+                "default": name == self.default,
+                "connected": entry.session is not None and entry.healthy,
+                "connecting": entry.connector is not None,
+                "reconnecting": entry.reconnector is not None,
+                "reconnects": entry.reconnects,
+                "idle_seconds": round(now - entry.last_used, 1) if entry.users == 0 else 0.0,
+            }
+            for name, entry in self._entries.items()
+        ]
+
+    def stats(self) -> dict[str, dict[str, float | int | None]]:
+        """How much every connected target's shadow framebuffer has had to talk to its server."""
+        stats = {}
+        for name, entry in self._entries.items():
+            if entry.session is None:
+                continue
+            framebuffer = entry.session.framebuffer
+            stats[name] = {
+                "fetches": framebuffer.fetches,
+                "coalesced": framebuffer.coalesced,
+                # Infinite until the first capture, which JSON can't express.
+                "framebuffer_age_seconds": (
+                    round(framebuffer.age, 3) if framebuffer.generation else None
+                ),
+            }
+            history = entry.session.history
+            if history is not None:
+                stats[name]["history_frames"] = history.frames
+                stats[name]["history_bytes"] = history.stored_bytes
+        return stats
+
+    async def evict_idle(self) -> None:
+        """Disconnects from every target that has gone unused for longer than idle_timeout."""
+        if self.idle_timeout is None:
+            return
+        for entry in self._entries.values():
+            async with entry.lock:
+                # Checked under the lock, since a tool may have picked the session up while we waited for it.
+                if entry.users == 0 and time.monotonic() - entry.last_used > self.idle_timeout:
+                    await self._disconnect(entry)
+
+    async def check_connections(self, timeout: float = 10.0) -> None:
+        """
+        Checks every healthy connection by probing a single pixel of its framebuffer, and reconnects the ones that don't
+        answer.
+
+        Connections that were synced within the last keepalive_interval are skipped: they have just proven that they are
+        alive.
+        """
+        for entry in self._entries.values():
+            session = entry.session
+            if session is None or not entry.healthy:
+                continue
+            if (
+                self.keepalive_interval is not None
+                and session.framebuffer.age < self.keepalive_interval
+            ):
+                continue
+            try:
+                await asyncio.wait_for(session.framebuffer.probe(), timeout)
+            except (*CONNECTION_ERRORS, asyncio.TimeoutError):
+                self._connection_lost(entry)
+
+    async def _every(self, interval: float, check: Callable[[], Awaitable[None]]) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await check()
+            except Exception:
+                logger.exception("Checking on the VNC sessions failed.")
+
+    async def __aenter__(self) -> VNCSessionPool:
+        if self.idle_timeout is not None:
+            # Checking a few times per timeout keeps sessions from overstaying it by much.
+            self._tasks.append(
+                asyncio.create_task(self._every(min(self.idle_timeout / 4, 60.0), self.evict_idle))
+            )
+        if self.keepalive_interval is not None:
+            self._tasks.append(
+                asyncio.create_task(self._every(self.keepalive_interval, self.check_connections))
+            )
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks.clear()
+        for entry in self._entries.values():
+            # Don't wait on the lock for a connection attempt that is only going to be torn down again.
+            self._cancel_connecting(entry)
+            async with entry.lock:
+                await self._disconnect(entry)
+
+
+__all__ = ("VNCSessionPool",)
@@ -0,0 +1,98 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import inspect
+import itertools
+import logging
+import random
+import time
+from pathlib import Path
+from typing import Any
+from typing import Callable
+
+
+logger = logging.getLogger(__name__)
+
+
+class ToolProfiler:
+    """
+    Profiles a random sample of tool calls with cProfile, writing every profile to its own file in directory.
+
+    Files are named <tool>-<timestamp>-<n>.prof, and can be read with pstats or turned into a flamegraph with tools
+    like snakeviz or flameprof. sample_rate (0-1) is the share of calls that are profiled, so that this can be left on
+    under a real workload without slowing every call down.
+
+    cProfile can only profile one thing at a time, so a call that starts while another is being profiled is never
+    profiled itself. The profile of a call covers everything the event loop ran while it was in progress (including
+    other tools' calls), but not work done in the executors' threads or processes.
+    """
+
+    def __init__(self, directory: Path, sample_rate: float = 1.0) -> None:
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(
+                f"The profiling sample rate must be between 0 and 1, not {sample_rate}"
+            )
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.profiled = 0
+        self._active = False
+        self._counter = itertools.count()
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def _should_profile(self) -> bool:
+        return not self._active and random.random() < self.sample_rate
+
+    def _dump(self, name: str, profile: cProfile.Profile) -> None:
+        path = (
+            self.directory / f"{name}-{time.strftime('%Y%m%dT%H%M%S')}-{next(self._counter)}.prof"
+        )
+        try:
+            profile.dump_stats(path)
+        except OSError as e:
+            logger.warning("Could not write the profile of %s to %s: %s", name, path, e)
+        else:
+            self.profiled += 1
+
+    def instrument(self, name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Wraps a (sync or async) tool function so that a sample of the calls to it are profiled.
+
+        Like ToolMetrics.instrument, the wrapper is always async and keeps the signature of func.
+        """
+        signature = inspect.signature(func, eval_str=True)
+        is_coroutine_function = inspect.iscoroutinefunction(func)
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            result = func(*args, **kwargs)
+            if is_coroutine_function:
+                result = await result
+            return result
+
+        @functools.wraps(func)
+        async def profiled(*args: Any, **kwargs: Any) -> Any:
+            if not self._should_profile():
+                return await call(*args, **kwargs)
+
+            self._active = True
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._active = False
+                self._dump(name, profile)
+
+        profiled.__signature__ = signature  # type: ignore[attr-defined]
+        return profiled
+
+
+__all__ = ("ToolProfiler",)
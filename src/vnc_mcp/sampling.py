@@ -0,0 +1,83 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import numpy as np
+from pydantic import BaseModel
+from pydantic import Field
+
+
+class SamplePoint(BaseModel):
+    """A single pixel to read the color of."""
+
+    x: int
+    y: int
+
+
+class SampleRect(BaseModel):
+    """A rectangle to read the mean color of."""
+
+    x: int
+    y: int
+    width: int = Field(gt=0)
+    height: int = Field(gt=0)
+
+
+def sample_point_colors(array: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """
+    Reads the RGB color of every (x, y) point (an N x 2 array) out of an RGBA array in one go.
+
+    Points are clamped to the edges of the array.
+    """
+    height, width = array.shape[:2]
+    xs = np.clip(points[:, 0], 0, width - 1)
+    ys = np.clip(points[:, 1], 0, height - 1)
+    return array[ys, xs, :3]
+
+
+def mean_rect_colors(array: np.ndarray, rects: np.ndarray) -> np.ndarray:
+    """
+    Averages the RGB color inside every (x, y, width, height) rectangle (an N x 4 array) of an RGBA array.
+
+    Rectangles are clamped to the array. The means of rectangles that lie entirely outside of it are NaN.
+    """
+    if len(rects) == 0:
+        return np.zeros((0, 3))
+    height, width = array.shape[:2]
+    lefts = np.clip(rects[:, 0], 0, width)
+    tops = np.clip(rects[:, 1], 0, height)
+    rights = np.clip(rects[:, 0] + rects[:, 2], lefts, width)
+    bottoms = np.clip(rects[:, 1] + rects[:, 3], tops, height)
+
+    # Only the part of the screen that any rectangle covers needs a summed-area table.
+    left, top, right, bottom = lefts.min(), tops.min(), rights.max(), bottoms.max()
+    table = np.zeros((bottom - top + 1, right - left + 1, 3), dtype=np.int64)
+    np.cumsum(
+        np.cumsum(array[top:bottom, left:right, :3], axis=0, dtype=np.int64),
+        axis=1,
+        out=table[1:, 1:],
+    )
+    lefts, rights, tops, bottoms = lefts - left, rights - left, tops - top, bottoms - top
+    sums = table[bottoms, rights] - table[tops, rights] - table[bottoms, lefts] + table[tops, lefts]
+    areas = ((rights - lefts) * (bottoms - tops))[:, np.newaxis]
+    return np.where(areas > 0, sums / np.maximum(areas, 1), np.nan)
+
+
+def describe_color(rgb: np.ndarray) -> dict[str, object]:
+    """Describes an RGB color as a hex string and a list of channels."""
+    channels = [int(round(float(channel))) for channel in rgb]
+    return {"color": "#{:02x}{:02x}{:02x}".format(*channels), "rgb": channels}
+
+
+__all__ = (
+    "SamplePoint",
+    "SampleRect",
+    "sample_point_colors",
+    "mean_rect_colors",
+    "describe_color",
+)
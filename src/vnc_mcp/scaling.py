@@ -0,0 +1,125 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+from pyvnc import Point
+from pyvnc import Rect
+
+
+@dataclass(frozen=True)
+class ScreenScaling:
+    """
+    Describes how far screenshots are shrunk before they are sent to the client.
+
+    The scale is always applied to the whole workspace, so that every coordinate the client sees or sends lives in one
+    (smaller) coordinate system. Any combination of limits may be set; the most restrictive one wins. Screenshots are
+    never enlarged.
+    """
+
+    max_width: int | None = None
+    max_height: int | None = None
+    scale: float | None = None
+
+    def __post_init__(self) -> None:
+        for name in ("max_width", "max_height", "scale"):
+            value = getattr(self, name)
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be positive, not {value}")
+
+    def factor_for(self, width: int, height: int) -> float:
+        """Returns the factor that framebuffer pixels are multiplied by for a workspace of the given size."""
+        factor = 1.0
+        if self.scale is not None:
+            factor = min(factor, self.scale)
+        if self.max_width is not None and width > 0:
+            factor = min(factor, self.max_width / width)
+        if self.max_height is not None and height > 0:
+            factor = min(factor, self.max_height / height)
+        return factor
+
+
+class CoordinateMapper:
+    """Translates between the client's (scaled) coordinates and framebuffer pixels."""
+
+    def __init__(self, factor: float, width: int, height: int) -> None:
+        self.factor = factor
+        self.width = width
+        self.height = height
+
+    @property
+    def scaled_resolution(self) -> Point:
+        """The resolution of the workspace as the client sees it."""
+        return Point(self.to_client(self.width), self.to_client(self.height))
+
+    def to_client(self, value: float) -> int:
+        """Scales a framebuffer length or coordinate into the client's coordinate system."""
+        return round(value * self.factor)
+
+    def to_framebuffer(self, value: float) -> int:
+        """Scales a length or coordinate in the client's coordinate system back to framebuffer pixels."""
+        return round(value / self.factor)
+
+    def rect_to_client(self, rect: Rect) -> Rect:
+        """Maps a rectangle of framebuffer pixels into the client's coordinate system."""
+        left, top = self.to_client(rect.x), self.to_client(rect.y)
+        return Rect(
+            left,
+            top,
+            self.to_client(rect.x + rect.width) - left,
+            self.to_client(rect.y + rect.height) - top,
+        )
+
+    def point(self, x: int, y: int) -> Point:
+        """Maps a point the client sent onto the framebuffer."""
+        return Point(
+            min(max(self.to_framebuffer(x), 0), max(self.width - 1, 0)),
+            min(max(self.to_framebuffer(y), 0), max(self.height - 1, 0)),
+        )
+
+    def rect(self, x: int, y: int, width: int, height: int) -> Rect:
+        """Maps a rectangle the client sent onto the framebuffer."""
+        left, top = self.to_framebuffer(x), self.to_framebuffer(y)
+        return Rect(
+            left, top, self.to_framebuffer(x + width) - left, self.to_framebuffer(y + height) - top
+        )
+
+
+def downscale_rgba_array(array: np.ndarray, factor: float) -> np.ndarray:
+    """
+    Shrinks an RGBA array by the given factor.
+
+    Whole multiples are shrunk by averaging blocks of pixels (which keeps thin lines and text legible), and whatever
+    factor remains after that is made up with a nearest-neighbor resample. Both steps are plain NumPy indexing.
+    """
+    if factor >= 1.0:
+        return array
+
+    height, width = array.shape[:2]
+    target_height, target_width = max(round(height * factor), 1), max(round(width * factor), 1)
+
+    block = int(1 / factor)
+    if block >= 2 and height >= block and width >= block:
+        cropped = array[: height - height % block, : width - width % block]
+        blocks = cropped.reshape(
+            cropped.shape[0] // block, block, cropped.shape[1] // block, block, array.shape[2]
+        )
+        array = (blocks.sum(axis=(1, 3), dtype=np.uint32) // (block * block)).astype(np.uint8)
+        height, width = array.shape[:2]
+
+    if (height, width) == (target_height, target_width):
+        return array
+
+    rows = ((np.arange(target_height) + 0.5) * (height / target_height)).astype(np.intp)
+    cols = ((np.arange(target_width) + 0.5) * (width / target_width)).astype(np.intp)
+    return array[rows[:, np.newaxis], cols]
+
+
+__all__ = ("ScreenScaling", "CoordinateMapper", "downscale_rgba_array")
@@ -0,0 +1,203 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from types import TracebackType
+from typing import AsyncGenerator
+from typing import Generator
+from weakref import WeakKeyDictionary
+
+import numpy as np
+from pyvnc import AsyncVNCClient
+
+from .dedupe import SentImages
+from .framebuffer import ShadowFramebuffer
+from .history import FrameHistory
+from .metrics import phase
+from .scaling import CoordinateMapper
+from .scaling import ScreenScaling
+
+
+logger = logging.getLogger(__name__)
+
+# The MCP client (session) that the current tool call is being served to, if any.
+_current_client: ContextVar[object | None] = ContextVar("_current_client", default=None)
+
+
+@contextmanager
+def serving_client(client: object | None) -> Generator[None, None, None]:
+    """
+    Marks everything done in this context as being done for client (i.e. an MCP client session), so that every
+    VNCSession shows it its own ClientView. None is the client of the stdio transport, or of no transport at all.
+    """
+    token = _current_client.set(client)
+    try:
+        yield
+    finally:
+        _current_client.reset(token)
+
+
+class ClientView:
+    """
+    What one MCP client has been shown of a VNCSession.
+
+    Over HTTP, several clients share a session. They take turns on the same connection, but each of them sees the
+    screen in its own coordinate system, has changes reported against what it was shown itself, and is only spared
+    images that it was sent itself.
+    """
+
+    def __init__(self, scaling: ScreenScaling) -> None:
+        # Screenshots are scaled once per client, so it only ever has to deal with one coordinate system.
+        self.scaling = scaling
+        # The last full frame the client was shown, which changes are reported against.
+        self.last_seen_frame: np.ndarray | None = None
+        # What the client was last sent for every region, so that identical images don't have to be sent again.
+        self.sent_images = SentImages()
+
+
+class VNCSession:
+    """
+    Bundles a connected AsyncVNCClient with all the state the MCP tools keep about it.
+    """
+
+    def __init__(
+        self,
+        vnc_client: AsyncVNCClient,
+        *,
+        framebuffer_max_age: float = 0.5,
+        framebuffer_refresh_interval: float | None = None,
+        scaling: ScreenScaling | None = None,
+        history_max_bytes: int = 0,
+        history_spill_directory: Path | None = None,
+    ) -> None:
+        self.client = vnc_client
+        # The scaling every client starts out with, until it asks for another one.
+        self.default_scaling = scaling or ScreenScaling()
+        self._default_view = ClientView(self.default_scaling)
+        # Views are dropped along with the client sessions they belong to.
+        self._views: WeakKeyDictionary[object, ClientView] = WeakKeyDictionary()
+        self.framebuffer = ShadowFramebuffer(
+            vnc_client,
+            max_age=framebuffer_max_age,
+            refresh_interval=framebuffer_refresh_interval,
+        )
+        # asyncio.Lock wakes waiters in the order they arrived, so interactions take turns fairly.
+        self._input_lock = asyncio.Lock()
+        self._exit_stack = AsyncExitStack()
+        # Every frame synced from the server is kept around for a while, so that a toast that has already disappeared
+        # can still be looked at.
+        self.history: FrameHistory | None = None
+        self._recordings: set[asyncio.Future[None]] = set()
+        self._recorder: ThreadPoolExecutor | None = None
+        if history_max_bytes > 0:
+            self.history = FrameHistory(history_max_bytes, spill_directory=history_spill_directory)
+            # Compressing frames is steady background work, so it gets a thread of its own instead of competing with
+            # the latency-sensitive work on the shared executors. One thread also records frames in order.
+            self._recorder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vnc-mcp-history")
+            self.framebuffer.on_frame = self._record_frame
+
+    @property
+    def view(self) -> ClientView:
+        """What the client currently being served (see serving_client) has been shown of this session."""
+        client = _current_client.get()
+        if client is None:
+            return self._default_view
+        view = self._views.get(client)
+        if view is None:
+            view = self._views[client] = ClientView(self.default_scaling)
+        return view
+
+    @property
+    def coordinates(self) -> CoordinateMapper:
+        """A mapper between the current client's coordinates and framebuffer pixels under its scaling."""
+        width, height = self.client.rect.width, self.client.rect.height
+        return CoordinateMapper(self.view.scaling.factor_for(width, height), width, height)
+
+    def replace_client(self, vnc_client: AsyncVNCClient) -> None:
+        """
+        Switches the session over to a new connection to the same server (i.e. after the old one dropped).
+
+        Everything else about the session is kept, and the shadow framebuffer is resynced on the next capture.
+        """
+        self.client = vnc_client
+        self.framebuffer.replace_client(vnc_client)
+
+    def _record_frame(self, frame: np.ndarray) -> None:
+        assert self.history is not None and self._recorder is not None
+        if len(self._recordings) >= 2:
+            # Compressing can't keep up with the refreshes, so this frame is skipped rather than queueing up behind them.
+            return
+        recording = asyncio.get_running_loop().run_in_executor(
+            self._recorder,
+            self.history.record,
+            frame,
+            time.monotonic(),
+            self.history.actions,
+        )
+        self._recordings.add(recording)
+        recording.add_done_callback(self._recorded)
+
+    def _recorded(self, recording: asyncio.Future[None]) -> None:
+        self._recordings.discard(recording)
+        if not recording.cancelled() and recording.exception() is not None:
+            logger.error(
+                "Recording a frame into the history failed.", exc_info=recording.exception()
+            )
+
+    @asynccontextmanager
+    async def acting(self) -> AsyncGenerator[AsyncVNCClient, None]:
+        """
+        Wraps any interaction that sends input to the session.
+
+        Input (almost) always changes what is on the screen, so the shadow framebuffer is invalidated afterward.
+
+        Only one interaction may send input at a time, and the rest wait their turn in the order they arrived. When
+        several clients share the session (i.e. over HTTP), this keeps one client's keystrokes from landing in the
+        middle of another's text, or while another is holding a modifier down.
+        """
+        async with self._input_lock:
+            if self.history is not None:
+                self.history.note_action()
+            try:
+                with phase("input"):
+                    yield self.client
+            finally:
+                self.framebuffer.invalidate()
+
+    async def __aenter__(self) -> VNCSession:
+        if self.history is not None:
+            self._exit_stack.callback(self.history.close)
+            self._exit_stack.push_async_callback(self._finish_recordings)
+        await self._exit_stack.enter_async_context(self.framebuffer)
+        return self
+
+    async def _finish_recordings(self) -> None:
+        # The history is closed right after, which mustn't happen under a recording that is still running in a thread.
+        await asyncio.gather(*self._recordings, return_exceptions=True)
+        if self._recorder is not None:
+            self._recorder.shutdown()
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        await self._exit_stack.aclose()
+
+
+__all__ = ("ClientView", "VNCSession", "serving_client")
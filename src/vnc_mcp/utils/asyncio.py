@@ -4,6 +4,7 @@ Copyright (C) 2025  Parker Wahle
 
 SPDX-License-Identifier: AGPL-3.0-or-later
 """  # noqa: E501, B950, D415
+
 # This code is from https://github.com/regulad/cookiecutter-neopy/blob/99065f33c840f6980c655e5d251c4225d613fd06/%7B%7Bcookiecutter.project_name%7D%7D/src/%7B%7Bcookiecutter.package_name%7D%7D/utils/asyncio.py, which was a work of mine that never saw the light of day
 from __future__ import annotations
 
@@ -14,8 +15,12 @@ import os
 import platform
 import signal
 import sys
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+from typing import Any
 from typing import AsyncGenerator
 from typing import Callable
 from typing import Coroutine
@@ -37,6 +42,7 @@ except ImportError:  # pragma: no cover
 
 UVLOOP_INSTALLED = "uvloop" in sys.modules
 THREAD_POOL_EXECUTORS = min(32, (os.cpu_count() or 1) + 4)
+CPU_BOUND_WORKERS = os.cpu_count() or 1
 
 logger = logging.getLogger(__name__)
 
@@ -136,10 +142,193 @@ def make_sync(coro: Callable[P, Coroutine[None, None, R]]) -> Callable[P, R]:
     return sync_function
 
 
+class BoundedExecutor:
+    """
+    Submits work to a concurrent.futures executor, but never lets more than max_pending jobs pile up in it.
+
+    An executor's own queue is unbounded, so a burst of jobs gets stuck behind each other in it. Once this one is full,
+    callers wait for a slot instead, which pushes back on whoever is submitting the work.
+    """
+
+    def __init__(self, executor: Executor, max_pending: int) -> None:
+        if max_pending < 1:
+            raise ValueError(f"max_pending must be at least 1, not {max_pending}")
+        self.executor = executor
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_pending)
+        self._pending = 0
+        self._waiting = 0
+
+    @property
+    def pending(self) -> int:
+        """How many jobs are queued in or running on the executor."""
+        return self._pending
+
+    @property
+    def waiting(self) -> int:
+        """How many callers are waiting for a slot, because the executor is full."""
+        return self._waiting
+
+    async def run(
+        self, func: Callable[..., R], *args: Any, on_done: Callable[[], None] | None = None
+    ) -> R:
+        """
+        Runs func(*args) on the executor once there is room for it, and returns its result.
+
+        on_done is called once the job is over, even if the caller stopped waiting for it before then (or right away, if
+        the job never made it onto the executor). It may be called from another thread.
+        """
+        submitted = False
+        try:
+            self._waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self._waiting -= 1
+
+            loop = asyncio.get_running_loop()
+            self._pending += 1
+
+            def release(_: Future[R]) -> None:
+                # The slot is only given back once the job is really done, even if the caller stopped waiting for it.
+                if on_done is not None:
+                    on_done()
+                try:
+                    loop.call_soon_threadsafe(self._release)
+                except RuntimeError:  # pragma: no cover
+                    pass  # the loop is already closed
+
+            try:
+                future = self.executor.submit(func, *args)
+            except BaseException:
+                self._release()
+                raise
+            submitted = True
+        finally:
+            if not submitted and on_done is not None:
+                on_done()
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self) -> None:
+        self._pending -= 1
+        self._slots.release()
+
+
+# These are only set while cpu_executors is active. Without them, everything falls back to asyncio.to_thread.
+_light_executor: BoundedExecutor | None = None
+_cpu_bound_executor: BoundedExecutor | None = None
+_cpu_bound_uses_processes = False
+
+
+def _limit_worker_threads() -> None:
+    # Every worker process is already one of many; native libraries (like tesseract's OpenMP) shouldn't spread a
+    # single job over every core on top of that.
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+@asynccontextmanager
+async def cpu_executors(
+    *,
+    light_threads: int = 4,
+    cpu_bound_workers: int = CPU_BOUND_WORKERS,
+    use_processes: bool = False,
+    queue_depth: int = 8,
+) -> AsyncGenerator[None, None]:
+    """
+    Sets up the executors that make_async and run_cpu_bound submit work to for as long as the context is active.
+
+    Light work (diffing, hashing) and CPU-bound work (encoding, OCR) get separate pools, so that one big OCR job can't
+    hold up every other screenshot. The CPU-bound pool can be a process pool, which gets around the GIL for the parts of
+    Pillow and NumPy that hold it. Arrays are handed to worker processes through shared memory. Each pool accepts
+    queue_depth jobs beyond the ones it is running before callers have to wait.
+    """
+    global _light_executor, _cpu_bound_executor, _cpu_bound_uses_processes
+    if light_threads < 1 or cpu_bound_workers < 1:
+        raise ValueError("Executors need at least one worker")
+    if queue_depth < 0:
+        raise ValueError(f"queue_depth must not be negative, not {queue_depth}")
+
+    cpu_bound_pool: Executor
+    if use_processes:
+        cpu_bound_pool = ProcessPoolExecutor(
+            max_workers=cpu_bound_workers, initializer=_limit_worker_threads
+        )
+    else:
+        cpu_bound_pool = ThreadPoolExecutor(
+            max_workers=cpu_bound_workers, thread_name_prefix="cpu_bound_thread"
+        )
+    with (
+        ThreadPoolExecutor(
+            max_workers=light_threads, thread_name_prefix="light_thread"
+        ) as light_pool,
+        cpu_bound_pool,
+    ):
+        previous = _light_executor, _cpu_bound_executor, _cpu_bound_uses_processes
+        _light_executor = BoundedExecutor(light_pool, light_threads + queue_depth)
+        _cpu_bound_executor = BoundedExecutor(cpu_bound_pool, cpu_bound_workers + queue_depth)
+        _cpu_bound_uses_processes = use_processes
+        try:
+            yield
+        finally:
+            _light_executor, _cpu_bound_executor, _cpu_bound_uses_processes = previous
+
+
+def executor_stats() -> dict[str, dict[str, int]]:
+    """Returns how busy each of the active executors is."""
+    return {
+        name: {
+            "max_pending": executor.max_pending,
+            "pending": executor.pending,
+            "waiting": executor.waiting,
+        }
+        for name, executor in (("light", _light_executor), ("cpu_bound", _cpu_bound_executor))
+        if executor is not None
+    }
+
+
 @functools.lru_cache(maxsize=None)  # type: ignore
 def make_async(func: Callable[P, R]) -> Callable[P, Coroutine[None, None, R]]:
     """A decorator that wraps a sync function and abstracts away calling it in an executor."""
-    return functools.wraps(func)(functools.partial(asyncio.to_thread, func))
+
+    @functools.wraps(func)
+    async def async_function(*args: P.args, **kwargs: P.kwargs) -> R:
+        if _light_executor is None:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        return await _light_executor.run(functools.partial(func, *args, **kwargs))
+
+    return async_function
+
+
+async def run_cpu_bound(func: Callable[..., R], array: Any, *args: Any) -> R:
+    """
+    Runs func(array, *args) on the CPU-bound executor.
+
+    When that is a process pool, func and args must be picklable (so func must be a plain module-level function), and
+    array (a NumPy array) is handed over through shared memory instead of being pickled.
+    """
+    if _cpu_bound_executor is None:
+        return await asyncio.to_thread(func, array, *args)
+    if not _cpu_bound_uses_processes:
+        return await _cpu_bound_executor.run(func, array, *args)
+    # Imported here since it needs NumPy, which this module otherwise doesn't.
+    from .shared_array import SharedArray
+    from .shared_array import call_with_shared_array
+
+    shared = SharedArray(array)
+    # The worker may still be reading the shared copy after the caller was cancelled, so it's released by the job.
+    return await _cpu_bound_executor.run(
+        call_with_shared_array, func, shared.handle, *args, on_done=shared.close
+    )
 
 
-__all__ = ("run_coroutine_managed", "signal_handler", "make_sync", "make_async")
+__all__ = (
+    "run_coroutine_managed",
+    "signal_handler",
+    "make_sync",
+    "make_async",
+    "BoundedExecutor",
+    "cpu_executors",
+    "executor_stats",
+    "run_cpu_bound",
+)
@@ -0,0 +1,23 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import hashlib
+
+import numpy as np
+
+
+def hash_rgba_array(array: np.ndarray) -> bytes:
+    """Returns a digest of the pixels (and shape) of an RGBA array that is cheap enough to compute for every call."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(array.shape).encode())
+    digest.update(np.ascontiguousarray(array).data)
+    return digest.digest()
+
+
+__all__ = ("hash_rgba_array",)
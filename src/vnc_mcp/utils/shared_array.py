@@ -0,0 +1,83 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+from typing import TypeVar
+
+import numpy as np
+
+
+R = TypeVar("R")
+
+
+@dataclass(frozen=True)
+class SharedArrayHandle:
+    """Everything a worker process needs to find a SharedArray. Unlike the array itself, it is tiny to pickle."""
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+
+class SharedArray:
+    """
+    A copy of an array in shared memory, which worker processes can read without it being pickled and piped to them.
+
+    The process that creates it owns it, and must close it once the workers are done.
+    """
+
+    def __init__(self, array: np.ndarray) -> None:
+        # Zero-byte blocks can't be created, but empty arrays still need a name.
+        self._shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=self._shm.buf)[...] = array
+        self.handle = SharedArrayHandle(self._shm.name, array.shape, array.dtype.str)
+
+    def close(self) -> None:
+        """Releases the shared memory. Workers that still have it open keep their mapping until they are done."""
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> SharedArray:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+def call_with_shared_array(
+    func: Callable[..., R], handle: SharedArrayHandle, *args: object, rows: slice = slice(None)
+) -> R:
+    """
+    Calls func with the (read-only) array behind handle as its first argument, followed by args.
+
+    rows picks out a band of the array, so that many jobs can share a single copy of one frame. The array is only
+    valid for the duration of the call, so func must not return it or a view of it.
+    """
+    # Worker processes share their parent's resource tracker, so attaching doesn't make this process an owner of the
+    # block as far as the tracker is concerned.
+    shm = SharedMemory(name=handle.name)
+    try:
+        array = np.ndarray(handle.shape, np.dtype(handle.dtype), buffer=shm.buf)
+        array.flags.writeable = False
+        try:
+            return func(array[rows], *args)
+        finally:
+            del array
+    finally:
+        try:
+            shm.close()
+        except BufferError:  # pragma: no cover
+            # Something (like the traceback of an exception func raised) still holds a view of the block, so the
+            # mapping is released along with it instead.
+            pass
+
+
+__all__ = ("SharedArrayHandle", "SharedArray", "call_with_shared_array")
@@ -0,0 +1,85 @@
+"""vnc-mcp
+
+Copyright (C) 2025  Parker Wahle
+
+SPDX-License-Identifier: AGPL-3.0-or-later
+"""  # noqa: E501, B950, D415
+
+from __future__ import annotations
+
+import numpy as np
+from pyvnc import Rect
+
+
+def pixels_as_words(array: np.ndarray) -> np.ndarray:
+    """Views an RGBA array as one 32-bit word per pixel, so pixels can be compared in one go."""
+    try:
+        return array.view(np.uint32)[..., 0]
+    except ValueError:
+        # The channels aren't contiguous, so the view can't be taken. This is rare (and slower).
+        return np.ascontiguousarray(array).view(np.uint32)[..., 0]
+
+
+def changed_tile_mask(previous: np.ndarray, current: np.ndarray, tile_size: int) -> np.ndarray:
+    """
+    Compares two RGBA arrays of the same shape tile by tile.
+
+    Returns a boolean array with one entry per tile (rows of tiles first), which is True if any pixel in that tile
+    differs. Tiles on the right and bottom edges may be smaller than tile_size.
+    """
+    if previous.shape != current.shape:
+        raise ValueError(
+            f"Can't compare frames of different shapes {previous.shape} and {current.shape}"
+        )
+
+    changed_pixels = pixels_as_words(previous) != pixels_as_words(current)
+    height, width = changed_pixels.shape
+    if height == 0 or width == 0:
+        return np.zeros((0, 0), dtype=bool)
+
+    row_starts = np.arange(0, height, tile_size)
+    col_starts = np.arange(0, width, tile_size)
+    changed_rows = np.logical_or.reduceat(changed_pixels, row_starts, axis=0)
+    return np.logical_or.reduceat(changed_rows, col_starts, axis=1)
+
+
+def tile_mask_to_rects(mask: np.ndarray, tile_size: int, width: int, height: int) -> list[Rect]:
+    """
+    Groups touching (including diagonally) tiles of a tile mask into regions.
+
+    Returns the bounding box of every region in pixels, clamped to width and height, from top to bottom.
+    """
+    seeds = [(int(row), int(col)) for row, col in np.argwhere(mask)]
+    unvisited = set(seeds)
+    rects = []
+    for seed in seeds:
+        if seed not in unvisited:
+            continue
+        unvisited.remove(seed)
+        stack = [seed]
+        top, left = seed
+        bottom, right = seed
+        while stack:
+            row, col = stack.pop()
+            top, bottom = min(top, row), max(bottom, row)
+            left, right = min(left, col), max(right, col)
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    neighbor = (row + d_row, col + d_col)
+                    if neighbor in unvisited:
+                        unvisited.remove(neighbor)
+                        stack.append(neighbor)
+
+        x, y = left * tile_size, top * tile_size
+        rects.append(
+            Rect(
+                x,
+                y,
+                min((right + 1) * tile_size, width) - x,
+                min((bottom + 1) * tile_size, height) - y,
+            )
+        )
+    return rects
+
+
+__all__ = ("pixels_as_words", "changed_tile_mask", "tile_mask_to_rects")
@@ -0,0 +1,164 @@
+"""Test cases for the actions module."""
+
+from contextlib import asynccontextmanager
+from typing import Any
+from typing import AsyncGenerator
+
+import pytest
+
+from vnc_mcp.actions import ClickAction
+from vnc_mcp.actions import HoldAction
+from vnc_mcp.actions import KeyAction
+from vnc_mcp.actions import MoveAction
+from vnc_mcp.actions import ReleaseAction
+from vnc_mcp.actions import TypeAction
+from vnc_mcp.actions import run_actions
+from vnc_mcp.scaling import CoordinateMapper
+
+
+class FakeVNCClient:
+    """Stands in for AsyncVNCClient, recording every input it is sent."""
+
+    def __init__(self) -> None:
+        """Creates a client that hasn't been sent anything yet."""
+        self.events: list[Any] = []
+
+    async def press(self, *keys: str) -> None:
+        """Records struck keys."""
+        self.events.append(("press", keys))
+
+    async def write(self, text: str) -> None:
+        """Records written text."""
+        self.events.append(("write", text))
+
+    async def move(self, point: Any, relative: bool = False) -> None:
+        """Records a mouse move."""
+        self.events.append(("move", point.x, point.y, relative))
+
+    async def click(self, button: int) -> None:
+        """Records a click, and fails for button 9 (which doesn't exist)."""
+        if button == 9:
+            raise ConnectionResetError("dropped")
+        self.events.append(("click", button))
+
+    @asynccontextmanager
+    async def hold_key(self, key: str) -> AsyncGenerator[None, None]:
+        """Records a key being pressed down and let go."""
+        self.events.append(("down", key))
+        try:
+            yield
+        finally:
+            self.events.append(("up", key))
+
+    @asynccontextmanager
+    async def hold_mouse(self, button: int) -> AsyncGenerator[None, None]:
+        """Records a mouse button being pressed down and let go."""
+        self.events.append(("down", f"mouse {button}"))
+        try:
+            yield
+        finally:
+            self.events.append(("up", f"mouse {button}"))
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Only the asyncio backend is used by vnc-mcp."""
+    return "asyncio"
+
+
+@pytest.fixture
+def client() -> FakeVNCClient:
+    """A fake client to send actions to."""
+    return FakeVNCClient()
+
+
+@pytest.fixture
+def coordinates() -> CoordinateMapper:
+    """Unscaled coordinates."""
+    return CoordinateMapper(1.0, 1920, 1080)
+
+
+@pytest.mark.anyio
+class TestRunActions:
+    """Test cases for run_actions."""
+
+    async def test_actions_run_in_order(
+        self, client: FakeVNCClient, coordinates: CoordinateMapper
+    ) -> None:
+        """Every action is sent in the order it was given, and described."""
+        done = await run_actions(
+            client,  # type: ignore[arg-type]
+            [KeyAction(keys=["a"]), TypeAction(text="hi"), ClickAction(mouse_button=1, n=2)],
+            coordinates,
+        )
+        assert client.events == [("press", ("a",)), ("write", "hi"), ("click", 1), ("click", 1)]
+        assert len(done) == 3
+
+    async def test_holds_and_releases_are_ordered(
+        self, client: FakeVNCClient, coordinates: CoordinateMapper
+    ) -> None:
+        """Explicit releases happen where they were asked for, and the rest at the end in reverse order."""
+        await run_actions(
+            client,  # type: ignore[arg-type]
+            [
+                HoldAction(keys=["ctrl", "shift"]),
+                HoldAction(mouse_button=0),
+                MoveAction(x=10, y=20),
+                ReleaseAction(mouse_button=0),
+                KeyAction(keys=["a"]),
+            ],
+            coordinates,
+        )
+        assert client.events == [
+            ("down", "ctrl"),
+            ("down", "shift"),
+            ("down", "mouse 0"),
+            ("move", 10, 20, False),
+            ("up", "mouse 0"),
+            ("press", ("a",)),
+            ("up", "shift"),
+            ("up", "ctrl"),
+        ]
+
+    async def test_holds_are_released_when_an_action_fails(
+        self, client: FakeVNCClient, coordinates: CoordinateMapper
+    ) -> None:
+        """A failing action still lets go of everything that was held."""
+        with pytest.raises(ConnectionResetError):
+            await run_actions(
+                client,  # type: ignore[arg-type]
+                [HoldAction(keys=["shift"], mouse_button=0), ClickAction(mouse_button=9)],
+                coordinates,
+            )
+        assert client.events[-2:] == [("up", "mouse 0"), ("up", "shift")]
+
+    async def test_invalid_releases_are_rejected(
+        self, client: FakeVNCClient, coordinates: CoordinateMapper
+    ) -> None:
+        """Releasing something that isn't held (or holding it twice) fails, and still lets go of the rest."""
+        with pytest.raises(ValueError, match="not being held"):
+            await run_actions(
+                client,  # type: ignore[arg-type]
+                [HoldAction(keys=["shift"]), ReleaseAction(keys=["ctrl"])],
+                coordinates,
+            )
+        assert client.events == [("down", "shift"), ("up", "shift")]
+        with pytest.raises(ValueError, match="already being held"):
+            await run_actions(
+                client,  # type: ignore[arg-type]
+                [HoldAction(keys=["shift"]), HoldAction(keys=["shift"])],
+                coordinates,
+            )
+
+    async def test_moves_are_scaled(self, client: FakeVNCClient) -> None:
+        """Points on a scaled screenshot are mapped onto the framebuffer, and sent like move_mouse_to does."""
+        await run_actions(
+            client,  # type: ignore[arg-type]
+            [MoveAction(x=100, y=50)],
+            CoordinateMapper(0.5, 3840, 2160),
+            relative=True,
+        )
+        assert client.events == [("move", 200, 100, True)]
+
+
+__all__ = ("TestRunActions",)
@@ -0,0 +1,91 @@
+"""Test cases for the asyncio utilities."""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from vnc_mcp.utils.asyncio import BoundedExecutor
+from vnc_mcp.utils.asyncio import cpu_executors
+from vnc_mcp.utils.asyncio import executor_stats
+from vnc_mcp.utils.asyncio import make_async
+from vnc_mcp.utils.asyncio import run_cpu_bound
+
+
+def _total(array: np.ndarray, offset: int) -> int:
+    return int(array.sum(dtype=np.int64)) + offset
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Only the asyncio backend is used by vnc-mcp."""
+    return "asyncio"
+
+
+@pytest.mark.anyio
+class TestExecutors:
+    """Test cases for the bounded executors."""
+
+    async def test_full_executor_applies_backpressure(self) -> None:
+        """Callers wait for a slot once max_pending jobs are in the executor."""
+        gate = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            executor = BoundedExecutor(pool, 2)
+            tasks = [asyncio.create_task(executor.run(gate.wait)) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            assert (executor.pending, executor.waiting) == (2, 1)
+            gate.set()
+            await asyncio.gather(*tasks)
+            assert (executor.pending, executor.waiting) == (0, 0)
+
+    async def test_cancelled_callers_keep_their_slot_until_the_job_ends(self) -> None:
+        """A job that is already running still counts against the limit after its caller gives up."""
+        gate = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            executor = BoundedExecutor(pool, 1)
+            task = asyncio.create_task(executor.run(gate.wait))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            await asyncio.sleep(0.05)
+            assert executor.pending == 1
+            gate.set()
+            await asyncio.sleep(0.05)
+            assert executor.pending == 0
+
+    async def test_on_done_waits_for_the_job(self) -> None:
+        """on_done is called once the job is over, even if its caller gave up, or right away if it never ran."""
+        gate = threading.Event()
+        done: list[str] = []
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            executor = BoundedExecutor(pool, 1)
+            running = asyncio.create_task(
+                executor.run(gate.wait, on_done=lambda: done.append("running"))
+            )
+            waiting = asyncio.create_task(
+                executor.run(gate.wait, on_done=lambda: done.append("waiting"))
+            )
+            await asyncio.sleep(0.05)
+            running.cancel()
+            waiting.cancel()
+            await asyncio.sleep(0.05)
+            assert done == ["waiting"]
+            gate.set()
+            await asyncio.sleep(0.05)
+            assert done == ["waiting", "running"]
+
+    @pytest.mark.parametrize("use_processes", [False, True])
+    async def test_cpu_bound_work(self, use_processes: bool) -> None:
+        """CPU-bound work runs the same on threads and on processes."""
+        array = np.ones((8, 8, 4), dtype=np.uint8)
+        async with cpu_executors(
+            light_threads=1, cpu_bound_workers=1, use_processes=use_processes, queue_depth=0
+        ):
+            assert set(executor_stats()) == {"light", "cpu_bound"}
+            assert await run_cpu_bound(_total, array, 1) == 257
+            assert await make_async(_total)(array, offset=2) == 258
+        assert executor_stats() == {}
+
+
+__all__ = ("TestExecutors",)
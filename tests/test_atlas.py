@@ -0,0 +1,45 @@
+"""Test cases for the atlas module."""
+
+import numpy as np
+
+from vnc_mcp.atlas import pack_atlas
+
+
+def _solid(height: int, width: int, value: int) -> np.ndarray:
+    return np.full((height, width, 4), value, dtype=np.uint8)
+
+
+class TestPackAtlas:
+    """Test cases for packing images into an atlas."""
+
+    def test_every_image_is_copied_to_its_offset(self) -> None:
+        """Every image can be cut back out of the atlas at its offset."""
+        arrays = [_solid(20, 300, 10), _solid(200, 40, 20), _solid(15, 280, 30), _solid(5, 5, 40)]
+        atlas, offsets = pack_atlas(arrays, gap=4)
+        assert len(offsets) == len(arrays)
+        for array, (x, y) in zip(arrays, offsets):
+            np.testing.assert_array_equal(
+                atlas[y : y + array.shape[0], x : x + array.shape[1]], array
+            )
+
+    def test_images_dont_overlap(self) -> None:
+        """No two images share a pixel, gap included."""
+        arrays = [_solid(30 + i, 50 + 7 * i, 1) for i in range(12)]
+        atlas, offsets = pack_atlas(arrays, gap=2)
+        covered = np.zeros(atlas.shape[:2], dtype=np.intp)
+        for array, (x, y) in zip(arrays, offsets):
+            covered[y : y + array.shape[0] + 2, x : x + array.shape[1] + 2] += 1
+        assert covered.max() == 1
+
+    def test_atlas_is_compact(self) -> None:
+        """Many equal images are packed into a roughly square atlas, not a long strip."""
+        atlas, _ = pack_atlas([_solid(40, 40, 1) for _ in range(16)], gap=0)
+        assert atlas.shape[:2] == (160, 160)
+
+    def test_no_images_make_an_empty_atlas(self) -> None:
+        """Packing nothing is allowed."""
+        atlas, offsets = pack_atlas([])
+        assert atlas.size == 0 and offsets == []
+
+
+__all__ = ("TestPackAtlas",)
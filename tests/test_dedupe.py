@@ -0,0 +1,86 @@
+"""Test cases for the dedupe module."""
+
+import numpy as np
+
+from vnc_mcp.dedupe import ImageFingerprint
+from vnc_mcp.dedupe import SentImages
+from vnc_mcp.dedupe import perceptual_hash
+
+
+def _gradient(height: int, width: int) -> np.ndarray:
+    array = np.zeros((height, width, 4), dtype=np.uint8)
+    array[..., 0] = np.linspace(0, 255, width, dtype=np.uint8)
+    array[..., 1] = np.linspace(0, 255, height, dtype=np.uint8)[:, np.newaxis]
+    array[..., 3] = 255
+    return array
+
+
+class TestImageFingerprint:
+    """Test cases for telling images apart."""
+
+    def test_identical_images_match(self) -> None:
+        """Equal pixels make equal fingerprints, no matter the threshold."""
+        first = ImageFingerprint.of(_gradient(100, 120))
+        second = ImageFingerprint.of(_gradient(100, 120))
+        assert first == second
+        assert first.matches(second, 0)
+
+    def test_small_changes_only_match_perceptually(self) -> None:
+        """A single changed pixel is a different image, but one that looks the same."""
+        image = _gradient(100, 120)
+        changed = image.copy()
+        changed[50, 60, :3] = 0
+        first, second = ImageFingerprint.of(image), ImageFingerprint.of(changed)
+        assert not first.matches(second, 0)
+        assert first.matches(second, 4)
+
+    def test_different_images_dont_match(self) -> None:
+        """A mirrored image doesn't look the same."""
+        image = _gradient(100, 120)
+        first, second = ImageFingerprint.of(image), ImageFingerprint.of(image[:, ::-1].copy())
+        assert not first.matches(second, 4)
+
+    def test_tiny_images_are_hashed(self) -> None:
+        """Images smaller than the hash's grid still hash, and empty ones hash to 0."""
+        assert perceptual_hash(_gradient(3, 3)) == perceptual_hash(_gradient(3, 3))
+        assert perceptual_hash(np.zeros((0, 10, 4), dtype=np.uint8)) == 0
+
+
+class TestSentImages:
+    """Test cases for remembering what was sent."""
+
+    def test_unchanged_images_are_reported(self) -> None:
+        """The first image for a region is new, and the same image again is not."""
+        sent = SentImages()
+        fingerprint = ImageFingerprint.of(_gradient(10, 10))
+        assert sent.unchanged_for("screen", fingerprint, 0) is None
+        unchanged_for = sent.unchanged_for("screen", fingerprint, 0)
+        assert unchanged_for is not None and unchanged_for >= 0
+        assert sent.unchanged_for("other", fingerprint, 0) is None
+
+    def test_forgotten_images_are_sent_again(self) -> None:
+        """Forgetting a region makes its next image new."""
+        sent = SentImages()
+        fingerprint = ImageFingerprint.of(_gradient(10, 10))
+        sent.unchanged_for("screen", fingerprint, 0)
+        sent.forget("screen")
+        assert sent.unchanged_for("screen", fingerprint, 0) is None
+
+    def test_remembered_images_are_unchanged(self) -> None:
+        """An image that was sent without checking is remembered all the same."""
+        sent = SentImages()
+        fingerprint = ImageFingerprint.of(_gradient(10, 10))
+        sent.remember("screen", fingerprint)
+        assert sent.unchanged_for("screen", fingerprint, 0) is not None
+
+    def test_least_recently_used_regions_are_evicted(self) -> None:
+        """Only max_entries regions are remembered."""
+        sent = SentImages(max_entries=2)
+        fingerprint = ImageFingerprint.of(_gradient(10, 10))
+        for key in ("a", "b", "c"):
+            sent.unchanged_for(key, fingerprint, 0)
+        assert sent.unchanged_for("a", fingerprint, 0) is None
+        assert sent.unchanged_for("c", fingerprint, 0) is not None
+
+
+__all__ = ("TestImageFingerprint", "TestSentImages")
@@ -0,0 +1,58 @@
+"""Test cases for the encoding module."""
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image as PILImage
+
+from vnc_mcp.encoding import ImageEncoding
+from vnc_mcp.encoding import encode_rgba_array
+
+
+@pytest.fixture
+def frame() -> np.ndarray:
+    """A small, noisy RGBA frame."""
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(24, 32, 4), dtype=np.uint8)
+
+
+class TestImageEncoding:
+    """Test cases for ImageEncoding and encode_rgba_array."""
+
+    @pytest.mark.parametrize("image_format", ["png", "jpeg", "webp"])
+    def test_formats_round_trip(self, frame: np.ndarray, image_format: str) -> None:
+        """Every supported format produces an image of the right size."""
+        data = encode_rgba_array(frame, ImageEncoding(format=image_format))  # type: ignore[arg-type]
+        with PILImage.open(BytesIO(data)) as image:
+            assert image.format.lower() == image_format
+            assert image.size == (32, 24)
+
+    def test_alpha_is_dropped_by_default(self, frame: np.ndarray) -> None:
+        """Framebuffers are opaque, so the alpha channel is not encoded unless asked for."""
+        with PILImage.open(BytesIO(encode_rgba_array(frame, ImageEncoding()))) as image:
+            assert image.mode == "RGB"
+        with PILImage.open(
+            BytesIO(encode_rgba_array(frame, ImageEncoding(keep_alpha=True)))
+        ) as image:
+            assert image.mode == "RGBA"
+
+    def test_png_is_lossless(self, frame: np.ndarray) -> None:
+        """PNG keeps every pixel intact regardless of the compression level."""
+        data = encode_rgba_array(frame, ImageEncoding(compress_level=0))
+        with PILImage.open(BytesIO(data)) as image:
+            assert np.array_equal(np.asarray(image), frame[..., :3])
+
+    def test_override_ignores_none(self) -> None:
+        """Only the settings that are passed are overridden."""
+        encoding = ImageEncoding(format="webp", quality=50).override(format=None, quality=90)
+        assert encoding == ImageEncoding(format="webp", quality=90)
+
+    @pytest.mark.parametrize("kwargs", [{"format": "gif"}, {"compress_level": 10}, {"quality": 0}])
+    def test_invalid_settings_are_rejected(self, kwargs: dict[str, object]) -> None:
+        """Settings out of range raise a ValueError."""
+        with pytest.raises(ValueError):
+            ImageEncoding(**kwargs)  # type: ignore[arg-type]
+
+
+__all__ = ("TestImageEncoding",)
@@ -0,0 +1,123 @@
+"""Test cases for the framebuffer module."""
+
+import asyncio
+from typing import Any
+
+import numpy as np
+import pytest
+from pyvnc import Rect
+
+from vnc_mcp.framebuffer import ShadowFramebuffer
+from vnc_mcp.framebuffer import crop_rgba_array
+
+
+class FakeVNCClient:
+    """Stands in for an AsyncVNCClient by serving a counter-stamped framebuffer."""
+
+    def __init__(self, width: int = 64, height: int = 48, delay: float = 0.0) -> None:
+        """Creates a fake client with a framebuffer of the given size, which takes delay seconds to send."""
+        self.width = width
+        self.height = height
+        self.delay = delay
+        self.captures = 0
+        self.rects: list[Rect | None] = []
+
+    async def capture(self, rect: Rect | None = None, **kwargs: Any) -> np.ndarray:
+        """Returns a new frame (or rect of it) whose pixels are all set to the number of captures so far."""
+        self.captures += 1
+        self.rects.append(rect)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        frame = np.full((self.height, self.width, 4), self.captures, dtype=np.uint8)
+        return frame if rect is None else crop_rgba_array(frame, rect)
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Only the asyncio backend is used by vnc-mcp."""
+    return "asyncio"
+
+
+@pytest.mark.anyio
+class TestShadowFramebuffer:
+    """Test cases for the ShadowFramebuffer."""
+
+    async def test_capture_is_served_from_memory(self) -> None:
+        """Captures within max_age do not go to the server."""
+        client = FakeVNCClient()
+        framebuffer = ShadowFramebuffer(client, max_age=60.0)  # type: ignore[arg-type]
+        await framebuffer.capture()
+        await framebuffer.capture()
+        assert client.captures == 1
+
+    async def test_invalidate_forces_refresh(self) -> None:
+        """Invalidating the shadow causes the next capture to go to the server."""
+        client = FakeVNCClient()
+        framebuffer = ShadowFramebuffer(client, max_age=60.0)  # type: ignore[arg-type]
+        await framebuffer.capture()
+        framebuffer.invalidate()
+        frame = await framebuffer.capture()
+        assert client.captures == 2
+        assert frame[0, 0, 0] == 2
+
+    async def test_rect_is_cropped_and_clamped(self) -> None:
+        """Subrectangles are cropped out of the shadow and clamped to its bounds."""
+        client = FakeVNCClient(width=64, height=48)
+        framebuffer = ShadowFramebuffer(client, max_age=60.0)  # type: ignore[arg-type]
+        assert (await framebuffer.capture(Rect(10, 20, 5, 6))).shape == (6, 5, 4)
+        assert (await framebuffer.capture(Rect(60, 40, 20, 20))).shape == (8, 4, 4)
+
+    async def test_small_rects_of_a_stale_shadow_are_fetched_alone(self) -> None:
+        """Only the rect is requested when the shadow is stale, and large rects resync the whole shadow instead."""
+        client = FakeVNCClient(width=64, height=48)
+        framebuffer = ShadowFramebuffer(client, max_age=60.0)  # type: ignore[arg-type]
+        await framebuffer.capture()
+        framebuffer.invalidate()
+        rect = await framebuffer.capture(Rect(60, 40, 20, 20))
+        assert rect.shape == (8, 4, 4) and rect[0, 0, 0] == 2
+        assert client.rects[-1] == Rect(60, 40, 4, 8)
+        assert not framebuffer.is_fresh
+        await framebuffer.capture(Rect(0, 0, 60, 40))
+        assert client.rects[-1] is None
+        assert framebuffer.is_fresh
+
+    async def test_capture_is_read_only(self) -> None:
+        """The shadow can not be modified through a capture."""
+        framebuffer = ShadowFramebuffer(FakeVNCClient())  # type: ignore[arg-type]
+        frame = await framebuffer.capture()
+        with pytest.raises(ValueError):
+            frame[0, 0, 0] = 255
+
+    async def test_concurrent_captures_share_one_request(self) -> None:
+        """Captures that arrive while a request is in flight are cropped out of its frame."""
+        client = FakeVNCClient(delay=0.05)
+        framebuffer = ShadowFramebuffer(client, max_age=0.0)  # type: ignore[arg-type]
+        frames = await asyncio.gather(
+            framebuffer.capture(), framebuffer.capture(Rect(0, 0, 8, 8)), framebuffer.refresh()
+        )
+        assert client.captures == 1
+        assert frames[1].shape == (8, 8, 4)
+        assert (framebuffer.fetches, framebuffer.coalesced) == (1, 2)
+
+    async def test_input_during_a_request_needs_another(self) -> None:
+        """A request that went out before an invalidation can't be shared by captures after it."""
+        client = FakeVNCClient(delay=0.05)
+        framebuffer = ShadowFramebuffer(client, max_age=60.0)  # type: ignore[arg-type]
+        first = asyncio.create_task(framebuffer.capture())
+        await asyncio.sleep(0.01)
+        framebuffer.invalidate()
+        second = await framebuffer.capture()
+        assert (await first)[0, 0, 0] == 1
+        assert second[0, 0, 0] == 2
+        assert framebuffer.is_fresh
+
+    async def test_waiters_share_forced_refreshes(self) -> None:
+        """Many callers waiting for the next frame only cause one request between them."""
+        client = FakeVNCClient(delay=0.05)
+        framebuffer = ShadowFramebuffer(client, poll_interval=0.0)  # type: ignore[arg-type]
+        results = await asyncio.gather(*(framebuffer.wait_for_frame(0) for _ in range(5)))
+        assert client.captures == 1
+        assert {generation for generation, _ in results} == {1}
+
+
+__all__ = ("TestShadowFramebuffer",)
@@ -0,0 +1,19 @@
+"""Test cases for the hashing module."""
+
+import numpy as np
+
+from vnc_mcp.utils.hashing import hash_rgba_array
+
+
+class TestHashing:
+    """Test cases for hash_rgba_array."""
+
+    def test_hash_ignores_memory_layout(self) -> None:
+        """A view and a copy of the same pixels hash the same, but a different shape does not."""
+        frame = np.random.default_rng(0).integers(0, 256, size=(24, 32, 4), dtype=np.uint8)
+        view = frame[4:20, 8:24]
+        assert hash_rgba_array(view) == hash_rgba_array(view.copy())
+        assert hash_rgba_array(frame) != hash_rgba_array(frame.reshape(32, 24, 4))
+
+
+__all__ = ("TestHashing",)
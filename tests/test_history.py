@@ -0,0 +1,88 @@
+"""Test cases for the history module."""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from vnc_mcp.history import FrameHistory
+
+
+def _frame(seed: int, height: int = 100, width: int = 130) -> np.ndarray:
+    array = np.zeros((height, width, 4), dtype=np.uint8)
+    array[..., 3] = 255
+    # A small random patch, so that consecutive frames only differ in a few tiles.
+    rng = np.random.default_rng(seed)
+    y, x = rng.integers(0, height - 10), rng.integers(0, width - 10)
+    array[y : y + 10, x : x + 10, :3] = rng.integers(0, 256, size=(10, 10, 3), dtype=np.uint8)
+    return array
+
+
+class TestFrameHistory:
+    """Test cases for recording and looking back through frames."""
+
+    @pytest.mark.parametrize("spill", [False, True])
+    def test_every_frame_is_reconstructed(self, spill: bool, tmp_path: Path) -> None:
+        """Frames come back exactly, across keyframes and deltas."""
+        history = FrameHistory(
+            1 << 22, keyframe_interval=3, tile_size=16, spill_directory=tmp_path if spill else None
+        )
+        frames = [_frame(seed) for seed in range(10)]
+        for index, frame in enumerate(frames):
+            history.record(frame, float(index), 0)
+        assert history.frames == 10
+        for index, frame in enumerate(frames):
+            past = history.frame_at(index + 0.5)
+            assert past is not None and past.captured_at == index
+            np.testing.assert_array_equal(past.array, frame)
+        history.close()
+
+    def test_unchanged_frames_arent_stored(self) -> None:
+        """The same screen twice is one frame, and the time in between is served by it."""
+        history = FrameHistory(1 << 20)
+        history.record(_frame(0), 0.0, 0)
+        history.record(_frame(0), 1.0, 0)
+        assert history.frames == 1
+        past = history.frame_at(2.0)
+        assert past is not None and past.captured_at == 0.0
+        assert history.frame_at(-1.0) is None
+
+    def test_frames_are_found_by_actions(self) -> None:
+        """actions_ago finds the frame from right before that action."""
+        history = FrameHistory(1 << 20)
+        for index in range(3):
+            history.record(_frame(index), float(index), history.actions)
+            history.note_action()
+        before_last = history.frame_before_actions(1)
+        assert before_last is not None
+        np.testing.assert_array_equal(before_last.array, _frame(2))
+        before_first = history.frame_before_actions(3)
+        assert before_first is not None
+        np.testing.assert_array_equal(before_first.array, _frame(0))
+        assert history.frame_before_actions(4) is None
+
+    @pytest.mark.parametrize("spill", [False, True])
+    def test_history_is_bounded(self, spill: bool, tmp_path: Path) -> None:
+        """The oldest frames are dropped to stay within max_bytes, and the newest are still intact."""
+        max_bytes = 20_000
+        history = FrameHistory(
+            max_bytes,
+            keyframe_interval=4,
+            tile_size=16,
+            spill_directory=tmp_path if spill else None,
+        )
+        frames = [_frame(seed) for seed in range(200)]
+        for index, frame in enumerate(frames):
+            history.record(frame, float(index), 0)
+            assert history.stored_bytes <= max_bytes
+        assert 0 < history.frames < 200
+        oldest = history.oldest()
+        assert oldest is not None and oldest[0] > 0
+        for index in (199, 198, 196):
+            past = history.frame_at(float(index))
+            assert past is not None
+            np.testing.assert_array_equal(past.array, frames[index])
+        history.close()
+
+
+__all__ = ("TestFrameHistory",)
@@ -1,5 +1,8 @@
 """Test cases for the __main__ module."""
 
+import subprocess
+import sys
+
 import pytest
 from typer.testing import CliRunner
 
@@ -21,4 +24,25 @@ class TestCLI:
         assert result.exit_code == 0
 
 
-__all__ = ("TestCLI",)
+class TestImports:
+    """Test cases for what importing the command-line interface costs."""
+
+    def test_heavy_modules_are_imported_lazily(self) -> None:
+        """Importing the CLI (i.e. for --help) doesn't load NumPy, Pillow, tesseract, pyvnc, or the MCP SDK."""
+        heavy = ("numpy", "PIL", "pytesseract", "tesserocr", "pyvnc", "mcp")
+        # A fresh interpreter, since this one has long since imported all of them for the other tests.
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, vnc_mcp.__main__; "
+                f"print(','.join(name for name in {heavy!r} if name in sys.modules))",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert result.stdout.strip() == ""
+
+
+__all__ = ("TestCLI", "TestImports")
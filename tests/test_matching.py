@@ -0,0 +1,69 @@
+"""Test cases for the matching module."""
+
+import numpy as np
+import pytest
+
+from vnc_mcp.matching import find_template_matches
+from vnc_mcp.matching import match_template
+
+
+def _noise(height: int, width: int, seed: int) -> np.ndarray:
+    array = np.random.default_rng(seed).integers(0, 256, size=(height, width, 4), dtype=np.uint8)
+    array[..., 3] = 255
+    return array
+
+
+class TestMatchTemplate:
+    """Test cases for finding a template in an image."""
+
+    def test_exact_copy_scores_one(self) -> None:
+        """The template scores 1 where it was cut out, and is found there."""
+        image = _noise(60, 80, 0)
+        scores = match_template(image, image[20:30, 40:55])
+        assert scores.shape == (51, 66)
+        assert scores[20, 40] == pytest.approx(1.0)
+        matches = find_template_matches(scores, 15, 10, threshold=0.99)
+        assert [(match.x, match.y, match.width, match.height) for match in matches] == [
+            (40, 20, 15, 10)
+        ]
+
+    def test_every_copy_is_found_once(self) -> None:
+        """Separate copies are all found, and never twice."""
+        image = _noise(60, 80, 1)
+        template = _noise(10, 15, 2)
+        image[5:15, 5:20] = template
+        image[40:50, 50:65] = template
+        matches = find_template_matches(match_template(image, template), 15, 10, threshold=0.95)
+        assert {(match.x, match.y) for match in matches} == {(5, 5), (50, 40)}
+
+    def test_brightness_and_contrast_are_ignored(self) -> None:
+        """A dimmed copy of the template still matches."""
+        image = _noise(40, 40, 3)
+        template = image[10:20, 10:20].copy()
+        image[10:20, 10:20, :3] = template[..., :3] // 2 + 60
+        assert match_template(image, template)[10, 10] == pytest.approx(1.0, abs=0.01)
+
+    def test_max_matches_is_respected(self) -> None:
+        """No more than max_matches are returned, best first."""
+        image = _noise(60, 80, 4)
+        template = _noise(8, 8, 5)
+        for x in (0, 20, 40, 60):
+            image[0:8, x : x + 8] = template
+        matches = find_template_matches(
+            match_template(image, template), 8, 8, threshold=0.5, max_matches=2
+        )
+        assert len(matches) == 2
+        assert matches[0].score >= matches[1].score
+
+    def test_flat_templates_are_rejected(self) -> None:
+        """A single-color template would match every flat area, so it isn't allowed."""
+        with pytest.raises(ValueError):
+            match_template(_noise(20, 20, 6), np.full((5, 5, 4), 128, dtype=np.uint8))
+
+    def test_templates_larger_than_the_image_match_nothing(self) -> None:
+        """A template that doesn't fit anywhere isn't found."""
+        scores = match_template(_noise(10, 10, 7), _noise(20, 5, 8))
+        assert find_template_matches(scores, 5, 20) == []
+
+
+__all__ = ("TestMatchTemplate",)
@@ -0,0 +1,242 @@
+"""Test cases for the mcp module."""
+
+import json
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Any
+from typing import AsyncGenerator
+from typing import Callable
+from typing import Generator
+
+import numpy as np
+import pytest
+from mcp.server import FastMCP
+from mcp.server.lowlevel.server import request_ctx
+from mcp.shared.context import RequestContext
+from mcp.types import ImageContent
+from mcp.types import TextContent
+from pyvnc import Rect
+from pyvnc import VNCConfig
+
+from vnc_mcp import pool as pool_module
+from vnc_mcp.framebuffer import crop_rgba_array
+from vnc_mcp.mcp import create_mcp_server
+from vnc_mcp.pool import VNCSessionPool
+from vnc_mcp.session import VNCSession
+
+
+WIDTH, HEIGHT = 64, 48
+
+
+def _frame(changed: bool = False, x: int = 5, y: int = 5) -> np.ndarray:
+    frame = np.zeros((HEIGHT, WIDTH, 4), dtype=np.uint8)
+    frame[..., 3] = 255
+    if changed:
+        frame[y, x, :3] = 255
+    return frame
+
+
+class FakeScreen:
+    """Stands in for AsyncVNCClient's connect, and serves frame_for(n) as the nth captured frame."""
+
+    def __init__(self) -> None:
+        """Creates a screen that never changes."""
+        self.frame_for: Callable[[int], np.ndarray] = lambda n: _frame()
+        self.capture_times: list[float] = []
+
+    async def connect(self, config: VNCConfig) -> "FakeScreenClient":
+        """Opens a fake connection to this screen."""
+        return FakeScreenClient(self)
+
+
+class FakeScreenClient:
+    """A fake connection to a FakeScreen."""
+
+    def __init__(self, screen: FakeScreen) -> None:
+        """Connects to the screen."""
+        self.screen = screen
+        self.rect = Rect(0, 0, WIDTH, HEIGHT)
+
+    async def capture(self, rect: Rect | None = None, **kwargs: Any) -> np.ndarray:
+        """Returns the screen's next frame, or rect of it."""
+        self.screen.capture_times.append(time.monotonic())
+        frame = self.screen.frame_for(len(self.screen.capture_times))
+        return frame if rect is None else crop_rgba_array(frame, rect)
+
+    async def __aenter__(self) -> "FakeScreenClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Only the asyncio backend is used by vnc-mcp."""
+    return "asyncio"
+
+
+@pytest.fixture
+def screen(monkeypatch: pytest.MonkeyPatch) -> FakeScreen:
+    """The fake screen every session connects to."""
+    screen = FakeScreen()
+    monkeypatch.setattr(pool_module, "AsyncVNCClient", screen)
+    return screen
+
+
+@pytest.fixture
+async def mcp_server(screen: FakeScreen) -> AsyncGenerator[FastMCP, None]:
+    """An MCP server whose one session polls the fake screen every 10 ms."""
+    pool = VNCSessionPool(
+        {"default": VNCConfig(host="fake", port=5900)},
+        idle_timeout=None,
+        keepalive_interval=None,
+        session_factory=partial(VNCSession, framebuffer_max_age=0.0),
+    )
+    async with pool:
+        async with pool.use() as session:
+            session.framebuffer.poll_interval = 0.01
+        yield create_mcp_server(pool)
+
+
+class FakeMCPSession:
+    """Stands in for the session of one MCP client."""
+
+
+@contextmanager
+def _as_client(client: FakeMCPSession) -> Generator[None, None, None]:
+    # Tools called in this context are called as if through a request from client.
+    token = request_ctx.set(RequestContext(request_id=1, meta=None, session=client, lifespan_context=None))  # type: ignore[arg-type]
+    try:
+        yield
+    finally:
+        request_ctx.reset(token)
+
+
+async def _call_raw(mcp_server: FastMCP, tool: str, **arguments: Any) -> Any:
+    content = await mcp_server.call_tool(tool, arguments)
+    return content[0]
+
+
+async def _call(mcp_server: FastMCP, tool: str, **arguments: Any) -> str:
+    return (await _call_raw(mcp_server, tool, **arguments)).text  # type: ignore[no-any-return]
+
+
+@pytest.mark.anyio
+class TestWaitForScreenChange:
+    """Test cases for the wait_for_screen_change tool."""
+
+    async def test_times_out_on_a_static_screen(self, mcp_server: FastMCP) -> None:
+        """A screen that never changes is waited on until the timeout, and reported as unchanged."""
+        started = time.monotonic()
+        result = await _call(mcp_server, "wait_for_screen_change", timeout_ms=100)
+        assert result == "Screen did not change within 100 ms"
+        assert time.monotonic() - started >= 0.1
+
+    async def test_a_single_pixel_is_a_change(
+        self, mcp_server: FastMCP, screen: FakeScreen
+    ) -> None:
+        """Any changed pixel ends the wait."""
+        screen.frame_for = lambda n: _frame(changed=n >= 3)
+        result = await _call(mcp_server, "wait_for_screen_change", timeout_ms=5000)
+        assert result.startswith("Screen changed after")
+
+    async def test_changes_outside_the_rectangle_are_ignored(
+        self, mcp_server: FastMCP, screen: FakeScreen
+    ) -> None:
+        """Only the watched rectangle counts."""
+        screen.frame_for = lambda n: _frame(changed=n >= 3, x=50, y=40)
+        result = await _call(
+            mcp_server,
+            "wait_for_screen_change",
+            timeout_ms=150,
+            top_left_x=0,
+            top_left_y=0,
+            width=16,
+            height=16,
+        )
+        assert result == "Screen did not change within 150 ms"
+
+
+@pytest.mark.anyio
+class TestWaitForScreenStable:
+    """Test cases for the wait_for_screen_stable tool."""
+
+    async def test_waits_for_quiet_polls(self, mcp_server: FastMCP, screen: FakeScreen) -> None:
+        """The screen has to stay the same across polls for stable_ms after its last change."""
+        screen.frame_for = lambda n: _frame(changed=n % 2 == 0) if n <= 5 else _frame()
+        result = await _call(mcp_server, "wait_for_screen_stable", stable_ms=100, timeout_ms=5000)
+        assert result.startswith("Screen was stable for 100 ms")
+        quiet_polls = screen.capture_times[5:]
+        assert len(quiet_polls) >= 2
+        assert quiet_polls[-1] - screen.capture_times[4] >= 0.1
+
+    async def test_times_out_while_changing(self, mcp_server: FastMCP, screen: FakeScreen) -> None:
+        """A screen that keeps changing is never stable."""
+        screen.frame_for = lambda n: _frame(changed=n % 2 == 0)
+        result = await _call(mcp_server, "wait_for_screen_stable", stable_ms=100, timeout_ms=200)
+        assert result == "Screen did not stay stable for 100 ms within 200 ms"
+
+
+@pytest.mark.anyio
+class TestClientSessions:
+    """Test cases for several MCP clients sharing one VNC session."""
+
+    async def test_scaling_and_changes_are_per_client(
+        self, mcp_server: FastMCP, screen: FakeScreen
+    ) -> None:
+        """One client's scale and last seen frame don't affect another's, while the connection is shared."""
+        changed = False
+        screen.frame_for = lambda n: _frame(changed=changed)
+        first, second = FakeMCPSession(), FakeMCPSession()
+
+        with _as_client(second):
+            regions = json.loads(await _call(mcp_server, "get_changed_regions"))
+            assert regions == [{"x": 0, "y": 0, "width": WIDTH, "height": HEIGHT}]
+        with _as_client(first):
+            image = await _call_raw(
+                mcp_server, "get_whole_screen_image", scale=0.5, skip_if_unchanged=False
+            )
+            assert isinstance(image, ImageContent)
+            assert await _call(mcp_server, "get_changed_regions") == "[]"
+        with _as_client(second):
+            # The first client looking at the screen didn't use up what the second one hasn't seen yet.
+            assert await _call(mcp_server, "get_changed_regions") == "[]"
+
+        changed = True
+        with _as_client(first):
+            regions = json.loads(await _call(mcp_server, "get_changed_regions"))
+            assert regions == [{"x": 0, "y": 0, "width": 16, "height": 16}]
+        with _as_client(second):
+            regions = json.loads(await _call(mcp_server, "get_changed_regions"))
+            assert regions == [{"x": 0, "y": 0, "width": 32, "height": 32}]
+
+    async def test_images_are_deduplicated_per_client(self, mcp_server: FastMCP) -> None:
+        """A client is only told an image is unchanged if it was sent that image itself."""
+        first, second = FakeMCPSession(), FakeMCPSession()
+
+        with _as_client(first):
+            assert isinstance(await _call_raw(mcp_server, "get_whole_screen_image"), ImageContent)
+            assert isinstance(await _call_raw(mcp_server, "get_whole_screen_image"), TextContent)
+        with _as_client(second):
+            assert isinstance(await _call_raw(mcp_server, "get_whole_screen_image"), ImageContent)
+
+
+@pytest.mark.anyio
+class TestSkipIfUnchanged:
+    """Test cases for not sending screenshots the client already has."""
+
+    async def test_forced_images_are_remembered(self, mcp_server: FastMCP) -> None:
+        """An image that was sent with skip_if_unchanged=false isn't sent again by the next default call."""
+        image = await _call_raw(mcp_server, "get_whole_screen_image", skip_if_unchanged=False)
+        assert isinstance(image, ImageContent)
+        assert isinstance(await _call_raw(mcp_server, "get_whole_screen_image"), TextContent)
+
+
+__all__ = (
+    "TestWaitForScreenChange",
+    "TestWaitForScreenStable",
+    "TestClientSessions",
+    "TestSkipIfUnchanged",
+)
@@ -0,0 +1,111 @@
+"""Test cases for the metrics module."""
+
+import asyncio
+import inspect
+
+import pytest
+
+from vnc_mcp.metrics import Histogram
+from vnc_mcp.metrics import ToolMetrics
+from vnc_mcp.metrics import phase
+from vnc_mcp.metrics import serve_metrics
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Only the asyncio backend is used by vnc-mcp."""
+    return "asyncio"
+
+
+class TestHistogram:
+    """Test cases for the Histogram."""
+
+    def test_observations_are_cumulative(self) -> None:
+        """Every bucket counts the observations at or below its bound."""
+        histogram = Histogram((1.0, 2.0))
+        for value in (0.5, 1.0, 1.5, 3.0):
+            histogram.observe(value)
+        assert histogram.cumulative() == [(1.0, 2), (2.0, 3), (float("inf"), 4)]
+        assert (histogram.count, histogram.sum) == (4, 6.0)
+
+    def test_quantiles_interpolate_within_buckets(self) -> None:
+        """Quantiles are estimated linearly inside the bucket they fall into."""
+        histogram = Histogram((1.0, 2.0))
+        assert histogram.quantile(0.5) is None
+        for value in (0.5, 1.5, 1.5, 1.5):
+            histogram.observe(value)
+        assert histogram.quantile(0.25) == 1.0
+        assert histogram.quantile(0.5) == pytest.approx(1 + 1 / 3)
+
+
+@pytest.mark.anyio
+class TestToolMetrics:
+    """Test cases for the ToolMetrics."""
+
+    async def test_calls_errors_and_phases_are_recorded(self) -> None:
+        """Every call, error, phase, and response size is attributed to its tool."""
+        metrics = ToolMetrics()
+
+        async def capture(fail: bool = False) -> str:
+            with phase("capture"):
+                await asyncio.sleep(0.01)
+            if fail:
+                raise ValueError("no")
+            return "four"
+
+        instrumented = metrics.instrument("capture", capture, measure=len)
+        assert await instrumented() == "four"
+        with pytest.raises(ValueError):
+            await instrumented(fail=True)
+
+        summary = metrics.summary()["capture"]
+        assert (summary["calls"], summary["errors"], summary["error_rate"]) == (2, 1, 0.5)
+        assert summary["phases"]["capture"]["count"] == 2  # type: ignore[index]
+        assert summary["response_bytes"]["mean"] == 4  # type: ignore[index]
+
+    async def test_phases_outside_calls_are_ignored(self) -> None:
+        """Work done outside of a tool call isn't attributed to any tool."""
+        metrics = ToolMetrics()
+        with phase("encode"):
+            pass
+        assert metrics.summary() == {}
+
+    async def test_signature_is_kept(self) -> None:
+        """Wrapped sync functions become async, but keep their name, docstring, and resolved signature."""
+        metrics = ToolMetrics()
+
+        def resolution(session_id: "str | None" = None) -> "str":
+            """Docs."""
+            return "1x1"
+
+        instrumented = metrics.instrument("resolution", resolution)
+        assert inspect.iscoroutinefunction(instrumented)
+        assert (instrumented.__name__, instrumented.__doc__) == ("resolution", "Docs.")
+        assert inspect.signature(instrumented).parameters["session_id"].annotation == str | None
+        assert await instrumented() == "1x1"
+
+    async def test_metrics_are_served_over_http(self) -> None:
+        """The endpoint serves the exposition format at /metrics and nothing anywhere else."""
+        metrics = ToolMetrics()
+        metrics.add_gauge("vnc_mcp_test_value", "A test value.", lambda: 3)
+        await metrics.instrument("noop", lambda: None)()
+
+        async with serve_metrics(metrics, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+
+            async def get(path: str) -> bytes:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+                response = await reader.read()
+                writer.close()
+                return response
+
+            response = await get("/metrics")
+            assert response.startswith(b"HTTP/1.1 200 OK")
+            assert b'vnc_mcp_tool_calls_total{tool="noop"} 1' in response
+            assert b'vnc_mcp_tool_duration_seconds_bucket{tool="noop",le="+Inf"} 1' in response
+            assert b"vnc_mcp_test_value 3.0" in response
+            assert (await get("/")).startswith(b"HTTP/1.1 404")
+
+
+__all__ = ("TestHistogram", "TestToolMetrics")
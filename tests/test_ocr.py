@@ -0,0 +1,162 @@
+"""Test cases for the ocr module."""
+
+import pickle
+
+import numpy as np
+import pytest
+
+from vnc_mcp import ocr as ocr_module
+from vnc_mcp.ocr import OCRCache
+from vnc_mcp.ocr import OCRWord
+from vnc_mcp.ocr import ParallelOCRBackend
+from vnc_mcp.ocr import PytesseractBackend
+from vnc_mcp.ocr import TesserocrBackend
+from vnc_mcp.ocr import create_ocr_backend
+from vnc_mcp.ocr import find_phrase
+from vnc_mcp.ocr import group_words_into_lines
+from vnc_mcp.ocr import split_into_text_bands
+from vnc_mcp.ocr import stitch_text_bands
+
+
+@pytest.fixture
+def frame() -> np.ndarray:
+    """A small, noisy RGBA frame."""
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(24, 32, 4), dtype=np.uint8)
+
+
+class TestOCRCache:
+    """Test cases for the OCRCache."""
+
+    def test_hits_and_misses(self, frame: np.ndarray) -> None:
+        """The same pixels and language are found again, and anything else isn't."""
+        cache = OCRCache()
+        assert cache.get(OCRCache.key(frame, "eng")) is None
+        cache.put(OCRCache.key(frame, "eng"), "hello")
+        assert cache.get(OCRCache.key(frame.copy(), "eng")) == "hello"
+        assert cache.get(OCRCache.key(frame, "deu")) is None
+        assert cache.get(OCRCache.key(frame, "eng", kind="words")) is None
+        assert (cache.hits, cache.misses) == (1, 3)
+
+    def test_memory_budget_evicts_least_recently_used(self, frame: np.ndarray) -> None:
+        """Old entries are evicted once the budget is exceeded."""
+        cache = OCRCache(max_bytes=1000)
+        text = "x" * 300
+        for lang in ("a", "b", "c"):
+            cache.put(OCRCache.key(frame, lang), text)
+        assert len(cache) == 2
+        assert cache.size <= 1000
+        assert cache.get(OCRCache.key(frame, "a")) is None
+        assert cache.get(OCRCache.key(frame, "c")) == text
+
+
+class TestTextBands:
+    """Test cases for splitting images into bands and stitching their text back together."""
+
+    def test_small_images_are_not_split(self, frame: np.ndarray) -> None:
+        """An image shorter than a band is OCRed in one piece."""
+        assert split_into_text_bands(frame, band_height=100) == [(0, 24)]
+
+    def test_bands_are_cut_on_blank_rows(self) -> None:
+        """Bands are cut on the last blank row in their second half, and overlap where there is none."""
+        array = np.full((300, 50, 4), 255, dtype=np.uint8)
+        array[:, 10] = 0
+        array[70] = 255
+        array[130] = 255
+        bands = split_into_text_bands(array, band_height=100, overlap=10)
+        assert bands == [(0, 70), (70, 130), (130, 230), (220, 300)]
+
+    def test_bands_overlap_without_blank_rows(self, frame: np.ndarray) -> None:
+        """Bands overlap when there is nowhere clean to cut them."""
+        bands = split_into_text_bands(np.tile(frame, (10, 1, 1)), band_height=100, overlap=10)
+        assert bands == [(0, 100), (90, 190), (180, 240)]
+
+    def test_overlapping_lines_are_kept_once(self) -> None:
+        """Lines OCRed twice because of an overlap only appear once."""
+        text = stitch_text_bands(["one\ntwo\n\f", "two\nthree\n\f"], [(0, 100), (90, 190)])
+        assert text == "one\ntwo\n\nthree\n"
+
+    def test_separate_bands_are_all_kept(self) -> None:
+        """Repeated lines in bands that don't overlap are real."""
+        text = stitch_text_bands(["same\n", "same\n"], [(0, 100), (100, 200)])
+        assert text == "same\n\nsame\n"
+
+
+def _word(text: str, left: int, line: int) -> OCRWord:
+    return OCRWord(text, left, line * 20, 40, 10, 90.0, block=1, paragraph=1, line=line)
+
+
+class TestFindText:
+    """Test cases for grouping OCRed words into lines and finding phrases in them."""
+
+    @pytest.fixture
+    def words(self) -> list[OCRWord]:
+        """Two lines of words."""
+        return [
+            _word("File", 0, 1),
+            _word("Save", 50, 1),
+            _word("As...", 100, 1),
+            _word("Autosave:", 0, 2),
+            _word("on", 50, 2),
+        ]
+
+    def test_lines_have_the_bounding_box_of_their_words(self, words: list[OCRWord]) -> None:
+        """Lines join their words and cover all of them."""
+        lines = group_words_into_lines(words)
+        assert [line.text for line in lines] == ["File Save As...", "Autosave: on"]
+        assert (lines[0].left, lines[0].top, lines[0].width, lines[0].height) == (0, 20, 140, 10)
+
+    def test_phrases_match_consecutive_words(self, words: list[OCRWord]) -> None:
+        """Phrases match words in order, ignoring case and punctuation."""
+        matches = find_phrase(group_words_into_lines(words), "save as")
+        assert [match.text for match in matches] == ["Save As..."]
+        assert find_phrase(group_words_into_lines(words), "as save") == []
+
+    def test_single_words_match_inside_longer_words(self, words: list[OCRWord]) -> None:
+        """A single word is found inside other words, unless the case must match."""
+        lines = group_words_into_lines(words)
+        assert [match.text for match in find_phrase(lines, "save")] == ["Save", "Autosave:"]
+        assert [match.text for match in find_phrase(lines, "Save", case_sensitive=True)] == ["Save"]
+
+
+class TestOCRBackends:
+    """Test cases for picking an OCR backend, which don't need tesseract itself."""
+
+    def test_auto_falls_back_to_pytesseract(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Without tesserocr, "auto" uses pytesseract, and asking for tesserocr fails clearly."""
+        monkeypatch.setattr(ocr_module, "TESSEROCR_INSTALLED", False)
+        assert isinstance(create_ocr_backend("auto"), PytesseractBackend)
+        assert isinstance(create_ocr_backend("pytesseract"), PytesseractBackend)
+        with pytest.raises(RuntimeError, match="tesserocr is not installed"):
+            create_ocr_backend("tesserocr")
+        with pytest.raises(RuntimeError, match="tesserocr is not installed"):
+            ParallelOCRBackend("tesserocr")
+
+    def test_auto_prefers_tesserocr(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """With tesserocr, "auto" uses it (engines are only loaded once they are needed)."""
+        monkeypatch.setattr(ocr_module, "TESSEROCR_INSTALLED", True)
+        assert isinstance(create_ocr_backend("auto"), TesserocrBackend)
+        assert isinstance(create_ocr_backend("pytesseract"), PytesseractBackend)
+
+    def test_unknown_backends_are_rejected(self) -> None:
+        """A typo in the backend's name isn't silently ignored."""
+        with pytest.raises(ValueError):
+            create_ocr_backend("tesseract")  # type: ignore[arg-type]
+        with pytest.raises(ValueError):
+            ParallelOCRBackend("tesseract")  # type: ignore[arg-type]
+
+    def test_tesserocr_pickles_to_the_process_local_backend(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """An unpickled TesserocrBackend (i.e. in a worker process) is that process's one warm backend."""
+        monkeypatch.setattr(ocr_module, "TESSEROCR_INSTALLED", True)
+        monkeypatch.setattr(ocr_module, "_process_local_backends", {})
+        backend = TesserocrBackend(max_engines_per_lang=5)
+        first = pickle.loads(pickle.dumps(backend))
+        second = pickle.loads(pickle.dumps(backend))
+        assert isinstance(first, TesserocrBackend)
+        assert first is second
+        assert first is not backend
+
+
+__all__ = ("TestOCRCache", "TestTextBands", "TestFindText", "TestOCRBackends")
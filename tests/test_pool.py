@@ -0,0 +1,173 @@
+"""Test cases for the pool module."""
+
+import asyncio
+from typing import Any
+
+import numpy as np
+import pytest
+from pyvnc import Rect
+from pyvnc import VNCConfig
+
+from vnc_mcp import pool as pool_module
+from vnc_mcp.framebuffer import crop_rgba_array
+from vnc_mcp.pool import VNCSessionPool
+
+
+class FakeAsyncVNCClient:
+    """Stands in for AsyncVNCClient, keeping track of every connection that is open."""
+
+    open: list["FakeAsyncVNCClient"] = []
+    connections = 0
+    refuse = False
+
+    def __init__(self, config: VNCConfig) -> None:
+        """Creates a fake connection to the given server."""
+        self.config = config
+        self.dropped = False
+        self.rects: list[Rect | None] = []
+
+    @classmethod
+    async def connect(cls, config: VNCConfig) -> "FakeAsyncVNCClient":
+        """Opens a fake connection, after a moment."""
+        await asyncio.sleep(0.01)
+        if cls.refuse:
+            raise ConnectionRefusedError("refused")
+        client = cls(config)
+        cls.open.append(client)
+        cls.connections += 1
+        return client
+
+    async def capture(self, rect: Rect | None = None, **kwargs: Any) -> np.ndarray:
+        """Returns a frame stamped with the number of connections made so far, unless the connection dropped."""
+        if self.dropped:
+            raise ConnectionResetError("dropped")
+        self.rects.append(rect)
+        frame = np.full((4, 4, 4), self.connections, dtype=np.uint8)
+        return frame if rect is None else crop_rgba_array(frame, rect)
+
+    async def __aenter__(self) -> "FakeAsyncVNCClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.open.remove(self)
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Only the asyncio backend is used by vnc-mcp."""
+    return "asyncio"
+
+
+@pytest.fixture
+def pool(monkeypatch: pytest.MonkeyPatch) -> VNCSessionPool:
+    """A pool of two fake VNC servers."""
+    FakeAsyncVNCClient.open = []
+    FakeAsyncVNCClient.connections = 0
+    FakeAsyncVNCClient.refuse = False
+    monkeypatch.setattr(pool_module, "AsyncVNCClient", FakeAsyncVNCClient)
+    targets = {
+        "default": VNCConfig(host="one", port=5900),
+        "other": VNCConfig(host="two", port=5901),
+    }
+    return VNCSessionPool(targets, idle_timeout=60.0)
+
+
+@pytest.mark.anyio
+class TestVNCSessionPool:
+    """Test cases for the VNCSessionPool."""
+
+    async def test_sessions_connect_lazily_and_are_reused(self, pool: VNCSessionPool) -> None:
+        """Nothing is connected until it is used, and then the connection is kept."""
+        async with pool:
+            assert FakeAsyncVNCClient.open == []
+            async with pool.use() as first:
+                pass
+            async with pool.use("default") as second:
+                assert second is first
+            async with pool.use("other") as other:
+                assert other.client.config.host == "two"  # type: ignore[attr-defined]
+            assert len(FakeAsyncVNCClient.open) == 2
+        assert FakeAsyncVNCClient.open == []
+
+    async def test_unknown_sessions(self, pool: VNCSessionPool) -> None:
+        """Asking for a session that doesn't exist lists the ones that do."""
+        with pytest.raises(ValueError, match="default, other"):
+            async with pool.use("missing"):
+                pass
+
+    async def test_only_idle_sessions_are_evicted(self, pool: VNCSessionPool) -> None:
+        """Sessions in use are kept, and idle ones are disconnected."""
+        pool.idle_timeout = 0.0001
+        async with pool.use("other"):
+            async with pool.use() as session:
+                await pool.evict_idle()
+                assert session.client in FakeAsyncVNCClient.open
+            await asyncio.sleep(0.01)
+            await pool.evict_idle()
+            assert len(FakeAsyncVNCClient.open) == 1
+            assert [entry["connected"] for entry in pool.describe()] == [False, True]
+
+    async def test_captures_survive_a_dropped_connection(self, pool: VNCSessionPool) -> None:
+        """A capture on a dropped connection reconnects and is retried, and the session is kept."""
+        async with pool:
+            async with pool.use() as session:
+                assert (await session.framebuffer.capture())[0, 0, 0] == 1
+            session.client.dropped = True  # type: ignore[attr-defined]
+            session.framebuffer.invalidate()
+            async with pool.use() as reconnected:
+                assert reconnected is session
+                assert (await session.framebuffer.capture())[0, 0, 0] == 2
+            assert len(FakeAsyncVNCClient.open) == 1
+            assert pool.describe()[0]["reconnects"] == 1
+
+    async def test_keepalive_notices_dropped_connections(self, pool: VNCSessionPool) -> None:
+        """Checking the connections reconnects the ones that stopped responding."""
+        async with pool:
+            async with pool.use() as session:
+                pass
+            session.client.dropped = True  # type: ignore[attr-defined]
+            await pool.check_connections()
+            assert session.client.dropped is False  # type: ignore[attr-defined]
+            assert FakeAsyncVNCClient.connections == 2
+
+    async def test_keepalive_probes_a_single_pixel(self, pool: VNCSessionPool) -> None:
+        """The keepalive doesn't move a whole framebuffer for every idle connection."""
+        async with pool.use() as session:
+            pass
+        await pool.check_connections()
+        assert session.client.rects == [Rect(0, 0, 1, 1)]  # type: ignore[attr-defined]
+
+    async def test_keepalive_skips_recently_synced_connections(self, pool: VNCSessionPool) -> None:
+        """A connection that was just captured from isn't captured from again by the keepalive."""
+        pool.keepalive_interval = 60.0
+        async with pool.use() as session:
+            await session.framebuffer.capture()
+        fetches = session.framebuffer.fetches
+        await pool.check_connections()
+        assert session.framebuffer.fetches == fetches
+
+    async def test_tools_wait_for_the_background_connection(self, pool: VNCSessionPool) -> None:
+        """Tools called while connecting in the background share that connection."""
+        async with pool:
+            pool.connect_in_background()
+            assert pool.describe()[0]["connecting"]
+            async with pool.use(), pool.use():
+                pass
+            assert FakeAsyncVNCClient.connections == 1
+
+    async def test_failed_connections_are_explained(self, pool: VNCSessionPool) -> None:
+        """A connection that can't be made fails tools with a clear error, and is tried again later."""
+        FakeAsyncVNCClient.refuse = True
+        async with pool:
+            pool.connect_in_background()
+            with pytest.raises(
+                ConnectionError, match="Could not connect to the VNC server at one:5900"
+            ):
+                async with pool.use():
+                    pass
+            FakeAsyncVNCClient.refuse = False
+            async with pool.use():
+                pass
+
+
+__all__ = ("TestVNCSessionPool",)
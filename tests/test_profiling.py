@@ -0,0 +1,57 @@
+"""Test cases for the profiling module."""
+
+import asyncio
+import pstats
+from pathlib import Path
+
+import pytest
+
+from vnc_mcp.profiling import ToolProfiler
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Only the asyncio backend is used by vnc-mcp."""
+    return "asyncio"
+
+
+async def _nap(seconds: float = 0.01) -> str:
+    await asyncio.sleep(seconds)
+    return "rested"
+
+
+@pytest.mark.anyio
+class TestToolProfiler:
+    """Test cases for the ToolProfiler."""
+
+    async def test_every_sampled_call_gets_a_profile(self, tmp_path: Path) -> None:
+        """Every call is written to its own file when the sample rate is 1."""
+        profiler = ToolProfiler(tmp_path / "profiles")
+        nap = profiler.instrument("nap", _nap)
+        assert await nap() == "rested"
+        assert await nap(0) == "rested"
+
+        profiles = sorted((tmp_path / "profiles").glob("nap-*.prof"))
+        assert len(profiles) == profiler.profiled == 2
+        assert any("_nap" in function for _, _, function in pstats.Stats(str(profiles[0])).stats)
+
+    async def test_unsampled_calls_are_not_profiled(self, tmp_path: Path) -> None:
+        """A sample rate of 0 never profiles anything."""
+        profiler = ToolProfiler(tmp_path, sample_rate=0)
+        assert await profiler.instrument("nap", _nap)() == "rested"
+        assert list(tmp_path.iterdir()) == []
+
+    async def test_overlapping_calls_are_profiled_once(self, tmp_path: Path) -> None:
+        """Only one call is profiled at a time."""
+        profiler = ToolProfiler(tmp_path)
+        nap = profiler.instrument("nap", _nap)
+        await asyncio.gather(nap(), nap(), nap())
+        assert profiler.profiled == 1
+
+    def test_sample_rate_is_checked(self, tmp_path: Path) -> None:
+        """Sample rates outside of 0-1 are rejected."""
+        with pytest.raises(ValueError):
+            ToolProfiler(tmp_path, sample_rate=2)
+
+
+__all__ = ("TestToolProfiler",)
@@ -0,0 +1,50 @@
+"""Test cases for the sampling module."""
+
+import numpy as np
+import pytest
+
+from vnc_mcp.sampling import describe_color
+from vnc_mcp.sampling import mean_rect_colors
+from vnc_mcp.sampling import sample_point_colors
+
+
+@pytest.fixture
+def frame() -> np.ndarray:
+    """A frame that is red on the left half and blue on the right half."""
+    array = np.zeros((20, 40, 4), dtype=np.uint8)
+    array[:, :20, 0] = 255
+    array[:, 20:, 2] = 255
+    return array
+
+
+class TestSampling:
+    """Test cases for reading colors out of a frame."""
+
+    def test_points_are_read_and_clamped(self, frame: np.ndarray) -> None:
+        """Points read their pixel, and points off screen read the nearest edge."""
+        colors = sample_point_colors(frame, np.array([[5, 5], [30, 10], [100, -3]]))
+        assert colors.tolist() == [[255, 0, 0], [0, 0, 255], [0, 0, 255]]
+
+    def test_rects_are_averaged(self, frame: np.ndarray) -> None:
+        """Rectangles are averaged over every pixel inside the frame."""
+        means = mean_rect_colors(
+            frame, np.array([[0, 0, 10, 10], [10, 5, 20, 10], [30, 0, 50, 50]])
+        )
+        assert means.tolist() == [[255, 0, 0], [127.5, 0, 127.5], [0, 0, 255]]
+
+    def test_rects_off_screen_have_no_color(self, frame: np.ndarray) -> None:
+        """Rectangles entirely outside the frame have no mean."""
+        means = mean_rect_colors(frame, np.array([[50, 0, 5, 5], [0, 0, 5, 5]]))
+        assert np.isnan(means[0]).all()
+        assert means[1].tolist() == [255, 0, 0]
+        assert mean_rect_colors(frame, np.zeros((0, 4), dtype=np.intp)).shape == (0, 3)
+
+    def test_colors_are_described_in_hex(self) -> None:
+        """Colors are rounded to whole channels."""
+        assert describe_color(np.array([255, 127.6, 0])) == {
+            "color": "#ff8000",
+            "rgb": [255, 128, 0],
+        }
+
+
+__all__ = ("TestSampling",)
@@ -0,0 +1,66 @@
+"""Test cases for the scaling module."""
+
+import numpy as np
+import pytest
+
+from vnc_mcp.scaling import CoordinateMapper
+from vnc_mcp.scaling import ScreenScaling
+from vnc_mcp.scaling import downscale_rgba_array
+
+
+class TestScreenScaling:
+    """Test cases for ScreenScaling and CoordinateMapper."""
+
+    def test_most_restrictive_limit_wins(self) -> None:
+        """The smallest of all the factors is used."""
+        scaling = ScreenScaling(max_width=1920, max_height=1200, scale=0.75)
+        assert scaling.factor_for(3840, 2160) == pytest.approx(0.5)
+
+    def test_never_enlarges(self) -> None:
+        """A screen smaller than the limits is left alone."""
+        assert ScreenScaling(max_width=4000).factor_for(1920, 1080) == 1.0
+
+    def test_non_positive_limits_are_rejected(self) -> None:
+        """Scaling to nothing makes no sense."""
+        with pytest.raises(ValueError):
+            ScreenScaling(scale=0)
+
+    def test_points_map_back_onto_the_framebuffer(self) -> None:
+        """A point read off a half-size screenshot lands on the matching framebuffer pixel."""
+        mapper = CoordinateMapper(0.5, 3840, 2160)
+        assert tuple(mapper.scaled_resolution) == (1920, 1080)
+        assert tuple(mapper.point(100, 50)) == (200, 100)
+        assert tuple(mapper.point(5000, -5)) == (3839, 0)
+        assert tuple(mapper.rect(10, 10, 20, 30)) == (20, 20, 40, 60)
+
+
+class TestDownscale:
+    """Test cases for downscale_rgba_array."""
+
+    def test_whole_factor_averages_blocks(self) -> None:
+        """Halving a frame averages every 2x2 block."""
+        array = np.zeros((4, 4, 4), dtype=np.uint8)
+        array[:2, :2] = [0, 100, 200, 255]
+        array[0, 0] = [100, 100, 200, 255]
+        scaled = downscale_rgba_array(array, 0.5)
+        assert scaled.shape == (2, 2, 4)
+        assert scaled.dtype == np.uint8
+        assert tuple(scaled[0, 0]) == (25, 100, 200, 255)
+
+    @pytest.mark.parametrize("factor", [0.3, 0.5, 0.66, 0.9])
+    def test_output_size(self, factor: float) -> None:
+        """Any factor produces an image of the rounded target size."""
+        array = np.zeros((1080, 1920, 4), dtype=np.uint8)
+        assert downscale_rgba_array(array, factor).shape == (
+            round(1080 * factor),
+            round(1920 * factor),
+            4,
+        )
+
+    def test_factor_of_one_is_a_no_op(self) -> None:
+        """No work is done when the frame isn't scaled."""
+        array = np.zeros((10, 10, 4), dtype=np.uint8)
+        assert downscale_rgba_array(array, 1.0) is array
+
+
+__all__ = ("TestScreenScaling", "TestDownscale")
@@ -0,0 +1,80 @@
+"""Test cases for the session module."""
+
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from pyvnc import Rect
+
+from vnc_mcp.scaling import ScreenScaling
+from vnc_mcp.session import VNCSession
+from vnc_mcp.session import serving_client
+
+
+class FakeMCPSession:
+    """Stands in for the session of one MCP client."""
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Only the asyncio backend is used by vnc-mcp."""
+    return "asyncio"
+
+
+@pytest.mark.anyio
+class TestVNCSession:
+    """Test cases for the VNCSession."""
+
+    async def test_input_is_serialized(self) -> None:
+        """Interactions never overlap, and take turns in the order they arrived."""
+        session = VNCSession(object())  # type: ignore[arg-type]
+        events = []
+
+        async def interact(name: str) -> None:
+            async with session.acting():
+                events.append(f"{name} start")
+                await asyncio.sleep(0.01)
+                events.append(f"{name} end")
+
+        await asyncio.gather(interact("a"), interact("b"), interact("c"))
+        assert events == ["a start", "a end", "b start", "b end", "c start", "c end"]
+
+    async def test_frames_and_actions_are_recorded(self) -> None:
+        """Synced frames end up in the history (off the event loop), and input is counted as actions."""
+        async with VNCSession(object(), history_max_bytes=1 << 20) as session:  # type: ignore[arg-type]
+            assert session.history is not None and session.framebuffer.on_frame is not None
+            session.framebuffer.on_frame(np.zeros((8, 8, 4), dtype=np.uint8))
+            await asyncio.gather(*session._recordings)
+            assert session.history.frames == 1
+            async with session.acting():
+                pass
+            assert session.history.actions == 1
+
+    async def test_history_is_off_by_default(self) -> None:
+        """Nothing is recorded unless a history budget is given."""
+        session = VNCSession(object())  # type: ignore[arg-type]
+        assert session.history is None and session.framebuffer.on_frame is None
+
+    async def test_clients_have_their_own_views(self) -> None:
+        """Every client has its own scaling and last seen frame, which start out as the session's defaults."""
+        session = VNCSession(
+            SimpleNamespace(rect=Rect(0, 0, 2000, 1000)),  # type: ignore[arg-type]
+            scaling=ScreenScaling(max_width=1000),
+        )
+        first, second = FakeMCPSession(), FakeMCPSession()
+        frame = np.zeros((1000, 2000, 4), dtype=np.uint8)
+
+        with serving_client(first):
+            session.view.scaling = ScreenScaling(scale=0.25)
+            session.view.last_seen_frame = frame
+        with serving_client(second):
+            assert session.coordinates.factor == 0.5
+            assert session.view.last_seen_frame is None
+        with serving_client(first):
+            assert session.coordinates.factor == 0.25
+            assert session.view.last_seen_frame is frame
+        assert session.coordinates.factor == 0.5
+
+
+__all__ = ("TestVNCSession",)
@@ -0,0 +1,35 @@
+"""Test cases for the shared_array module."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from vnc_mcp.utils.shared_array import SharedArray
+from vnc_mcp.utils.shared_array import call_with_shared_array
+
+
+def _column_sums(array: np.ndarray, scale: int) -> list[int]:
+    return [int(total) * scale for total in array.sum(axis=0, dtype=np.int64)]
+
+
+class TestSharedArray:
+    """Test cases for handing arrays to worker processes through shared memory."""
+
+    def test_workers_read_the_array(self) -> None:
+        """A worker sees the same pixels as the parent, and bands of them can be picked out."""
+        array = np.arange(24, dtype=np.uint8).reshape(6, 4)
+        with SharedArray(array) as shared, ProcessPoolExecutor(max_workers=1) as executor:
+            whole = executor.submit(call_with_shared_array, _column_sums, shared.handle, 1)
+            band = executor.submit(
+                call_with_shared_array, _column_sums, shared.handle, 2, rows=slice(4, 6)
+            )
+            assert whole.result() == _column_sums(array, 1)
+            assert band.result() == _column_sums(array[4:6], 2)
+
+    def test_empty_arrays(self) -> None:
+        """Arrays without any pixels can still be shared."""
+        with SharedArray(np.zeros((0, 4), dtype=np.uint8)) as shared:
+            assert shared.handle.shape == (0, 4)
+
+
+__all__ = ("TestSharedArray",)
@@ -0,0 +1,57 @@
+"""Test cases for the tiles module."""
+
+import numpy as np
+import pytest
+
+from vnc_mcp.utils.tiles import changed_tile_mask
+from vnc_mcp.utils.tiles import tile_mask_to_rects
+
+
+@pytest.fixture
+def frame() -> np.ndarray:
+    """A blank 100x70 RGBA frame."""
+    return np.zeros((70, 100, 4), dtype=np.uint8)
+
+
+class TestTiles:
+    """Test cases for the tile diff helpers."""
+
+    def test_identical_frames_have_no_changes(self, frame: np.ndarray) -> None:
+        """Nothing is reported when nothing changed."""
+        mask = changed_tile_mask(frame, frame.copy(), 32)
+        assert mask.shape == (3, 4)
+        assert not mask.any()
+        assert tile_mask_to_rects(mask, 32, 100, 70) == []
+
+    def test_single_pixel_marks_its_tile(self, frame: np.ndarray) -> None:
+        """A change in one channel of one pixel is enough to mark a tile."""
+        current = frame.copy()
+        current[40, 70, 2] = 1
+        mask = changed_tile_mask(frame, current, 32)
+        assert mask.sum() == 1 and mask[1, 2]
+
+    def test_touching_tiles_are_merged_and_clamped(self, frame: np.ndarray) -> None:
+        """Diagonally touching tiles form one region, which doesn't extend past the frame."""
+        current = frame.copy()
+        current[0, 0] = 255
+        current[69, 99] = 255
+        current[40, 40] = 255
+        current[40, 70] = 255
+        rects = tile_mask_to_rects(changed_tile_mask(frame, current, 32), 32, 100, 70)
+        assert [tuple(rect) for rect in rects] == [(0, 0, 100, 70)]
+
+    def test_separate_regions(self, frame: np.ndarray) -> None:
+        """Tiles that don't touch are reported separately, from top to bottom."""
+        current = frame.copy()
+        current[69, 0] = 255
+        current[0, 99] = 255
+        rects = tile_mask_to_rects(changed_tile_mask(frame, current, 32), 32, 100, 70)
+        assert [tuple(rect) for rect in rects] == [(96, 0, 4, 32), (0, 64, 32, 6)]
+
+    def test_shapes_must_match(self, frame: np.ndarray) -> None:
+        """Frames of different sizes can't be compared."""
+        with pytest.raises(ValueError):
+            changed_tile_mask(frame, frame[:10], 32)
+
+
+__all__ = ("TestTiles",)